@@ -16,6 +16,74 @@ FFMPEG_PATH = os.getenv("FFMPEG_PATH", "ffmpeg")
 HLS_TIME = int(os.getenv("HLS_TIME", "4"))
 HLS_LIST_SIZE = int(os.getenv("HLS_LIST_SIZE", "6"))
 
+# Live HLS basse latence (segments courts + rechargement bloquant de playlist)
+LL_HLS_ENABLED = os.getenv("LL_HLS_ENABLED", "false").lower() in {"1", "true", "yes"}
+LL_HLS_SEGMENT_TIME = float(os.getenv("LL_HLS_SEGMENT_TIME", "1"))
+LL_HLS_LIST_SIZE = int(os.getenv("LL_HLS_LIST_SIZE", "12"))
+
+# Aperçu live à la demande: le muxer HLS ne tourne que tant que quelqu'un regarde
+LIVE_PREVIEW_ON_DEMAND = os.getenv("LIVE_PREVIEW_ON_DEMAND", "true").lower() in {"1", "true", "yes"}
+LIVE_PREVIEW_IDLE_MINUTES = float(os.getenv("LIVE_PREVIEW_IDLE_MINUTES", "5"))
+
+# DVR live: fenêtre de retour en arrière servie depuis le fichier d'enregistrement (0 = tout le show)
+DVR_WINDOW_MINUTES = float(os.getenv("DVR_WINDOW_MINUTES", "60"))
+DVR_SEGMENT_SECONDS = float(os.getenv("DVR_SEGMENT_SECONDS", "4"))
+
+# Contrôle d'admission des sessions (0 = illimité)
+MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", "0"))
+MAX_INGRESS_MBPS = float(os.getenv("MAX_INGRESS_MBPS", "0"))  # débit entrant agrégé, Mbit/s
+MIN_FREE_DISK_GB = float(os.getenv("MIN_FREE_DISK_GB", "1"))
+PREEMPT_LOW_PRIORITY = os.getenv("PREEMPT_LOW_PRIORITY", "false").lower() in {"1", "true", "yes"}
+
+# Sessions terminées: délai avant suppression du répertoire live et taille de l'historique en mémoire
+SESSION_DIR_GRACE_MINUTES = float(os.getenv("SESSION_DIR_GRACE_MINUTES", "10"))
+SESSION_HISTORY_SIZE = int(os.getenv("SESSION_HISTORY_SIZE", "50"))
+
+# Moteur de capture par défaut: ffmpeg (un processus par stream) ou native (segments HLS téléchargés par l'app)
+CAPTURE_ENGINES = ("ffmpeg", "native")
+CAPTURE_ENGINE = os.getenv("CAPTURE_ENGINE", "ffmpeg").lower()
+if CAPTURE_ENGINE not in CAPTURE_ENGINES:
+    CAPTURE_ENGINE = "ffmpeg"
+NATIVE_CAPTURE_MAX_CONNECTIONS = int(os.getenv("NATIVE_CAPTURE_MAX_CONNECTIONS", "64"))
+
+# Disposition des enregistrements ffmpeg: file (.ts unique via tee) ou segments (segments HLS liés, une seule écriture)
+RECORD_LAYOUTS = ("file", "segments")
+RECORD_LAYOUT = os.getenv("RECORD_LAYOUT", "file").lower()
+if RECORD_LAYOUT not in RECORD_LAYOUTS:
+    RECORD_LAYOUT = "file"
+# Conteneur des enregistrements en fichier unique: ts (converti en MP4 ensuite) ou mp4 (MP4 fragmenté, sans conversion)
+RECORD_CONTAINERS = ("ts", "mp4")
+RECORD_CONTAINER = os.getenv("RECORD_CONTAINER", "ts").lower()
+if RECORD_CONTAINER not in RECORD_CONTAINERS:
+    RECORD_CONTAINER = "ts"
+
+# Pool de conversion TS -> MP4 (0 = nombre de cœurs / threads par job)
+CONVERSION_WORKERS = int(os.getenv("CONVERSION_WORKERS", "0"))
+CONVERSION_THREADS_PER_JOB = int(os.getenv("CONVERSION_THREADS_PER_JOB", "4"))
+# Profil de conversion des modèles sans profil attribué (voir /api/conversion-profiles)
+CONVERSION_PROFILE = os.getenv("CONVERSION_PROFILE", "default")
+# Conversions en échec: tentatives avant abandon, délai avant la 2e (doublé ensuite)
+CONVERSION_MAX_ATTEMPTS = int(os.getenv("CONVERSION_MAX_ATTEMPTS", "5"))
+CONVERSION_RETRY_DELAY = int(os.getenv("CONVERSION_RETRY_DELAY", "60"))
+# Régulation des conversions (les enregistrements live passent avant)
+# Charge 1 min par cœur au-delà de laquelle aucun job ne démarre (0 = ignorer)
+CONVERSION_MAX_LOAD = float(os.getenv("CONVERSION_MAX_LOAD", "0.9"))
+# Nombre d'enregistrements en cours qui met les conversions en pause (0 = jamais)
+CONVERSION_PAUSE_SESSIONS = int(os.getenv("CONVERSION_PAUSE_SESSIONS", "0"))
+# Plage horaire des conversions, ex. 01:00-08:00 (vide = toute la journée)
+CONVERSION_WINDOW = os.getenv("CONVERSION_WINDOW", "")
+# Priorité des encodeurs: nice (0-19) et classe disque idle (ionice -c 3)
+CONVERSION_NICE = int(os.getenv("CONVERSION_NICE", "10"))
+CONVERSION_IO_IDLE = os.getenv("CONVERSION_IO_IDLE", "true").lower() in {"1", "true", "yes"}
+# Transcodage découpé des longs enregistrements: durée max d'un segment (0 = désactivé)
+# et encodeurs parallèles par enregistrement (0 = cœurs / threads par job)
+CONVERSION_CHUNK_SECONDS = int(os.getenv("CONVERSION_CHUNK_SECONDS", "600"))
+CONVERSION_CHUNK_JOBS = int(os.getenv("CONVERSION_CHUNK_JOBS", "0"))
+# Conversion des enregistrements .ts pendant la capture, par morceaux de CONVERSION_CHUNK_SECONDS
+CONVERSION_INCREMENTAL = os.getenv("CONVERSION_INCREMENTAL", "true").lower() in {"1", "true", "yes"}
+# MP4 seul: source (.ts / .hls) supprimée une fois le MP4 vérifié (durée, moov lisible)
+CONVERSION_KEEP_MP4_ONLY = os.getenv("CONVERSION_KEEP_MP4_ONLY", "false").lower() in {"1", "true", "yes"}
+
 # Configuration Chaturbate
 CB_RESOLVER_ENABLED = os.getenv("CB_RESOLVER_ENABLED", "false").lower() in {"1", "true", "yes"}
 CB_COOKIE: Optional[str] = os.getenv("CB_COOKIE")
@@ -8,6 +8,18 @@ from typing import Optional, List, Dict, Any
 from datetime import datetime
 from ..logger import logger
 
+# Profils de conversion fournis (créés s'ils n'existent pas, modifiables ensuite)
+# video_codec 'none': enregistrements conservés tels quels, jamais convertis
+BUILTIN_CONVERSION_PROFILES = [
+    {"name": "default", "video_codec": "libx264", "preset": "medium", "crf": 23, "audio_bitrate": "128k", "allow_remux": True},
+    {"name": "fast", "video_codec": "libx264", "preset": "veryfast", "crf": 23, "audio_bitrate": "128k", "allow_remux": True},
+    {"name": "archive", "video_codec": "libx265", "preset": "slow", "crf": 28, "audio_bitrate": "96k", "allow_remux": False},
+    {"name": "archive-av1", "video_codec": "libsvtav1", "preset": "8", "crf": 35, "audio_bitrate": "96k", "allow_remux": False},
+    {"name": "none", "video_codec": "none", "allow_remux": False},
+]
+
+CONVERSION_PROFILE_FIELDS = ("video_codec", "preset", "crf", "audio_bitrate", "max_height", "threads", "allow_remux")
+
 class Database:
     def __init__(self, db_path: Path):
         self.db_path = db_path
@@ -33,11 +45,21 @@ class Database:
                     auto_record BOOLEAN DEFAULT 1,
                     record_quality TEXT DEFAULT 'best',
                     retention_days INTEGER DEFAULT 30,
+                    priority INTEGER DEFAULT 0,
+                    capture_engine TEXT DEFAULT '',
+                    recompress BOOLEAN DEFAULT 0,
+                    conversion_profile TEXT DEFAULT '',
                     created_at INTEGER,
                     updated_at INTEGER
                 )
             """)
             
+            # Colonnes ajoutées après coup (bases existantes)
+            await self._ensure_column(db, "models", "priority", "INTEGER DEFAULT 0")
+            await self._ensure_column(db, "models", "capture_engine", "TEXT DEFAULT ''")
+            await self._ensure_column(db, "models", "recompress", "BOOLEAN DEFAULT 0")
+            await self._ensure_column(db, "models", "conversion_profile", "TEXT DEFAULT ''")
+            
             # Table pour les rediffusions
             await db.execute("""
                 CREATE TABLE IF NOT EXISTS recordings (
@@ -52,11 +74,82 @@ class Database:
                     mp4_path TEXT,
                     mp4_size INTEGER,
                     is_converted BOOLEAN DEFAULT 0,
+                    health TEXT,
+                    completed_at INTEGER,
                     created_at INTEGER,
                     UNIQUE(username, filename)
                 )
             """)
             
+            # Sessions d'enregistrement en cours (reprise après redémarrage)
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS active_sessions (
+                    session_id TEXT PRIMARY KEY,
+                    username TEXT NOT NULL,
+                    display_name TEXT,
+                    input_url TEXT NOT NULL,
+                    variant_url TEXT,
+                    record_path TEXT NOT NULL,
+                    recording_id TEXT,
+                    pid INTEGER,
+                    priority INTEGER DEFAULT 0,
+                    started_at INTEGER
+                )
+            """)
+            
+            # Profils de conversion (recette d'encodage + statistiques mesurées)
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS conversion_profiles (
+                    name TEXT PRIMARY KEY,
+                    video_codec TEXT NOT NULL DEFAULT 'libx264',
+                    preset TEXT DEFAULT 'medium',
+                    crf INTEGER DEFAULT 23,
+                    audio_bitrate TEXT DEFAULT '128k',
+                    max_height INTEGER DEFAULT 0,
+                    threads INTEGER DEFAULT 0,
+                    allow_remux BOOLEAN DEFAULT 1,
+                    jobs INTEGER DEFAULT 0,
+                    source_seconds REAL DEFAULT 0,
+                    encode_seconds REAL DEFAULT 0,
+                    input_bytes INTEGER DEFAULT 0,
+                    output_bytes INTEGER DEFAULT 0,
+                    updated_at INTEGER
+                )
+            """)
+            for profile in BUILTIN_CONVERSION_PROFILES:
+                columns = list(profile)
+                await db.execute(
+                    f"INSERT OR IGNORE INTO conversion_profiles ({', '.join(columns)}) "
+                    f"VALUES ({', '.join('?' for _ in columns)})",
+                    [profile[c] for c in columns]
+                )
+            
+            # Jobs de conversion (file persistante: reprise après redémarrage, nouvelles tentatives)
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS conversion_jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    username TEXT NOT NULL,
+                    filename TEXT NOT NULL,
+                    file_path TEXT NOT NULL UNIQUE,
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    priority INTEGER DEFAULT 0,
+                    attempts INTEGER DEFAULT 0,
+                    last_error TEXT,
+                    mode TEXT,
+                    output_size INTEGER,
+                    reclaimed_bytes INTEGER DEFAULT 0,
+                    next_attempt_at INTEGER DEFAULT 0,
+                    created_at INTEGER,
+                    started_at INTEGER,
+                    finished_at INTEGER
+                )
+            """)
+            
+            await self._ensure_column(db, "recordings", "health", "TEXT")
+            await self._ensure_column(db, "recordings", "completed_at", "INTEGER")
+            await self._ensure_column(db, "active_sessions", "variant_url", "TEXT")
+            await self._ensure_column(db, "conversion_jobs", "reclaimed_bytes", "INTEGER DEFAULT 0")
+            
             # Index pour les requêtes fréquentes
             await db.execute("""
                 CREATE INDEX IF NOT EXISTS idx_models_online 
@@ -68,20 +161,44 @@ class Database:
                 ON recordings(username, created_at DESC)
             """)
             
+            await db.execute("""
+                CREATE INDEX IF NOT EXISTS idx_conversion_jobs_status 
+                ON conversion_jobs(status, next_attempt_at)
+            """)
+            
             await db.commit()
             
         self._initialized = True
         logger.info("Base de données initialisée", db_path=str(self.db_path))
     
+    async def _ensure_column(self, db, table: str, column: str, definition: str):
+        """Ajoute une colonne à une table existante si elle n'existe pas encore"""
+        cursor = await db.execute(f"PRAGMA table_info({table})")
+        columns = {row[1] for row in await cursor.fetchall()}
+        if column not in columns:
+            await db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+            logger.info("Colonne ajoutée", table=table, column=column)
+    
     async def add_or_update_model(
         self, 
         username: str,
         display_name: Optional[str] = None,
         auto_record: bool = True,
         record_quality: str = "best",
-        retention_days: int = 30
+        retention_days: int = 30,
+        priority: Optional[int] = None,
+        capture_engine: Optional[str] = None,
+        recompress: Optional[bool] = None,
+        conversion_profile: Optional[str] = None
     ):
-        """Ajoute ou met à jour un modèle"""
+        """
+        Ajoute ou met à jour un modèle
+
+        priority / capture_engine / recompress / conversion_profile à None conservent
+        la valeur existante (capture_engine '' = moteur par défaut de l'instance,
+        recompress = réencoder même quand un remux suffirait, conversion_profile '' =
+        profil par défaut).
+        """
         await self.initialize()
         
         now = int(datetime.now().timestamp())
@@ -90,19 +207,24 @@ class Database:
             await db.execute("""
                 INSERT INTO models (
                     username, display_name, auto_record, record_quality, 
-                    retention_days, created_at, updated_at
+                    retention_days, priority, capture_engine, recompress, conversion_profile, created_at, updated_at
                 )
-                VALUES (?, ?, ?, ?, ?, ?, ?)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 ON CONFLICT(username) DO UPDATE SET
                     display_name = COALESCE(?, display_name),
                     auto_record = ?,
                     record_quality = ?,
                     retention_days = ?,
+                    priority = COALESCE(?, priority),
+                    capture_engine = COALESCE(?, capture_engine),
+                    recompress = COALESCE(?, recompress),
+                    conversion_profile = COALESCE(?, conversion_profile),
                     updated_at = ?
             """, (
                 username, display_name, auto_record, record_quality,
-                retention_days, now, now,
-                display_name, auto_record, record_quality, retention_days, now
+                retention_days, priority or 0, capture_engine or '', bool(recompress), conversion_profile or '', now, now,
+                display_name, auto_record, record_quality, retention_days, priority, capture_engine, recompress,
+                conversion_profile, now
             ))
             await db.commit()
         
@@ -204,36 +326,46 @@ class Database:
         thumbnail_path: Optional[str] = None,
         mp4_path: Optional[str] = None,
         mp4_size: Optional[int] = None,
-        is_converted: bool = False
+        is_converted: bool = False,
+        health: Optional[Dict[str, Any]] = None,
+        completed_at: Optional[int] = None
     ):
-        """Ajoute ou met à jour un enregistrement"""
+        """
+        Ajoute ou met à jour un enregistrement
+
+        health: compteurs du log ffmpeg de la session
+        completed_at: fin de la session qui l'a écrit (NULL: ancien fichier, fin déduite du mtime)
+        """
         await self.initialize()
         
         now = int(datetime.now().timestamp())
         
         # Générer recording_id si non fourni
         if not recording_id:
-            from datetime import datetime
             recording_id = f"{username}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
         
+        health_json = json.dumps(health) if health is not None else None
+        
         async with aiosqlite.connect(self.db_path) as db:
             await db.execute("""
                 INSERT INTO recordings (
                     username, recording_id, filename, file_path, file_size, 
-                    duration_seconds, thumbnail_path, mp4_path, mp4_size, is_converted, created_at
+                    duration_seconds, thumbnail_path, mp4_path, mp4_size, is_converted, health, completed_at, created_at
                 )
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 ON CONFLICT(username, filename) DO UPDATE SET
                     file_size = ?,
                     duration_seconds = ?,
                     thumbnail_path = COALESCE(?, thumbnail_path),
                     mp4_path = COALESCE(?, mp4_path),
                     mp4_size = COALESCE(?, mp4_size),
-                    is_converted = ?
+                    is_converted = ?,
+                    health = COALESCE(?, health),
+                    completed_at = COALESCE(?, completed_at)
             """, (
                 username, recording_id, filename, file_path, file_size,
-                duration_seconds, thumbnail_path, mp4_path, mp4_size, is_converted, now,
-                file_size, duration_seconds, thumbnail_path, mp4_path, mp4_size, is_converted
+                duration_seconds, thumbnail_path, mp4_path, mp4_size, is_converted, health_json, completed_at, now,
+                file_size, duration_seconds, thumbnail_path, mp4_path, mp4_size, is_converted, health_json, completed_at
             ))
             await db.commit()
     
@@ -254,6 +386,33 @@ class Database:
             rows = await cursor.fetchall()
             return [dict(row) for row in rows]
     
+    async def switch_recording_to_mp4(self, username: str, filename: str, mp4_path: str, mp4_size: int):
+        """
+        Fait pointer un enregistrement sur son MP4 (source supprimée)
+
+        Lecture, miniatures et rétention suivent le MP4. Une ligne déjà créée pour le MP4
+        (vu comme enregistrement MP4 direct par le monitor) est remplacée.
+        """
+        await self.initialize()
+        
+        mp4_filename = Path(mp4_path).name
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.execute(
+                "DELETE FROM recordings WHERE username = ? AND filename = ?",
+                (username, mp4_filename)
+            )
+            await db.execute("""
+                UPDATE recordings SET
+                    filename = ?,
+                    file_path = ?,
+                    file_size = ?,
+                    mp4_path = ?,
+                    mp4_size = ?,
+                    is_converted = 1
+                WHERE username = ? AND filename = ?
+            """, (mp4_filename, mp4_path, mp4_size, mp4_path, mp4_size, username, filename))
+            await db.commit()
+    
     async def get_recordings_count(self, username: str) -> int:
         """Compte les enregistrements d'un modèle"""
         await self.initialize()
@@ -266,6 +425,197 @@ class Database:
             row = await cursor.fetchone()
             return row[0] if row else 0
     
+    async def save_active_session(
+        self,
+        session_id: str,
+        username: str,
+        input_url: str,
+        record_path: str,
+        pid: Optional[int],
+        started_at: int,
+        display_name: Optional[str] = None,
+        recording_id: Optional[str] = None,
+        priority: int = 0,
+        variant_url: Optional[str] = None
+    ):
+        """Enregistre une session en cours (pour la reprise après redémarrage)"""
+        await self.initialize()
+        
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.execute("""
+                INSERT OR REPLACE INTO active_sessions (
+                    session_id, username, display_name, input_url, variant_url, record_path,
+                    recording_id, pid, priority, started_at
+                )
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (session_id, username, display_name, input_url, variant_url, record_path,
+                  recording_id, pid, priority, started_at))
+            await db.commit()
+    
+    async def delete_active_session(self, session_id: str):
+        """Retire une session terminée"""
+        await self.initialize()
+        
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.execute("DELETE FROM active_sessions WHERE session_id = ?", (session_id,))
+            await db.commit()
+    
+    async def get_active_sessions(self) -> List[Dict[str, Any]]:
+        """Sessions encore marquées en cours (laissées par le run précédent au démarrage)"""
+        await self.initialize()
+        
+        async with aiosqlite.connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            cursor = await db.execute("SELECT * FROM active_sessions ORDER BY priority DESC, started_at")
+            rows = await cursor.fetchall()
+            return [dict(row) for row in rows]
+    
+    async def get_conversion_profiles(self) -> List[Dict[str, Any]]:
+        """Profils de conversion avec leurs statistiques"""
+        await self.initialize()
+        
+        async with aiosqlite.connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            cursor = await db.execute("SELECT * FROM conversion_profiles ORDER BY name")
+            rows = await cursor.fetchall()
+            return [dict(row) for row in rows]
+    
+    async def get_conversion_profile(self, name: str) -> Optional[Dict[str, Any]]:
+        """Récupère un profil de conversion"""
+        await self.initialize()
+        
+        async with aiosqlite.connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            cursor = await db.execute("SELECT * FROM conversion_profiles WHERE name = ?", (name,))
+            row = await cursor.fetchone()
+            return dict(row) if row else None
+    
+    async def save_conversion_profile(self, name: str, **settings):
+        """Crée ou modifie un profil (les statistiques sont conservées)"""
+        await self.initialize()
+        
+        values = {k: v for k, v in settings.items() if k in CONVERSION_PROFILE_FIELDS and v is not None}
+        columns = ["name", *values, "updated_at"]
+        params = [name, *values.values(), int(datetime.now().timestamp())]
+        updates = ", ".join(f"{c} = excluded.{c}" for c in columns[1:])
+        
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.execute(
+                f"INSERT INTO conversion_profiles ({', '.join(columns)}) "
+                f"VALUES ({', '.join('?' for _ in columns)}) "
+                f"ON CONFLICT(name) DO UPDATE SET {updates}",
+                params
+            )
+            await db.commit()
+    
+    async def delete_conversion_profile(self, name: str):
+        """Supprime un profil (les modèles qui l'utilisent repassent au profil par défaut)"""
+        await self.initialize()
+        
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.execute("DELETE FROM conversion_profiles WHERE name = ?", (name,))
+            await db.execute("UPDATE models SET conversion_profile = '' WHERE conversion_profile = ?", (name,))
+            await db.commit()
+    
+    async def record_conversion_stats(self, name: str, source_seconds: float, encode_seconds: float,
+                                      input_bytes: int, output_bytes: int):
+        """Cumule les mesures d'un encodage terminé (vitesse et taux de compression du profil)"""
+        await self.initialize()
+        
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.execute("""
+                UPDATE conversion_profiles SET
+                    jobs = jobs + 1,
+                    source_seconds = source_seconds + ?,
+                    encode_seconds = encode_seconds + ?,
+                    input_bytes = input_bytes + ?,
+                    output_bytes = output_bytes + ?
+                WHERE name = ?
+            """, (source_seconds, encode_seconds, input_bytes, output_bytes, name))
+            await db.commit()
+    
+    async def enqueue_conversion_job(self, username: str, filename: str, file_path: str, priority: int = 0) -> bool:
+        """Crée le job de conversion d'un enregistrement (False s'il existe déjà, quel que soit son statut)"""
+        await self.initialize()
+        
+        async with aiosqlite.connect(self.db_path) as db:
+            cursor = await db.execute("""
+                INSERT OR IGNORE INTO conversion_jobs (username, filename, file_path, status, priority, created_at)
+                VALUES (?, ?, ?, 'queued', ?, ?)
+            """, (username, filename, file_path, priority, int(datetime.now().timestamp())))
+            await db.commit()
+            return cursor.rowcount > 0
+    
+    async def get_conversion_job(self, file_path: str) -> Optional[Dict[str, Any]]:
+        """Job de conversion d'un enregistrement"""
+        await self.initialize()
+        
+        async with aiosqlite.connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            cursor = await db.execute("SELECT * FROM conversion_jobs WHERE file_path = ?", (file_path,))
+            row = await cursor.fetchone()
+            return dict(row) if row else None
+    
+    async def get_conversion_jobs(self, status: Optional[str] = None, limit: int = 200) -> List[Dict[str, Any]]:
+        """Jobs de conversion, par priorité puis ancienneté (filtrés par statut si fourni)"""
+        await self.initialize()
+        
+        query = "SELECT * FROM conversion_jobs"
+        params: list = []
+        if status:
+            query += " WHERE status = ?"
+            params.append(status)
+        query += " ORDER BY priority DESC, created_at LIMIT ?"
+        params.append(limit)
+        
+        async with aiosqlite.connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            cursor = await db.execute(query, params)
+            rows = await cursor.fetchall()
+            return [dict(row) for row in rows]
+    
+    async def update_conversion_job(self, file_path: str, **fields):
+        """Met à jour un job (status, attempts, last_error, mode, output_size, horodatages...)"""
+        await self.initialize()
+        if not fields:
+            return
+        
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.execute(
+                f"UPDATE conversion_jobs SET {assignments} WHERE file_path = ?",
+                [*fields.values(), file_path]
+            )
+            await db.commit()
+    
+    async def get_reclaimed_bytes(self) -> int:
+        """Octets libérés par la suppression des sources converties"""
+        await self.initialize()
+        
+        async with aiosqlite.connect(self.db_path) as db:
+            cursor = await db.execute("SELECT COALESCE(SUM(reclaimed_bytes), 0) FROM conversion_jobs")
+            row = await cursor.fetchone()
+            return row[0] if row else 0
+    
+    async def requeue_interrupted_conversion_jobs(self) -> int:
+        """Remet en file les jobs 'running' laissés par un arrêt brutal; retourne leur nombre"""
+        await self.initialize()
+        
+        async with aiosqlite.connect(self.db_path) as db:
+            cursor = await db.execute(
+                "UPDATE conversion_jobs SET status = 'queued', next_attempt_at = 0 WHERE status = 'running'"
+            )
+            await db.commit()
+            return cursor.rowcount
+    
+    async def delete_conversion_job(self, file_path: str):
+        """Supprime le job d'un enregistrement (enregistrement supprimé)"""
+        await self.initialize()
+        
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.execute("DELETE FROM conversion_jobs WHERE file_path = ?", (file_path,))
+            await db.commit()
+    
     async def migrate_from_json(self, json_path: Path):
         """Migre les données depuis le fichier JSON vers SQLite"""
         if not json_path.exists():
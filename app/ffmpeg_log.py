@@ -0,0 +1,91 @@
+"""
+Lecture incrémentale des logs ffmpeg d'une session
+Classe les avertissements (reconnexions, erreurs HTTP, discontinuités...) en compteurs de santé
+"""
+import re
+import threading
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+# Octets lus au maximum par appel (un log ne doit pas bloquer l'appelant)
+MAX_READ_BYTES = 1024 * 1024
+
+# Premier motif correspondant gagne; une ligne compte dans une seule catégorie
+LOG_PATTERNS: List[Tuple[str, "re.Pattern[str]"]] = [
+    ("reconnects", re.compile(r"will reconnect|reconnecting|reconnect at", re.IGNORECASE)),
+    ("http_4xx", re.compile(r"(?:HTTP error|Server returned) 4\d\d", re.IGNORECASE)),
+    ("http_5xx", re.compile(r"(?:HTTP error|Server returned) 5\d\d", re.IGNORECASE)),
+    ("segment_failures", re.compile(r"failed to open segment|unable to open|failed to reload playlist|skipping \d+ segments", re.IGNORECASE)),
+    ("timestamp_discontinuities", re.compile(r"non[- ]monoton|dts discontinuity|timestamp discontinuity|invalid timestamps|pts has no value", re.IGNORECASE)),
+    ("dropped_packets", re.compile(r"continuity check failed|packet corrupt|corrupt (?:decoded )?frame|discarding|dropping", re.IGNORECASE)),
+    ("errors", re.compile(r"error|invalid data", re.IGNORECASE)),
+]
+
+HEALTH_COUNTERS = [name for name, _ in LOG_PATTERNS]
+
+
+def classify_line(line: str) -> Optional[str]:
+    """Catégorie d'une ligne de log ffmpeg, ou None si elle n'est pas significative"""
+    for name, pattern in LOG_PATTERNS:
+        if pattern.search(line):
+            return name
+    return None
+
+
+class FFmpegLogTailer:
+    """
+    Suit un fichier ffmpeg.log depuis le dernier offset lu
+
+    Les compteurs survivent à la suppression du fichier (répertoire de session nettoyé).
+    """
+
+    def __init__(self, path: str, keep_lines: int = 5):
+        self.path = path
+        self._offset = 0
+        self._partial = b""
+        self._lock = threading.Lock()
+        self.counters: Dict[str, int] = {name: 0 for name in HEALTH_COUNTERS}
+        self.last_lines: deque = deque(maxlen=keep_lines)
+
+    def poll(self) -> Dict[str, int]:
+        """Lit les nouvelles lignes et met à jour les compteurs"""
+        with self._lock:
+            try:
+                with open(self.path, "rb") as f:
+                    f.seek(0, 2)
+                    size = f.tell()
+                    if size < self._offset:
+                        # Fichier recréé: repartir du début
+                        self._offset = 0
+                        self._partial = b""
+                    f.seek(self._offset)
+                    data = f.read(MAX_READ_BYTES)
+            except OSError:
+                return dict(self.counters)
+
+            self._offset += len(data)
+            lines = (self._partial + data).split(b"\n")
+            self._partial = lines.pop()
+            for raw in lines:
+                line = raw.decode("utf-8", errors="replace").strip()
+                if not line:
+                    continue
+                category = classify_line(line)
+                if category:
+                    self.counters[category] += 1
+                    self.last_lines.append(line[:300])
+            return dict(self.counters)
+
+    def record(self, category: str, message: str):
+        """Compte un événement signalé directement (moteur de capture sans ffmpeg)"""
+        with self._lock:
+            self.counters[category] = self.counters.get(category, 0) + 1
+            self.last_lines.append(message[:300])
+
+    def health(self) -> dict:
+        """Derniers compteurs connus, sans lecture du fichier (poll() par le sampler ou le reaper)"""
+        with self._lock:
+            return {
+                **self.counters,
+                "last_messages": list(self.last_lines),
+            }
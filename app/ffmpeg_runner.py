@@ -1,21 +1,91 @@
 import os
+import glob
+import signal
+import asyncio
+import functools
+import queue
+import shutil
 import uuid
 import threading
 import subprocess
 import time
+from collections import deque
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Callable, Dict, Iterable, List, Optional
 from .logger import logger
+from .live_hls import LiveSegmentCache, PLAYLIST_WATCH_INTERVAL
+from .proc_stats import ProcessSampler
+from .ffmpeg_log import FFmpegLogTailer, HEALTH_COUNTERS
+from .hls_variants import resolve_variant_url
+from .ts_index import TsKeyframeIndexer, build_byterange_playlist
+from .recording_layout import (
+    CONTAINER_MP4, CONTAINER_TS, LAYOUT_FILE, LAYOUT_SEGMENTS, MP4_MOVFLAGS, SEGMENT_DIR_SUFFIX, SegmentEntry,
+    build_segment_playlist, complete_recording, parse_live_playlist, partial_recording_path, write_segment_index,
+)
+
+
+# Lissage exponentiel du débit entrant (poids de la dernière mesure d'une seconde)
+INGRESS_EWMA_ALPHA = 0.3
+# Au-delà, une session sans octet reçu ne compte plus dans le débit agrégé
+INGRESS_STALE_SECONDS = 10
+# Écriture disque lente: le writer prend du retard sur ffmpeg (pipe plein, segments perdus)
+SLOW_WRITE_SECONDS = 0.25
+# Une écriture lente signale une contre-pression disque pendant cette durée
+WRITE_PRESSURE_SECONDS = 30
+
+
+# Sondage du codec audio d'une source avant un enregistrement MP4 (secondes)
+AUDIO_PROBE_TIMEOUT = 15
+
+
+def probe_audio_codec(url: str, ffmpeg_path: str = "ffmpeg", headers: Optional[Dict[str, str]] = None,
+                      timeout: float = AUDIO_PROBE_TIMEOUT) -> Optional[str]:
+    """Codec de la première piste audio d'une source (None si absente ou sondage impossible)"""
+    cmd = [ffmpeg_path.replace("ffmpeg", "ffprobe"), "-v", "error"]
+    if headers:
+        cmd += ["-headers", "".join(f"{key}: {value}\r\n" for key, value in headers.items())]
+    cmd += ["-select_streams", "a:0", "-show_entries", "stream=codec_name", "-of", "csv=p=0", url]
+    try:
+        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, timeout=timeout)
+    except (subprocess.TimeoutExpired, OSError) as e:
+        logger.debug("Sondage audio impossible", url=url[:80], error=str(e))
+        return None
+    lines = result.stdout.decode(errors="replace").split()
+    return lines[0] if result.returncode == 0 and lines else None
+
+
+class AdmissionError(RuntimeError):
+    """Démarrage refusé (ou mis en file d'attente) faute de capacité"""
+
+    def __init__(self, message: str, reason: str, queued: bool = False):
+        super().__init__(message)
+        self.reason = reason
+        self.queued = queued
 
 
 class FFmpegSession:
-    def __init__(self, session_id: str, input_url: str, sessions_dir: str, records_dir_for_person: str, person: str, display_name: Optional[str] = None):
+    # Moteur de capture (voir NativeHlsSession pour le moteur natif)
+    engine = "ffmpeg"
+    # Disposition et conteneur de l'enregistrement (voir SegmentedFFmpegSession et Mp4FFmpegSession)
+    layout = LAYOUT_FILE
+    container = CONTAINER_TS
+
+    def __init__(self, session_id: str, input_url: str, sessions_dir: str, records_dir_for_person: str, person: str, display_name: Optional[str] = None,
+                 dvr_segment_seconds: float = 4.0, priority: int = 0, on_exit: Optional[Callable[["FFmpegSession"], None]] = None,
+                 quality: str = "best", variant_url: Optional[str] = None):
         self.id = session_id
         self.input_url = input_url
+        # Qualité demandée et variante réellement enregistrée (input_url reste la master playlist)
+        self.quality = quality
+        self.variant_url = variant_url or input_url
+        # En-têtes HTTP fournis par l'appelant (résolveur) pour lire la master playlist; repris en file d'attente
+        self.request_headers: Optional[Dict[str, str]] = None
         self.sessions_dir = sessions_dir
         self.records_dir_for_person = records_dir_for_person
         self.person = person
         self.name = display_name or person or session_id
+        self.priority = priority
+        self._on_exit = on_exit
         self.created_at = datetime.utcnow().isoformat() + "Z"
         self.start_time = time.time()
         self.start_date = datetime.now().strftime("%Y-%m-%d")  # Date de début du stream
@@ -24,12 +94,51 @@ class FFmpegSession:
         self.process: Optional[subprocess.Popen] = None
         # Playback HLS is served from /streams/sessions/<id>/stream.m3u8
         self.playback_url = f"/streams/sessions/{self.id}/stream.m3u8"
+        # DVR: playlist par plages d'octets sur le fichier d'enregistrement
+        self.dvr_url = f"/streams/sessions/{self.id}/dvr.m3u8"
+        self.ts_index: Optional[TsKeyframeIndexer] = TsKeyframeIndexer(min_segment_duration=dvr_segment_seconds)
         # Recording file using unique name: YYYYMMDD_HHMMSS_ID.ts
         self.record_filename = f"{self.start_timestamp}_{session_id[:6]}.ts"
         self.record_path = os.path.join(self.records_dir_for_person, self.record_filename)
         self.log_path = os.path.join(self.sessions_dir, "ffmpeg.log")
+        # Compteurs de santé tirés de ffmpeg.log (reconnexions, erreurs HTTP, discontinuités...)
+        self.log_tailer = FFmpegLogTailer(self.log_path)
+        # L'aperçu à la demande a son propre log: ses erreurs ne comptent pas dans la santé de l'enregistrement
+        self.preview_log_path = os.path.join(self.sessions_dir, "preview.log")
         self._stop_evt = threading.Event()
+        # Positionné à la fin du processus (notification du writer ou arrêt explicite): pas de poll()
+        self._exited = threading.Event()
+        self.exit_code: Optional[int] = None
+        self.ended_at: Optional[float] = None
+        # Fichier renommé sans .part en fin de session (signal de fin pour conversion, miniatures, durées)
+        self.completed = False
+        # Enregistrée en base (fin de session, sinon par le reaper); remis à False si l'écriture échoue
+        self.recorded = False
+        # Nettoyée par le reaper (aperçu, cache); répertoire live supprimé après le délai de grâce
+        self.finalized = False
+        self.dir_removed = False
         self._writer_thread: Optional[threading.Thread] = None
+        # Aperçu HLS à la demande: ffmpeg alimenté par une copie du flux enregistré
+        self._preview_lock = threading.Lock()
+        self._preview_process: Optional[subprocess.Popen] = None
+        self._preview_queue: Optional[queue.Queue] = None
+        self._preview_thread: Optional[threading.Thread] = None
+        self.last_viewer_at = 0.0
+        # Débit entrant (octets reçus de ffmpeg)
+        self.bytes_total = 0
+        self.last_byte_at: Optional[float] = None
+        self.ingress_bps = 0.0
+        # Débit réservé à l'admission (préemption) tant que le débit réel n'est pas mesuré
+        self.ingress_reservation = 0.0
+        self._rate_bytes = 0
+        self._rate_window_start = time.monotonic()
+        # Latence des écritures disque (contre-pression: les conversions s'effacent)
+        self.write_latency_ms = 0.0
+        self.slow_writes = 0
+        self.last_slow_write_at: Optional[float] = None
+        # Ressources des processus ffmpeg (enregistrement et aperçu), lues dans /proc
+        self._proc_sampler = ProcessSampler()
+        self._preview_sampler = ProcessSampler()
         
         logger.debug("FFmpegSession initialisée", 
                     session_id=session_id, 
@@ -39,16 +148,258 @@ class FFmpegSession:
                     records_dir=records_dir_for_person)
 
     def is_running(self) -> bool:
-        return self.process is not None and self.process.poll() is None
+        return self.process is not None and not self._exited.is_set()
+
+    def _mark_exited(self):
+        if self.process is not None:
+            self.exit_code = self.process.returncode
+        if self.ended_at is None:
+            self.ended_at = time.time()
+        self._exited.set()
     
+    def _account_bytes(self, n: int):
+        """Met à jour le total reçu et le débit entrant lissé (EWMA par fenêtre d'une seconde)"""
+        self.bytes_total += n
+        self.last_byte_at = time.time()
+        self._rate_bytes += n
+        now = time.monotonic()
+        elapsed = now - self._rate_window_start
+        if elapsed >= 1.0:
+            rate = self._rate_bytes / elapsed
+            if self.ingress_bps:
+                self.ingress_bps = INGRESS_EWMA_ALPHA * rate + (1 - INGRESS_EWMA_ALPHA) * self.ingress_bps
+            else:
+                self.ingress_bps = rate
+            self._rate_bytes = 0
+            self._rate_window_start = now
+
+    def current_ingress_bps(self) -> float:
+        if not self.is_running() or not self.last_byte_at or time.time() - self.last_byte_at > INGRESS_STALE_SECONDS:
+            return 0.0
+        return self.ingress_bps
+
+    def admission_ingress_bps(self) -> float:
+        """Débit compté par l'admission: réservation tant qu'aucun débit n'est mesuré"""
+        if self.is_running() and self.ingress_bps <= 0:
+            return self.ingress_reservation
+        return self.current_ingress_bps()
+
+    def seconds_since_last_byte(self) -> Optional[float]:
+        if self.last_byte_at is None:
+            return None
+        return time.time() - self.last_byte_at
+
+    def _account_write(self, seconds: float):
+        """Latence d'une écriture d'enregistrement (EWMA, écritures lentes datées)"""
+        ms = seconds * 1000
+        if self.write_latency_ms:
+            self.write_latency_ms = INGRESS_EWMA_ALPHA * ms + (1 - INGRESS_EWMA_ALPHA) * self.write_latency_ms
+        else:
+            self.write_latency_ms = ms
+        if seconds >= SLOW_WRITE_SECONDS:
+            self.slow_writes += 1
+            self.last_slow_write_at = time.time()
+
+    def under_write_pressure(self) -> bool:
+        """Écriture lente récente: le disque ne suit plus l'enregistrement"""
+        return (self.last_slow_write_at is not None
+                and time.time() - self.last_slow_write_at < WRITE_PRESSURE_SECONDS)
+
+    def sample_resources(self):
+        """Échantillonne /proc (ffmpeg d'enregistrement et d'aperçu) et la suite du log (échantillonneur du manager)"""
+        running = self.is_running()
+        self._proc_sampler.sample(self.process.pid if running and self.process else None)
+        preview = self._preview_process
+        self._preview_sampler.sample(
+            preview.pid if running and preview is not None and preview.poll() is None else None
+        )
+        self.log_tailer.poll()
+
+    def metrics(self) -> dict:
+        """Débit, volume et ressources ffmpeg de la session (derniers échantillons, sans accès disque)"""
+        running = self.is_running()
+        cpu, rss = (self._proc_sampler.cpu_percent, self._proc_sampler.rss_bytes) if running else (0.0, 0)
+        preview_cpu, preview_rss = (
+            (self._preview_sampler.cpu_percent, self._preview_sampler.rss_bytes) if running else (0.0, 0)
+        )
+        idle = self.seconds_since_last_byte()
+        return {
+            "running": running,
+            "uptime_seconds": round((self.ended_at or time.time()) - self.start_time),
+            "bytes_total": self.bytes_total,
+            "ingress_bps": round(self.current_ingress_bps()),
+            "seconds_since_last_byte": round(idle, 1) if idle is not None else None,
+            # En cours mais plus rien reçu (ou rien du tout depuis le démarrage)
+            "stalled": running and (idle if idle is not None else time.time() - self.start_time) > INGRESS_STALE_SECONDS,
+            "cpu_percent": round(cpu, 1),
+            "rss_bytes": rss,
+            "preview_cpu_percent": round(preview_cpu, 1),
+            "preview_rss_bytes": preview_rss,
+            "write_latency_ms": round(self.write_latency_ms, 1),
+            "slow_writes": self.slow_writes,
+            "write_pressure": running and self.under_write_pressure(),
+            "health": self.log_tailer.health(),
+        }
+
+    def preview_active(self) -> bool:
+        proc = self._preview_process
+        return proc is not None and proc.poll() is None
+
+    def _feed_preview(self, chunk: bytes):
+        """Copie un chunk vers l'aperçu HLS sans jamais bloquer l'enregistrement"""
+        q = self._preview_queue
+        if q is None:
+            return
+        try:
+            q.put_nowait(chunk)
+        except queue.Full:
+            # L'aperçu est en retard: on sacrifie le live, jamais l'enregistrement
+            logger.debug("Aperçu HLS saturé, chunk ignoré", session_id=self.id)
+
+    def _preview_feeder_loop(self, proc: subprocess.Popen, q: queue.Queue):
+        """Écrit les chunks en attente sur le stdin du ffmpeg d'aperçu"""
+        try:
+            while True:
+                chunk = q.get()
+                if chunk is None:
+                    break
+                proc.stdin.write(chunk)
+        except (BrokenPipeError, ValueError, OSError):
+            logger.debug("Aperçu HLS: stdin fermé", session_id=self.id)
+        finally:
+            try:
+                proc.stdin.close()
+            except Exception:
+                pass
+
+    def start_preview(self, cmd: List[str]) -> bool:
+        """Démarre le ffmpeg d'aperçu HLS (idempotent)"""
+        with self._preview_lock:
+            self.last_viewer_at = time.time()
+            if self.preview_active():
+                return True
+            if not self.is_running():
+                return False
+
+            self._clear_preview_files()
+            log_f = open(self.preview_log_path, "ab", buffering=0)
+            try:
+                proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=log_f)
+            finally:
+                log_f.close()
+
+            q: queue.Queue = queue.Queue(maxsize=256)
+            t = threading.Thread(target=self._preview_feeder_loop, args=(proc, q),
+                                 name=f"hls-preview-{self.id}", daemon=True)
+            self._preview_process = proc
+            self._preview_queue = q
+            self._preview_thread = t
+            t.start()
+
+            logger.info("Aperçu HLS démarré", session_id=self.id, person=self.person, pid=proc.pid)
+            return True
+
+    def stop_preview(self):
+        """Arrête le ffmpeg d'aperçu HLS et supprime ses segments"""
+        with self._preview_lock:
+            proc = self._preview_process
+            q = self._preview_queue
+            if proc is None:
+                return
+            self._preview_process = None
+            self._preview_queue = None
+
+            if q is not None:
+                try:
+                    q.put_nowait(None)
+                except queue.Full:
+                    pass
+            try:
+                proc.terminate()
+                proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+            except Exception as e:
+                logger.error("Erreur arrêt aperçu HLS", session_id=self.id, error=str(e))
+
+            self._clear_preview_files()
+            logger.info("Aperçu HLS arrêté", session_id=self.id, person=self.person)
+
+    def _clear_preview_files(self):
+        for path in glob.glob(os.path.join(self.sessions_dir, "seg_*.ts")) + [os.path.join(self.sessions_dir, "stream.m3u8")]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def terminate(self):
+        """Arrête le processus ffmpeg puis attend la fin du thread d'écriture"""
+        if self.process and self.process.poll() is None:
+            try:
+                logger.debug("Arrêt événement writer", session_id=self.id)
+                self._stop_evt.set()
+                
+                logger.debug("Terminate processus FFmpeg", session_id=self.id, pid=self.process.pid)
+                self.process.terminate()
+                
+                try:
+                    self.process.wait(timeout=10)
+                    logger.info("Processus FFmpeg terminé proprement", session_id=self.id)
+                except subprocess.TimeoutExpired:
+                    logger.warning("Timeout terminate, kill forcé", session_id=self.id)
+                    self.process.kill()
+                    self.process.wait()
+            except Exception as e:
+                logger.error("Erreur arrêt processus FFmpeg", 
+                           session_id=self.id, 
+                           error=str(e))
+                           
+        if self._writer_thread and self._writer_thread.is_alive():
+            try:
+                logger.debug("Attente fin thread writer", session_id=self.id)
+                self._writer_thread.join(timeout=2)
+                if self._writer_thread.is_alive():
+                    logger.warning("Thread writer toujours actif après timeout", session_id=self.id)
+                else:
+                    logger.debug("Thread writer terminé", session_id=self.id)
+            except Exception as e:
+                logger.error("Erreur join thread writer", 
+                           session_id=self.id, 
+                           error=str(e))
+
     def record_path_today(self) -> str:
         # Utilise la date de début du stream (pas de rotation)
         return self.record_path
 
+    @property
+    def write_path(self) -> str:
+        """Fichier écrit pendant la capture (<nom>.part)"""
+        return partial_recording_path(self.record_path)
+
+    def current_record_path(self) -> str:
+        """Emplacement actuel de l'enregistrement (.part tant qu'il n'est pas finalisé)"""
+        return self.record_path if self.completed else self.write_path
+
+    def _complete_recording(self):
+        """Finalisation: <nom>.part renommé en <nom>, l'enregistrement est complet"""
+        try:
+            complete_recording(self.record_path)
+        except OSError as e:
+            logger.error("Finalisation enregistrement impossible", session_id=self.id, error=str(e))
+            return
+        self.completed = True
+
+    def dvr_playlist(self, uri: str, window_seconds: float) -> Optional[str]:
+        """Playlist DVR glissante (plages d'octets dans le .ts enregistré)"""
+        if self.ts_index is None:
+            return None
+        return build_byterange_playlist(self.ts_index.segments(), uri, window_seconds=window_seconds)
+
     def _writer_loop(self):
         """Read TS from ffmpeg stdout and append to single file (no rotation)."""
         if not self.process or not self.process.stdout:
             logger.warning("Writer loop: pas de processus ou stdout", session_id=self.id)
+            self._notify_exit()
             return
             
         os.makedirs(self.records_dir_for_person, exist_ok=True)
@@ -56,10 +407,12 @@ class FFmpegSession:
         logger.info("Writer loop démarré", 
                    session_id=self.id, 
                    person=self.person,
-                   record_path=self.record_path,
+                   record_path=self.write_path,
                    start_date=self.start_date)
         
-        f = open(self.record_path, "ab", buffering=0)
+        f = open(self.write_path, "ab", buffering=0)
+        if self.ts_index is not None:
+            self.ts_index.offset = os.fstat(f.fileno()).st_size
         total_bytes = 0
         chunk_count = 0
         
@@ -73,7 +426,13 @@ class FFmpegSession:
                                chunk_count=chunk_count)
                     break
                     
+                write_started = time.monotonic()
                 f.write(chunk)
+                self._account_write(time.monotonic() - write_started)
+                self._feed_preview(chunk)
+                if self.ts_index is not None:
+                    self.ts_index.feed(chunk)
+                self._account_bytes(len(chunk))
                 total_bytes += len(chunk)
                 chunk_count += 1
                 
@@ -101,39 +460,725 @@ class FFmpegSession:
                 logger.error("Erreur fermeture finale fichier", 
                            session_id=self.id, 
                            error=str(e))
+            self._complete_recording()
+            self._notify_exit()
+
+    def _notify_exit(self):
+        """Marque la session terminée et prévient le manager (index par personne, capacité)"""
+        try:
+            if self.process:
+                self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            # Plus personne ne lit stdout: le processus ne peut plus rien enregistrer
+            logger.warning("FFmpeg toujours actif après fin du flux, kill", session_id=self.id)
+            self.process.kill()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                pass
+        self._mark_exited()
+        if self._on_exit:
+            try:
+                self._on_exit(self)
+            except Exception as e:
+                logger.error("Erreur notification fin de session", session_id=self.id, error=str(e))
+
+
+class LiveOutputSession(FFmpegSession):
+    """Session dont ffmpeg produit lui-même la sortie HLS live, en permanence (pas d'aperçu à la demande)"""
+
+    def preview_active(self) -> bool:
+        return self.is_running()
+
+    def start_preview(self, cmd: List[str]) -> bool:
+        self.last_viewer_at = time.time()
+        return self.is_running()
+
+    def stop_preview(self):
+        pass
+
+
+class Mp4FFmpegSession(LiveOutputSession):
+    """
+    Enregistrement en MP4 fragmenté (copie de flux, sans transcodage)
+
+    Le fichier est lisible et navigable pendant qu'il grossit, et prêt dès la fin:
+    aucune conversion. Pas de DVR (index des keyframes propre au MPEG-TS).
+    """
+
+    container = CONTAINER_MP4
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.record_filename = f"{self.start_timestamp}_{self.id[:6]}.mp4"
+        self.record_path = os.path.join(self.records_dir_for_person, self.record_filename)
+        self.ts_index = None
+
+
+class SegmentedFFmpegSession(LiveOutputSession):
+    """
+    Enregistrement sans double écriture: la sortie HLS live est le seul writer
+
+    Chaque segment terminé est lié (hard link) dans records/<personne>/<id>.hls/,
+    ffmpeg peut ensuite le supprimer de la fenêtre live sans toucher à l'enregistrement.
+    index.m3u8 y est réécrit à chaque segment (EVENT), puis clos en VOD à la fin.
+    """
+
+    layout = LAYOUT_SEGMENTS
+
+    def __init__(self, *args, hls_time: float = 4, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.record_filename = f"{self.start_timestamp}_{self.id[:6]}{SEGMENT_DIR_SUFFIX}"
+        self.record_path = os.path.join(self.records_dir_for_person, self.record_filename)
+        self.record_url = f"/streams/records/{self.person}/{self.record_filename}/"
+        self._poll_interval = max(0.5, hls_time / 2)
+        self._segments: List[SegmentEntry] = []
+        self._next_sequence: Optional[int] = None
+        self._copy_fallback = False
+
+    @property
+    def write_path(self) -> str:
+        """Répertoire écrit en place: sa fin est signalée par #EXT-X-ENDLIST"""
+        return self.record_path
+
+    def dvr_playlist(self, uri: str, window_seconds: float) -> str:
+        """Playlist DVR sur les segments déjà liés dans l'enregistrement"""
+        return build_segment_playlist(list(self._segments), self.record_url, window_seconds=window_seconds)
+
+    # ---- Liaison des segments ----
+
+    def _link_segment(self, name: str) -> Optional[int]:
+        """Lie un segment live dans le répertoire d'enregistrement, retourne sa taille"""
+        src = os.path.join(self.sessions_dir, name)
+        dst = os.path.join(self.record_path, name)
+        try:
+            os.link(src, dst)
+        except FileExistsError:
+            pass
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            # Autre système de fichiers (EXDEV) ou liens non supportés: copie
+            if not self._copy_fallback:
+                self._copy_fallback = True
+                logger.warning("Hard link impossible, copie des segments", session_id=self.id, error=str(e))
+            try:
+                shutil.copy2(src, dst)
+            except FileNotFoundError:
+                return None
+        return os.path.getsize(dst)
+
+    def _link_new_segments(self, playlist_path: str) -> int:
+        """Lie les segments apparus dans stream.m3u8 depuis le dernier passage"""
+        try:
+            with open(playlist_path, "r") as f:
+                first_sequence, entries = parse_live_playlist(f.read())
+        except FileNotFoundError:
+            return 0
+
+        linked = 0
+        gap = False
+        if self._next_sequence is not None and first_sequence > self._next_sequence:
+            # Segments sortis de la fenêtre live avant d'avoir été liés
+            missed = first_sequence - self._next_sequence
+            self.log_tailer.record("segment_failures", f"{missed} segment(s) supprimé(s) avant liaison")
+            gap = True
+
+        for i, entry in enumerate(entries):
+            sequence = first_sequence + i
+            if self._next_sequence is not None and sequence < self._next_sequence:
+                continue
+            link_started = time.monotonic()
+            size = self._link_segment(entry.name)
+            self._account_write(time.monotonic() - link_started)
+            self._next_sequence = sequence + 1
+            if size is None:
+                self.log_tailer.record("segment_failures", f"Segment introuvable: {entry.name}")
+                gap = True
+                continue
+            self._segments.append(entry._replace(discontinuity=entry.discontinuity or gap))
+            self._account_bytes(size)
+            gap = False
+            linked += 1
+
+        if linked:
+            write_segment_index(self.record_path, self._segments)
+        return linked
+
+    def _writer_loop(self):
+        """Suit stream.m3u8 jusqu'à la fin de ffmpeg et lie chaque nouveau segment"""
+        if not self.process:
+            logger.warning("Liaison segments: pas de processus", session_id=self.id)
+            self._notify_exit()
+            return
+
+        os.makedirs(self.record_path, exist_ok=True)
+        playlist_path = os.path.join(self.sessions_dir, "stream.m3u8")
+        logger.info("Liaison segments démarrée",
+                    session_id=self.id,
+                    person=self.person,
+                    record_path=self.record_path)
+
+        try:
+            while True:
+                try:
+                    self.process.wait(timeout=self._poll_interval)
+                    finished = True
+                except subprocess.TimeoutExpired:
+                    finished = False
+                # Dernier passage après la fin: ffmpeg a publié le segment final en sortant
+                self._link_new_segments(playlist_path)
+                if finished:
+                    break
+        except Exception:
+            logger.error("Erreur liaison segments", session_id=self.id, exc_info=True)
+        finally:
+            try:
+                write_segment_index(self.record_path, self._segments, ended=True)
+                self.completed = True
+            except OSError as e:
+                logger.error("Erreur écriture index final", session_id=self.id, error=str(e))
+            logger.info("Liaison segments terminée",
+                        session_id=self.id,
+                        segments=len(self._segments),
+                        mb_written=f"{self.bytes_total / 1024 / 1024:.1f}")
+            self._notify_exit()
 
 
 class FFmpegManager:
-    def __init__(self, base_output_dir: str, ffmpeg_path: str = "ffmpeg", hls_time: int = 4, hls_list_size: int = 6):
+    def __init__(self, base_output_dir: str, ffmpeg_path: str = "ffmpeg", hls_time: float = 4, hls_list_size: int = 6, low_latency: bool = False,
+                 preview_on_demand: bool = True, preview_idle_timeout: float = 300,
+                 dvr_window_seconds: float = 3600, dvr_segment_seconds: float = 4.0,
+                 max_sessions: int = 0, max_ingress_bps: float = 0, min_free_disk_bytes: int = 0,
+                 preempt: bool = False, queue_max_age: float = 600,
+                 session_dir_grace: float = 600, max_finished_sessions: int = 50,
+                 capture_engine: str = "ffmpeg", native_max_connections: int = 64,
+                 record_layout: str = LAYOUT_FILE, record_container: str = CONTAINER_TS):
         self.base_output_dir = base_output_dir
         self.ffmpeg_path = ffmpeg_path
         self.hls_time = hls_time
         self.hls_list_size = hls_list_size
+        # Mode LL-HLS: segments courts, playlist servie avec rechargement bloquant
+        self.low_latency = low_latency
+        # Aperçu HLS lancé au premier spectateur et arrêté après inactivité
+        self.preview_on_demand = preview_on_demand
+        self.preview_idle_timeout = preview_idle_timeout
+        # Fenêtre DVR (0 = tout l'enregistrement en cours)
+        self.dvr_window_seconds = dvr_window_seconds
+        self.dvr_segment_seconds = dvr_segment_seconds
+        # Admission: limites de capacité (0 = illimité) et file d'attente par priorité
+        self.max_sessions = max_sessions
+        self.max_ingress_bps = max_ingress_bps
+        self.min_free_disk_bytes = min_free_disk_bytes
+        self.preempt = preempt
+        self.queue_max_age = queue_max_age
+        self._pending: Dict[str, dict] = {}
+        # Places accordées dont la session n'est pas encore enregistrée
+        self._reserved = 0
+        # Débit réservé par les préemptions en cours (session préemptée arrêtée, remplaçante pas encore lancée)
+        self._reserved_ingress_bps = 0.0
+        self._admission_log: deque = deque(maxlen=50)
         self._lock = threading.Lock()
         self._sessions: Dict[str, FFmpegSession] = {}
+        # Sessions terminées: répertoire live conservé session_dir_grace secondes, historique borné
+        self.session_dir_grace = session_dir_grace
+        self.max_finished_sessions = max_finished_sessions
+        # Moteur par défaut (ffmpeg ou native) et boucle/pool HTTP du moteur natif, créés à la demande
+        self.capture_engine = capture_engine
+        self.native_max_connections = native_max_connections
+        self._capture_runtime = None
+        # Disposition des enregistrements ffmpeg: fichier .ts (tee) ou segments HLS liés (une seule écriture)
+        self.record_layout = record_layout
+        # Conteneur des enregistrements ffmpeg en fichier unique: ts ou mp4 fragmenté (prêt sans conversion)
+        self.record_container = record_container
+        # Index personne -> session en cours (maintenu au démarrage et à la fin du processus)
+        self._by_person: Dict[str, FFmpegSession] = {}
+        self._person_locks: Dict[str, threading.Lock] = {}
+        # Notifications démarrage/fin de session (persistance), appelées depuis les threads
+        self._on_started: Optional[Callable[[FFmpegSession], None]] = None
+        self._on_ended: Optional[Callable[[FFmpegSession], None]] = None
         # Create subdirectories for sessions (HLS) and records (TS by person/day)
         self.sessions_root = os.path.join(self.base_output_dir, "sessions")
         self.records_root = os.path.join(self.base_output_dir, "records")
         os.makedirs(self.sessions_root, exist_ok=True)
         os.makedirs(self.records_root, exist_ok=True)
+        # Répertoires live du run précédent (relevés avant toute nouvelle session)
+        self.previous_session_dirs = {entry.name for entry in os.scandir(self.sessions_root) if entry.is_dir()}
+        # Cache mémoire des segments live partagé entre spectateurs
+        self.segment_cache = LiveSegmentCache(self.sessions_root, max_segments=hls_list_size + 2)
+        # Thread qui relit les playlists écrites par ffmpeg des sessions regardées (démarré au premier spectateur)
+        self._playlist_watcher: Optional[threading.Thread] = None
         
         logger.info("FFmpegManager initialisé",
                    base_output_dir=base_output_dir,
                    ffmpeg_path=ffmpeg_path,
                    hls_time=hls_time,
                    hls_list_size=hls_list_size,
+                   low_latency=low_latency,
+                   preview_on_demand=preview_on_demand,
+                   preview_idle_timeout=preview_idle_timeout,
+                   max_sessions=max_sessions,
+                   max_ingress_bps=max_ingress_bps,
+                   min_free_disk_bytes=min_free_disk_bytes,
+                   preempt=preempt,
+                   session_dir_grace=session_dir_grace,
+                   max_finished_sessions=max_finished_sessions,
+                   capture_engine=capture_engine,
+                   record_layout=record_layout,
+                   record_container=record_container,
                    sessions_root=self.sessions_root,
                    records_root=self.records_root)
 
-    def start_session(self, input_url: str, person: str, display_name: Optional[str] = None) -> FFmpegSession:
+    def _hls_flags(self) -> str:
+        hls_flags = "delete_segments+append_list+omit_endlist"
+        if self.low_latency:
+            # Segments indépendants (coupés à chaque keyframe) + horodatage pour le calcul de latence
+            hls_flags += "+independent_segments+program_date_time"
+        return hls_flags
+
+    def _preview_command(self, sess: FFmpegSession) -> List[str]:
+        """Commande ffmpeg qui re-segmente en HLS le flux MPEG-TS reçu sur stdin"""
+        return [
+            self.ffmpeg_path,
+            "-hide_banner", "-loglevel", "warning",
+            "-f", "mpegts", "-i", "pipe:0",
+            "-map", "0",
+            "-c", "copy",
+            "-f", "hls",
+            "-hls_time", str(self.hls_time),
+            "-hls_list_size", str(self.hls_list_size),
+            "-hls_flags", self._hls_flags(),
+            # Numérotation unique par démarrage: un nom de segment n'est jamais réutilisé (ETag/cache immuables)
+            "-start_number", str(int(time.time())),
+            "-hls_segment_filename", os.path.join(sess.sessions_dir, "seg_%06d.ts"),
+            "-y", os.path.join(sess.sessions_dir, "stream.m3u8"),
+        ]
+
+    def ensure_preview(self, session_id: str) -> bool:
+        """Garantit que l'aperçu HLS d'une session tourne et note l'activité spectateur"""
+        with self._lock:
+            sess = self._sessions.get(session_id)
+        if not sess:
+            return False
+        self._watch_playlists()
+        if not self.preview_on_demand:
+            sess.last_viewer_at = time.time()
+            return sess.is_running()
+        try:
+            return sess.start_preview(self._preview_command(sess))
+        except Exception as e:
+            logger.error("Erreur démarrage aperçu HLS", session_id=session_id, error=str(e))
+            return False
+
+    def _watch_playlists(self):
+        """Démarre (une fois) le thread qui publie dans le cache live les playlists écrites par ffmpeg"""
+        with self._lock:
+            if self._playlist_watcher is not None:
+                return
+            self._playlist_watcher = threading.Thread(target=self._playlist_watch_loop, name="live-playlists", daemon=True)
+        self._playlist_watcher.start()
+
+    def _playlist_watch_loop(self):
+        """
+        Relit les playlists des sessions regardées récemment et réveille les rechargements bloquants
+
+        ffmpeg n'offre aucun rappel à la fin d'un segment: un seul thread sonde les playlists pour
+        tous les spectateurs (au lieu d'un stat() par client sur la boucle). Les sessions natives
+        publient elles-mêmes dans le cache.
+        """
+        while True:
+            now = time.time()
+            with self._lock:
+                sessions = list(self._sessions.values())
+            for sess in sessions:
+                if sess.engine == "native" or not sess.is_running():
+                    continue
+                if now - sess.last_viewer_at >= self.preview_idle_timeout:
+                    continue
+                try:
+                    self.segment_cache.refresh(sess.id)
+                except Exception as e:
+                    logger.warning("Erreur relecture playlist live", session_id=sess.id, error=str(e))
+            time.sleep(PLAYLIST_WATCH_INTERVAL)
+
+    def reap_idle_previews(self) -> int:
+        """Arrête les aperçus HLS sans spectateur depuis preview_idle_timeout"""
+        if not self.preview_on_demand:
+            return 0
+        now = time.time()
+        with self._lock:
+            sessions = list(self._sessions.values())
+        stopped = 0
+        for sess in sessions:
+            if isinstance(sess, LiveOutputSession):
+                # Sortie HLS produite par le ffmpeg d'enregistrement: jamais arrêtée
+                continue
+            if sess._preview_process is None and not sess.preview_active():
+                continue
+            if now - sess.last_viewer_at >= self.preview_idle_timeout or not sess.is_running():
+                sess.stop_preview()
+                self.segment_cache.evict(sess.id)
+                stopped += 1
+        return stopped
+
+    def dvr_playlist(self, session_id: str, uri: str = "dvr.ts") -> Optional[str]:
+        """Playlist DVR glissante d'une session active (selon la disposition de l'enregistrement)"""
+        with self._lock:
+            sess = self._sessions.get(session_id)
+        if not sess or not sess.is_running():
+            return None
+        return sess.dvr_playlist(uri, self.dvr_window_seconds)
+
+    def get_record_path(self, session_id: str) -> Optional[str]:
+        with self._lock:
+            sess = self._sessions.get(session_id)
+        return sess.current_record_path() if sess else None
+
+    # ============================================
+    # Admission control
+    # ============================================
+
+    def _running_sessions(self) -> List[FFmpegSession]:
+        return list(self._by_person.values())
+
+    def _free_disk_bytes(self) -> int:
+        try:
+            return shutil.disk_usage(self.records_root).free
+        except OSError:
+            return 0
+
+    def _capacity_reason(self) -> Optional[str]:
+        """Raison du dépassement de capacité, ou None s'il reste de la place (appelé sous self._lock)"""
+        running = self._running_sessions()
+        if self.max_sessions and len(running) + self._reserved >= self.max_sessions:
+            return "sessions"
+        ingress = sum(s.admission_ingress_bps() for s in running) + self._reserved_ingress_bps
+        if self.max_ingress_bps and ingress >= self.max_ingress_bps:
+            return "ingress"
+        if self.min_free_disk_bytes and self._free_disk_bytes() < self.min_free_disk_bytes:
+            return "disk"
+        return None
+
+    def _log_admission(self, person: str, priority: int, reason: str, action: str):
+        self._admission_log.append({
+            "person": person,
+            "priority": priority,
+            "reason": reason,
+            "action": action,
+            "at": datetime.utcnow().isoformat() + "Z",
+        })
+
+    def _queue_start(self, input_url: str, person: str, display_name: Optional[str], priority: int, reason: str,
+                     quality: str = "best", engine: Optional[str] = None, headers: Optional[Dict[str, str]] = None):
+        self._pending[person] = {
+            "person": person,
+            "input_url": input_url,
+            "display_name": display_name,
+            "priority": priority,
+            "quality": quality,
+            "engine": engine,
+            "headers": headers,
+            "reason": reason,
+            "queued_at": time.time(),
+        }
+
+    def _admit(self, input_url: str, person: str, display_name: Optional[str], priority: int, quality: str,
+               engine: Optional[str], headers: Optional[Dict[str, str]] = None) -> float:
+        """
+        Vérifie la capacité avant un démarrage; préempte ou met en file d'attente si besoin
+
+        Retourne le débit réservé pour la session (préemption sur le débit), à libérer après le lancement.
+        """
+        with self._lock:
+            reason = self._capacity_reason()
+            if reason is None:
+                self._pending.pop(person, None)
+                self._reserved += 1
+                return 0.0
+
+            victim = None
+            if self.preempt and reason != "disk":
+                # Arrêter la session la moins prioritaire (la plus récente à priorité égale)
+                candidates = [s for s in self._running_sessions() if s.priority < priority]
+                if candidates:
+                    victim = min(candidates, key=lambda s: (s.priority, -s.start_time))
+
+            if victim is None:
+                self._queue_start(input_url, person, display_name, priority, reason, quality, engine, headers)
+                self._log_admission(person, priority, reason, "queued")
+            else:
+                # La session préemptée reprendra dès qu'une place se libère
+                self._queue_start(victim.input_url, victim.person, victim.name, victim.priority, "preempted", victim.quality,
+                                  victim.engine, victim.request_headers)
+                self._log_admission(victim.person, victim.priority, reason, "preempted")
+                self._reserved += 1
+                # Le débit libéré revient à la remplaçante: la file ne doit pas relancer la session préemptée
+                reserved_bps = 0.0
+                if reason == "ingress":
+                    running = self._running_sessions()
+                    reserved_bps = victim.current_ingress_bps() or (
+                        sum(s.current_ingress_bps() for s in running) / max(1, len(running)))
+                    self._reserved_ingress_bps += reserved_bps
+
+        if victim is None:
+            logger.warning("Démarrage mis en file d'attente (capacité atteinte)",
+                           person=person, priority=priority, reason=reason)
+            raise AdmissionError(f"Capacité atteinte ({reason}), démarrage de '{person}' en file d'attente.",
+                                 reason=reason, queued=True)
+
+        logger.warning("Préemption d'une session moins prioritaire",
+                       preempted=victim.person, preempted_priority=victim.priority,
+                       person=person, priority=priority, reason=reason)
+        self.stop_session(victim.id)
+        return reserved_bps
+
+    def drain_queue(self):
+        """
+        Démarre les sessions en attente, par priorité décroissante, tant qu'il reste de la capacité
+
+        Appelée à chaque fin de session et périodiquement (disque ou débit redevenus disponibles).
+        """
+        while True:
+            with self._lock:
+                now = time.time()
+                for person, entry in list(self._pending.items()):
+                    if now - entry["queued_at"] > self.queue_max_age:
+                        # URL HLS probablement expirée: l'auto-record la resoumettra
+                        del self._pending[person]
+                        self._log_admission(person, entry["priority"], entry["reason"], "expired")
+                if not self._pending or self._capacity_reason() is not None:
+                    return
+                entry = max(self._pending.values(), key=lambda e: (e["priority"], -e["queued_at"]))
+                del self._pending[entry["person"]]
+
+            try:
+                self.start_session(entry["input_url"], entry["person"], entry["display_name"],
+                                   priority=entry["priority"], quality=entry["quality"], engine=entry["engine"],
+                                   headers=entry["headers"])
+            except AdmissionError:
+                return
+            except Exception as e:
+                logger.error("Erreur démarrage session en attente", person=entry["person"], error=str(e))
+
+    def set_session_listener(self, on_started: Optional[Callable[[FFmpegSession], None]] = None,
+                             on_ended: Optional[Callable[[FFmpegSession], None]] = None):
+        """Callbacks appelés au lancement et à la fin de chaque session (depuis un thread)"""
+        self._on_started = on_started
+        self._on_ended = on_ended
+
+    def _notify_listener(self, callback: Optional[Callable[[FFmpegSession], None]], sess: FFmpegSession):
+        if not callback:
+            return
+        try:
+            callback(sess)
+        except Exception as e:
+            logger.error("Erreur notification session", session_id=sess.id, error=str(e))
+
+    def _forget_person(self, sess: FFmpegSession):
+        with self._lock:
+            forgotten = self._by_person.get(sess.person) is sess
+            if forgotten:
+                del self._by_person[sess.person]
+        if forgotten:
+            self._notify_listener(self._on_ended, sess)
+
+    def _on_session_exit(self, sess: FFmpegSession):
+        self._forget_person(sess)
+        if getattr(sess, "needs_ffmpeg", False) and not sess._stop_evt.is_set():
+            # Source non supportée par la capture native: relancer avec ffmpeg
+            try:
+                self.start_session(sess.input_url, sess.person, sess.name, priority=sess.priority,
+                                   quality=sess.quality, engine="ffmpeg", headers=sess.request_headers)
+            except Exception as e:
+                logger.error("Relance ffmpeg impossible", person=sess.person, error=str(e))
+            return
+        if not sess._stop_evt.is_set():
+            # Fin naturelle du flux (un arrêt explicite draine lui-même la file)
+            self.drain_queue()
+
+    def admission_status(self) -> dict:
+        with self._lock:
+            running = self._running_sessions()
+            pending = sorted(self._pending.values(), key=lambda e: (-e["priority"], e["queued_at"]))
+            return {
+                "limits": {
+                    "max_sessions": self.max_sessions,
+                    "max_ingress_bps": self.max_ingress_bps,
+                    "min_free_disk_bytes": self.min_free_disk_bytes,
+                    "preempt": self.preempt,
+                },
+                "usage": {
+                    "sessions": len(running),
+                    "ingress_bps": round(sum(s.current_ingress_bps() for s in running)),
+                    "free_disk_bytes": self._free_disk_bytes(),
+                },
+                "queued": [
+                    {
+                        "person": e["person"],
+                        "priority": e["priority"],
+                        "reason": e["reason"],
+                        "queued_for_seconds": round(time.time() - e["queued_at"]),
+                    }
+                    for e in pending
+                ],
+                "recent": list(self._admission_log),
+            }
+
+    def _ensure_not_recording(self, person: str):
+        # Prevent concurrent session for the same person to avoid TS conflicts
+        s = self._by_person.get(person)
+        if s is not None and s.is_running():
+            logger.warning("Session déjà en cours", person=person, existing_session_id=s.id)
+            raise RuntimeError(f"Une session est déjà en cours pour '{person}'.")
+
+    def is_recording(self, person: str) -> bool:
+        """Une session est-elle en cours pour cette personne (O(1), sans poll())"""
+        sess = self._by_person.get(person)
+        return sess is not None and sess.is_running()
+
+    def get_session(self, person: str) -> Optional[FFmpegSession]:
+        """Session en cours pour cette personne, ou None"""
+        sess = self._by_person.get(person)
+        return sess if sess is not None and sess.is_running() else None
+
+    def live_recordings(self) -> List[tuple]:
+        """(personne, fichier .ts, segments indexés) des enregistrements en cours (conversion incrémentale)"""
+        with self._lock:
+            sessions = list(self._by_person.values())
+        return [
+            (sess.person, sess.record_path, sess.ts_index.segments())
+            for sess in sessions
+            if sess.is_running() and sess.ts_index is not None
+        ]
+
+    def get_session_by_id(self, session_id: str) -> Optional[FFmpegSession]:
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def sample_sessions(self):
+        """Rafraîchit les ressources et compteurs de santé des sessions en cours (à appeler hors boucle asyncio)"""
+        with self._lock:
+            sessions = list(self._by_person.values())
+        for sess in sessions:
+            try:
+                sess.sample_resources()
+            except Exception as e:
+                logger.debug("Échantillonnage session impossible", session_id=sess.id, error=str(e))
+
+    def host_metrics(self, sessions_metrics: Optional[List[dict]] = None) -> dict:
+        """Agrégats sur toutes les sessions en cours + charge de l'hôte"""
+        if sessions_metrics is None:
+            with self._lock:
+                sessions = list(self._by_person.values())
+            sessions_metrics = [s.metrics() for s in sessions]
+        running = [m for m in sessions_metrics if m["running"]]
+        try:
+            load = os.getloadavg()
+        except OSError:
+            load = (0.0, 0.0, 0.0)
+        return {
+            "sessions_running": len(running),
+            "sessions_stalled": sum(1 for m in running if m["stalled"]),
+            "ingress_bps": sum(m["ingress_bps"] for m in running),
+            "cpu_percent": round(sum(m["cpu_percent"] + m["preview_cpu_percent"] for m in running), 1),
+            "rss_bytes": sum(m["rss_bytes"] + m["preview_rss_bytes"] for m in running),
+            "cpu_count": os.cpu_count() or 1,
+            "load_average": [round(x, 2) for x in load],
+            "free_disk_bytes": self._free_disk_bytes(),
+            "write_latency_ms": max((m["write_latency_ms"] for m in running), default=0.0),
+            "sessions_write_pressure": sum(1 for m in running if m["write_pressure"]),
+            "health": {name: sum(m["health"][name] for m in running) for name in HEALTH_COUNTERS},
+        }
+
+    def get_session_status(self, person: str) -> Optional[dict]:
+        """Statut (format list_status) de la session en cours pour cette personne"""
+        sess = self.get_session(person)
+        return self._session_status(sess) if sess else None
+
+    def start_session(self, input_url: str, person: str, display_name: Optional[str] = None, priority: int = 0,
+                      quality: str = "best", engine: Optional[str] = None,
+                      headers: Optional[Dict[str, str]] = None) -> FFmpegSession:
+        """
+        Démarre l'enregistrement d'une personne (ou le met en file d'attente: AdmissionError)
+
+        headers: en-têtes HTTP de la source (ceux du résolveur qui a fourni l'URL), aucun par défaut
+        """
         logger.ffmpeg_start("new", person, input_url)
         
         with self._lock:
-            # Prevent concurrent session for the same person to avoid TS conflicts
-            for s in self._sessions.values():
-                if getattr(s, "person", None) == person and s.is_running():
-                    logger.warning("Session déjà en cours", person=person, existing_session_id=s.id)
-                    raise RuntimeError(f"Une session est déjà en cours pour '{person}'.")
+            self._ensure_not_recording(person)
+        
+        reserved_bps = self._admit(input_url, person, display_name, priority, quality, engine, headers)
+        try:
+            # Lecture de la master playlist (réseau) hors du verrou de la personne
+            variant_url = resolve_variant_url(input_url, quality, headers=headers)
+            audio_codec = None
+            if self._records_mp4(engine):
+                # aac_adtstoasc seulement pour de l'AAC (échec du filtre, et de l'enregistrement, sinon)
+                audio_codec = probe_audio_codec(variant_url, self.ffmpeg_path, headers)
+            sess = self._launch_session(input_url, variant_url, person, display_name, priority, quality, engine,
+                                        audio_codec)
+            sess.request_headers = headers
+            # Réservation portée par la session jusqu'à la mesure de son débit
+            sess.ingress_reservation = reserved_bps
+            return sess
+        finally:
+            with self._lock:
+                self._reserved -= 1
+                self._reserved_ingress_bps -= reserved_bps
+
+    def _person_lock(self, person: str) -> threading.Lock:
+        """Verrou sérialisant démarrage/arrêt d'une même personne (sans bloquer les autres)"""
+        with self._lock:
+            lock = self._person_locks.get(person)
+            if lock is None:
+                lock = self._person_locks[person] = threading.Lock()
+            return lock
+
+    def _native_runtime(self):
+        if self._capture_runtime is None:
+            from .hls_capture import CaptureRuntime
+            self._capture_runtime = CaptureRuntime(max_connections=self.native_max_connections)
+        return self._capture_runtime
+
+    def _launch_native_session(self, session_id: str, input_url: str, variant_url: str, sessions_dir: str,
+                               records_dir_for_person: str, person: str, display_name: Optional[str],
+                               priority: int, quality: str) -> FFmpegSession:
+        """Capture par le moteur natif: pas de processus, une tâche sur la boucle de capture partagée"""
+        from .hls_capture import NativeHlsSession
+
+        sess = NativeHlsSession(session_id, input_url, sessions_dir, records_dir_for_person, person, display_name=display_name,
+                                dvr_segment_seconds=self.dvr_segment_seconds,
+                                priority=priority, on_exit=self._on_session_exit,
+                                quality=quality, variant_url=variant_url,
+                                runtime=self._native_runtime(),
+                                publish_list_size=self.hls_list_size,
+                                always_publish=not self.preview_on_demand,
+                                segment_cache=self.segment_cache)
+        with self._lock:
+            self._sessions[sess.id] = sess
+            self._by_person[person] = sess
+        sess.start()
+        self._notify_listener(self._on_started, sess)
+        logger.success("Session capture native prête",
+                       session_id=session_id,
+                       person=person,
+                       playback_url=sess.playback_url,
+                       record_path=sess.record_path)
+        return sess
+
+    def _records_mp4(self, engine: Optional[str]) -> bool:
+        """Session enregistrée directement en MP4 fragmenté (ffmpeg, fichier unique)"""
+        return ((engine or self.capture_engine) != "native" and self.record_layout != LAYOUT_SEGMENTS
+                and self.record_container == CONTAINER_MP4)
+
+    def _launch_session(self, input_url: str, variant_url: str, person: str, display_name: Optional[str], priority: int,
+                        quality: str = "best", engine: Optional[str] = None,
+                        audio_codec: Optional[str] = None) -> FFmpegSession:
+        # Le verrou global ne protège que les dictionnaires; mkdir/open/Popen se font sous le verrou de la personne
+        with self._person_lock(person):
+            with self._lock:
+                self._ensure_not_recording(person)
 
             session_id = uuid.uuid4().hex[:10]
             logger.info("Génération Session ID", session_id=session_id, person=person)
@@ -146,21 +1191,26 @@ class FFmpegManager:
             os.makedirs(records_dir_for_person, exist_ok=True)
             logger.debug("Création répertoire enregistrement", path=records_dir_for_person)
             
-            sess = FFmpegSession(session_id, input_url, sessions_dir, records_dir_for_person, person, display_name=display_name)
-
-            # Build tee spec: one branch to stdout (pipe:1) as MPEG-TS, one for HLS playback
-            hls_seg = os.path.join(sessions_dir, 'seg_%06d.ts')
-            hls_m3u8 = os.path.join(sessions_dir, 'stream.m3u8')
-
-            tee_spec = (
-                f"[f=mpegts]pipe:1|"
-                f"[f=hls:hls_time={self.hls_time}:hls_list_size={self.hls_list_size}:"
-                f"hls_flags=delete_segments+append_list+omit_endlist:"
-                f"hls_segment_filename={hls_seg}]"
-                f"{hls_m3u8}"
-            )
+            if (engine or self.capture_engine) == "native":
+                return self._launch_native_session(session_id, input_url, variant_url, sessions_dir,
+                                                   records_dir_for_person, person, display_name, priority, quality)
+            
+            segmented = self.record_layout == LAYOUT_SEGMENTS
+            mp4 = self._records_mp4(engine)
+            session_kwargs = dict(dvr_segment_seconds=self.dvr_segment_seconds,
+                                  priority=priority, on_exit=self._on_session_exit,
+                                  quality=quality, variant_url=variant_url)
+            if segmented:
+                sess = SegmentedFFmpegSession(session_id, input_url, sessions_dir, records_dir_for_person, person,
+                                              display_name=display_name, hls_time=self.hls_time, **session_kwargs)
+            elif mp4:
+                sess = Mp4FFmpegSession(session_id, input_url, sessions_dir, records_dir_for_person, person,
+                                        display_name=display_name, **session_kwargs)
+            else:
+                sess = FFmpegSession(session_id, input_url, sessions_dir, records_dir_for_person, person,
+                                     display_name=display_name, **session_kwargs)
 
-            cmd = [
+            input_args = [
                 self.ffmpeg_path,
                 "-nostdin", "-hide_banner", "-loglevel", "warning",
                 "-y",
@@ -168,12 +1218,52 @@ class FFmpegManager:
                 "-reconnect", "1",
                 "-reconnect_streamed", "1",
                 "-reconnect_delay_max", "10",
-                "-i", sess.input_url,
-                "-map", "0",
+                "-i", sess.variant_url,
+                # MP4: vidéo et audio sondé seulement (les pistes de métadonnées ID3 n'y ont pas de place)
+                *(["-map", "0:v?", "-map", "0:a:0?"] if mp4 else ["-map", "0"]),
                 "-c", "copy",
-                "-f", "tee", tee_spec,
             ]
 
+            if segmented:
+                # Sortie HLS seule: ses segments sont liés dans l'enregistrement, rien sur stdout
+                cmd = input_args + [
+                    "-f", "hls",
+                    "-hls_time", str(self.hls_time),
+                    "-hls_list_size", str(self.hls_list_size),
+                    "-hls_flags", self._hls_flags(),
+                    "-start_number", str(int(time.time())),
+                    "-hls_segment_filename", os.path.join(sessions_dir, "seg_%06d.ts"),
+                    os.path.join(sessions_dir, "stream.m3u8"),
+                ]
+            elif mp4:
+                # MP4 fragmenté sur pipe:1 (non découpable pour un aperçu à la demande): branche HLS permanente
+                hls_seg = os.path.join(sessions_dir, 'seg_%06d.ts')
+                hls_m3u8 = os.path.join(sessions_dir, 'stream.m3u8')
+                tee_spec = (
+                    f"[f=mp4:movflags={MP4_MOVFLAGS}{':bsfs/a=aac_adtstoasc' if audio_codec == 'aac' else ''}]pipe:1|"
+                    f"[f=hls:hls_time={self.hls_time}:hls_list_size={self.hls_list_size}:"
+                    f"hls_flags={self._hls_flags()}:"
+                    f"hls_segment_filename={hls_seg}]"
+                    f"{hls_m3u8}"
+                )
+                cmd = input_args + ["-f", "tee", tee_spec]
+            elif self.preview_on_demand:
+                # Enregistrement seul; l'aperçu HLS sera branché sur le pipe à la demande
+                cmd = input_args + ["-f", "mpegts", "pipe:1"]
+            else:
+                # Build tee spec: one branch to stdout (pipe:1) as MPEG-TS, one for HLS playback
+                hls_seg = os.path.join(sessions_dir, 'seg_%06d.ts')
+                hls_m3u8 = os.path.join(sessions_dir, 'stream.m3u8')
+
+                tee_spec = (
+                    f"[f=mpegts]pipe:1|"
+                    f"[f=hls:hls_time={self.hls_time}:hls_list_size={self.hls_list_size}:"
+                    f"hls_flags={self._hls_flags()}:"
+                    f"hls_segment_filename={hls_seg}]"
+                    f"{hls_m3u8}"
+                )
+                cmd = input_args + ["-f", "tee", tee_spec]
+
             logger.debug("Construction commande FFmpeg",
                         session_id=session_id,
                         command=" ".join(cmd[:15]) + "...",  # Première partie seulement
@@ -182,9 +1272,11 @@ class FFmpegManager:
             log_f = open(sess.log_path, "ab", buffering=0)
             try:
                 logger.progress("Lancement processus FFmpeg", session_id=session_id, person=person)
-                proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=log_f)
+                proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL if segmented else subprocess.PIPE, stderr=log_f)
                 sess.process = proc
-                self._sessions[sess.id] = sess
+                with self._lock:
+                    self._sessions[sess.id] = sess
+                    self._by_person[person] = sess
                 
                 logger.success("Processus FFmpeg démarré", 
                              session_id=session_id, 
@@ -195,6 +1287,7 @@ class FFmpegManager:
                 t = threading.Thread(target=sess._writer_loop, name=f"ts-writer-{sess.id}", daemon=True)
                 sess._writer_thread = t
                 t.start()
+                self._notify_listener(self._on_started, sess)
                 
                 logger.info("Thread d'écriture TS démarré", 
                           session_id=session_id, 
@@ -219,65 +1312,187 @@ class FFmpegManager:
     def stop_session(self, session_id: str) -> bool:
         with self._lock:
             sess = self._sessions.get(session_id)
-            if not sess:
-                logger.warning("Tentative d'arrêt session inexistante", session_id=session_id)
-                return False
-            
+        if not sess:
+            logger.warning("Tentative d'arrêt session inexistante", session_id=session_id)
+            return False
+
+        # terminate/wait/join peuvent prendre ~12 s: seul le verrou de la personne est tenu
+        with self._person_lock(sess.person):
             duration = time.time() - sess.start_time
             logger.ffmpeg_stop(session_id, sess.person, duration)
             
-            if sess.process and sess.process.poll() is None:
-                try:
-                    logger.debug("Arrêt événement writer", session_id=session_id)
-                    sess._stop_evt.set()
-                    
-                    logger.debug("Terminate processus FFmpeg", session_id=session_id, pid=sess.process.pid)
-                    sess.process.terminate()
-                    
-                    try:
-                        sess.process.wait(timeout=10)
-                        logger.info("Processus FFmpeg terminé proprement", session_id=session_id)
-                    except subprocess.TimeoutExpired:
-                        logger.warning("Timeout terminate, kill forcé", session_id=session_id)
-                        sess.process.kill()
-                except Exception as e:
-                    logger.error("Erreur arrêt processus FFmpeg", 
-                               session_id=session_id, 
-                               error=str(e))
-                               
-            if sess._writer_thread and sess._writer_thread.is_alive():
-                try:
-                    logger.debug("Attente fin thread writer", session_id=session_id)
-                    sess._writer_thread.join(timeout=2)
-                    if sess._writer_thread.is_alive():
-                        logger.warning("Thread writer toujours actif après timeout", session_id=session_id)
-                    else:
-                        logger.debug("Thread writer terminé", session_id=session_id)
-                except Exception as e:
-                    logger.error("Erreur join thread writer", 
-                               session_id=session_id, 
-                               error=str(e))
+            sess.stop_preview()
+            self.segment_cache.evict(session_id)
             
+            sess.terminate()
+            
+            sess._mark_exited()
+            self._forget_person(sess)
+
             logger.success("Session arrêtée", 
                           session_id=session_id, 
                           person=sess.person,
                           duration_seconds=f"{duration:.1f}")
-            return True
+        
+        # Une place s'est libérée: démarrer les sessions en attente
+        self.drain_queue()
+        return True
+
+    # ============================================
+    # Nettoyage des sessions terminées
+    # ============================================
+
+    def _remove_session_dir(self, sess: FFmpegSession):
+        try:
+            shutil.rmtree(sess.sessions_dir)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning("Suppression répertoire session impossible", session_id=sess.id, error=str(e))
+            return
+        sess.dir_removed = True
+
+    def reap_finished_sessions(self) -> List[FFmpegSession]:
+        """
+        Finalise les sessions terminées
+
+        Supprime leur répertoire live (segments, ffmpeg.log) après le délai de grâce et
+        borne l'historique en mémoire. Retourne les sessions terminées pas encore enregistrées
+        en base (nouvelles ou dont l'écriture a échoué), à enregistrer par l'appelant.
+        """
+        now = time.time()
+        with self._lock:
+            finished = [s for s in self._sessions.values() if s.ended_at is not None]
+
+        newly_finished = []
+        for sess in finished:
+            if not sess.finalized:
+                sess.finalized = True
+                # Dernière lecture du log avant la suppression du répertoire
+                sess.log_tailer.poll()
+                sess.stop_preview()
+                self.segment_cache.evict(sess.id)
+                newly_finished.append(sess)
+            if not sess.dir_removed and now - sess.ended_at >= self.session_dir_grace:
+                self._remove_session_dir(sess)
+                logger.debug("Répertoire session supprimé", session_id=sess.id, person=sess.person)
+
+        # Y compris les sessions retirées ci-dessous: dernière tentative d'écriture en base
+        unrecorded = [s for s in finished if not s.recorded]
+
+        # Ne garder que les max_finished_sessions plus récentes
+        finished.sort(key=lambda s: s.ended_at)
+        dropped = finished[:max(0, len(finished) - self.max_finished_sessions)]
+        for sess in dropped:
+            if not sess.dir_removed:
+                self._remove_session_dir(sess)
+        with self._lock:
+            for sess in dropped:
+                self._sessions.pop(sess.id, None)
+            # Verrous des personnes sans session connue
+            known = {s.person for s in self._sessions.values()}
+            for person in [p for p, lock in self._person_locks.items() if p not in known and not lock.locked()]:
+                del self._person_locks[person]
+
+        if newly_finished or dropped:
+            logger.info("Sessions terminées nettoyées",
+                        finalized=len(newly_finished),
+                        dropped=len(dropped),
+                        remaining=len(self._sessions))
+        return unrecorded
+
+    def cleanup_orphan_session_dirs(self, session_ids: Iterable[str]) -> int:
+        """
+        Supprime les répertoires sessions/<id> du run précédent
+
+        Seuls les identifiants donnés sont visés (sessions interrompues, répertoires relevés au
+        démarrage): les sessions lancées entre-temps ne sont jamais touchées.
+        """
+        with self._lock:
+            known = set(self._sessions)
+        removed = 0
+        for session_id in set(session_ids) - known:
+            path = os.path.join(self.sessions_root, session_id)
+            if not os.path.isdir(path):
+                continue
+            try:
+                shutil.rmtree(path)
+                removed += 1
+            except OSError as e:
+                logger.warning("Suppression répertoire orphelin impossible", path=path, error=str(e))
+        if removed:
+            logger.info("Répertoires de session orphelins supprimés", count=removed, sessions_root=self.sessions_root)
+        return removed
+
+    def terminate_orphan(self, pid: Optional[int], input_url: str) -> bool:
+        """
+        Termine un ffmpeg laissé par un run précédent
+
+        Son stdout était un pipe vers l'ancien processus: il ne peut pas être
+        réadopté, seulement libéré. Le pid n'est tué que si sa ligne de commande
+        correspond bien à la session (pid réutilisé sinon).
+        """
+        if not pid:
+            return False
+        try:
+            with open(f"/proc/{pid}/cmdline", "rb") as f:
+                args = f.read().split(b"\0")
+        except OSError:
+            return False
+        if not args or b"ffmpeg" not in os.path.basename(args[0]) or input_url.encode() not in args:
+            return False
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except OSError:
+            return False
+        logger.warning("FFmpeg orphelin terminé", pid=pid)
+        return True
+
+    # ============================================
+    # Variantes asynchrones (travail bloquant dans l'executor)
+    # ============================================
+
+    async def start_session_async(self, input_url: str, person: str, display_name: Optional[str] = None, priority: int = 0,
+                                  quality: str = "best", engine: Optional[str] = None,
+                                  headers: Optional[Dict[str, str]] = None) -> FFmpegSession:
+        """start_session sans bloquer la boucle asyncio (fork/exec de ffmpeg dans un thread)"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, functools.partial(self.start_session, input_url, person, display_name,
+                                    priority=priority, quality=quality, engine=engine, headers=headers)
+        )
+
+    async def stop_session_async(self, session_id: str) -> bool:
+        """stop_session sans bloquer la boucle asyncio (attente de ffmpeg dans un thread)"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.stop_session, session_id)
+
+    def _session_status(self, sess: FFmpegSession) -> dict:
+        return {
+            "id": sess.id,
+            "person": sess.person,
+            "name": sess.name,
+            "input_url": sess.input_url,
+            "created_at": sess.created_at,
+            "running": sess.is_running(),
+            "playback_url": sess.playback_url,
+            "preview_active": sess.preview_active(),
+            "priority": sess.priority,
+            "quality": sess.quality,
+            "engine": sess.engine,
+            "layout": sess.layout,
+            "container": sess.container,
+            "variant_url": sess.variant_url,
+            "ingress_bps": round(sess.current_ingress_bps()),
+            "metrics": sess.metrics(),
+            "dvr_url": sess.dvr_url,
+            "record_path": sess.record_path,
+            "start_date": sess.start_date,
+        }
 
     def list_status(self) -> List[dict]:
         with self._lock:
-            out = []
-            for sess in self._sessions.values():
-                out.append({
-                    "id": sess.id,
-                    "person": sess.person,
-                    "name": sess.name,
-                    "input_url": sess.input_url,
-                    "created_at": sess.created_at,
-                    "running": sess.is_running(),
-                    "playback_url": sess.playback_url,
-                    "record_path": sess.record_path,
-                    "start_date": sess.start_date,
-                })
-            logger.debug("Liste status sessions", count=len(out), sessions=[s["id"] for s in out])
-            return out
+            sessions = list(self._sessions.values())
+        out = [self._session_status(sess) for sess in sessions]
+        logger.debug("Liste status sessions", count=len(out), sessions=[s["id"] for s in out])
+        return out
@@ -0,0 +1,356 @@
+"""
+Moteur de capture HLS natif (asyncio, sans ffmpeg)
+Recharge la playlist média, télécharge les nouveaux segments sur le pool HTTP partagé,
+les ajoute au fichier d'enregistrement et les republie pour l'aperçu live
+"""
+import asyncio
+import os
+import re
+import threading
+import time
+from collections import deque
+from typing import List, NamedTuple, Optional, Tuple
+from urllib.parse import urljoin
+
+import aiohttp
+
+from .ffmpeg_runner import FFmpegSession
+from .hls_variants import parse_master_playlist, select_variant
+from .logger import logger
+
+# Segments téléchargés en parallèle par session (l'écriture reste dans l'ordre)
+SEGMENT_CONCURRENCY = 3
+SEGMENT_RETRIES = 2
+# Segments repris au démarrage (au plus près du direct, comme ffmpeg)
+LIVE_START_SEGMENTS = 3
+# Playlist injoignable plus longtemps que ça: le stream est considéré terminé
+PLAYLIST_GIVE_UP_SECONDS = 30
+
+_MEDIA_SEQUENCE_RE = re.compile(r'^#EXT-X-MEDIA-SEQUENCE:(\d+)', re.MULTILINE)
+_TARGET_DURATION_RE = re.compile(r'^#EXT-X-TARGETDURATION:(\d+)', re.MULTILINE)
+_KEY_METHOD_RE = re.compile(r'^#EXT-X-KEY:.*METHOD=([A-Z0-9-]+)', re.MULTILINE)
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+
+
+class MediaSegment(NamedTuple):
+    sequence: int
+    uri: str
+    duration: float
+    discontinuity: bool
+
+
+class MediaPlaylist(NamedTuple):
+    target_duration: int
+    segments: List[MediaSegment]
+    endlist: bool
+    # Segments fMP4 (EXT-X-MAP) ou chiffrés: non concaténables en MPEG-TS
+    unsupported: Optional[str]
+
+
+def parse_media_segments(text: str) -> MediaPlaylist:
+    """Analyse une playlist média HLS (séquence, durées, discontinuités)"""
+    match = _MEDIA_SEQUENCE_RE.search(text)
+    sequence = int(match.group(1)) if match else 0
+    match = _TARGET_DURATION_RE.search(text)
+    target_duration = int(match.group(1)) if match else 6
+
+    unsupported = None
+    if "#EXT-X-MAP" in text:
+        unsupported = "segments fMP4 (EXT-X-MAP)"
+    else:
+        match = _KEY_METHOD_RE.search(text)
+        if match and match.group(1) != "NONE":
+            unsupported = f"segments chiffrés ({match.group(1)})"
+
+    segments = []
+    duration = 0.0
+    discontinuity = False
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith("#EXTINF:"):
+            try:
+                duration = float(line[8:].split(",", 1)[0])
+            except ValueError:
+                duration = 0.0
+        elif line.startswith("#EXT-X-DISCONTINUITY") and not line.startswith("#EXT-X-DISCONTINUITY-SEQUENCE"):
+            discontinuity = True
+        elif line and not line.startswith("#"):
+            segments.append(MediaSegment(sequence, line, duration, discontinuity))
+            sequence += 1
+            duration = 0.0
+            discontinuity = False
+    return MediaPlaylist(target_duration, segments, "#EXT-X-ENDLIST" in text, unsupported)
+
+
+class CaptureRuntime:
+    """
+    Boucle asyncio dédiée aux captures natives et pool HTTP partagé
+
+    La boucle tourne dans son propre thread: le manager (synchrone) y soumet
+    les captures, et le serveur web n'en subit pas la charge.
+    """
+
+    def __init__(self, max_connections: int = 64):
+        self.max_connections = max_connections
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._http: Optional[aiohttp.ClientSession] = None
+
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="hls-capture-loop", daemon=True).start()
+                self._loop = loop
+                logger.info("Boucle de capture HLS native démarrée", max_connections=self.max_connections)
+            return self._loop
+
+    def submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop())
+
+    async def http(self) -> aiohttp.ClientSession:
+        # Appelé uniquement depuis la boucle de capture
+        if self._http is None or self._http.closed:
+            self._http = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections, ttl_dns_cache=300),
+                headers={"User-Agent": USER_AGENT},
+            )
+        return self._http
+
+
+class NativeHlsSession(FFmpegSession):
+    """Session capturée par le moteur natif: même interface que FFmpegSession, sans processus"""
+
+    engine = "native"
+
+    def __init__(self, *args, runtime: CaptureRuntime, publish_list_size: int = 6, always_publish: bool = False,
+                 segment_cache=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._runtime = runtime
+        # Cache live du manager: alimenté à chaque publication (réveille les rechargements bloquants)
+        self._segment_cache = segment_cache
+        self._future = None
+        self._done = threading.Event()
+        self._publish = always_publish
+        self._always_publish = always_publish
+        self._published: deque = deque()
+        self._publish_list_size = publish_list_size
+        self._publish_sequence = int(time.time())
+        self._publish_target = 1
+        # Source non concaténable: le manager relance la session avec ffmpeg
+        self.needs_ffmpeg = False
+
+    def is_running(self) -> bool:
+        return self._future is not None and not self._exited.is_set()
+
+    def start(self):
+        os.makedirs(self.records_dir_for_person, exist_ok=True)
+        self._future = self._runtime.submit(self._run())
+
+    def terminate(self):
+        self._stop_evt.set()
+        if self._future is not None:
+            self._future.cancel()
+        if not self._done.wait(timeout=10):
+            logger.warning("Capture native toujours active après timeout", session_id=self.id)
+
+    # ---- Aperçu live: republication des segments capturés ----
+
+    def preview_active(self) -> bool:
+        return self._publish and self.is_running()
+
+    def start_preview(self, cmd: List[str]) -> bool:
+        self.last_viewer_at = time.time()
+        if not self.is_running():
+            return False
+        if not self._publish:
+            self._publish = True
+            logger.info("Aperçu HLS natif activé", session_id=self.id, person=self.person)
+        return True
+
+    def stop_preview(self):
+        if not self._publish or self._always_publish and self.is_running():
+            return
+        self._publish = False
+        self._published.clear()
+        self._clear_preview_files()
+        logger.info("Aperçu HLS natif arrêté", session_id=self.id, person=self.person)
+
+    def _publish_segment(self, data: bytes, duration: float, discontinuity: bool):
+        """Écrit le segment dans sessions/<id>/ et réécrit stream.m3u8 (fenêtre glissante)"""
+        name = f"seg_{self._publish_sequence:06d}.ts"
+        with open(os.path.join(self.sessions_dir, name), "wb") as f:
+            f.write(data)
+        self._published.append((self._publish_sequence, name, duration, discontinuity))
+        self._publish_sequence += 1
+        self._publish_target = max(self._publish_target, int(duration + 0.999))
+
+        while len(self._published) > self._publish_list_size:
+            _, old, _, _ = self._published.popleft()
+            try:
+                os.remove(os.path.join(self.sessions_dir, old))
+            except FileNotFoundError:
+                pass
+
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:3",
+            f"#EXT-X-TARGETDURATION:{self._publish_target}",
+            f"#EXT-X-MEDIA-SEQUENCE:{self._published[0][0]}",
+        ]
+        for _, seg_name, seg_duration, seg_discontinuity in self._published:
+            if seg_discontinuity:
+                lines.append("#EXT-X-DISCONTINUITY")
+            lines.append(f"#EXTINF:{seg_duration:.3f},")
+            lines.append(seg_name)
+        text = "\n".join(lines) + "\n"
+        playlist = os.path.join(self.sessions_dir, "stream.m3u8")
+        tmp = playlist + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(text)
+        os.replace(tmp, playlist)
+        if self._segment_cache is not None:
+            self._segment_cache.publish(self.id, text, name, data, os.stat(playlist).st_mtime_ns)
+
+    # ---- Capture ----
+
+    def _write_segment(self, f, data: bytes) -> float:
+        """
+        Écrit puis indexe un segment, dans un thread (rien de coûteux sur la boucle partagée)
+
+        Retourne la durée de l'écriture seule (hors attente d'ordonnancement et indexation).
+        """
+        started = time.monotonic()
+        f.write(data)
+        elapsed = time.monotonic() - started
+        self.ts_index.feed(data)
+        return elapsed
+
+    async def _fetch_playlist(self, http: aiohttp.ClientSession) -> Tuple[str, str]:
+        async with http.get(self.variant_url, timeout=aiohttp.ClientTimeout(total=10)) as resp:
+            if resp.status >= 400:
+                category = "http_5xx" if resp.status >= 500 else "http_4xx"
+                self.log_tailer.record(category, f"Playlist HTTP {resp.status}")
+                raise aiohttp.ClientResponseError(resp.request_info, resp.history, status=resp.status)
+            return await resp.text(), str(resp.url)
+
+    async def _fetch_segment(self, http: aiohttp.ClientSession, sem: asyncio.Semaphore, url: str, timeout: float) -> Optional[bytes]:
+        async with sem:
+            for attempt in range(SEGMENT_RETRIES + 1):
+                try:
+                    async with http.get(url, timeout=aiohttp.ClientTimeout(total=timeout)) as resp:
+                        if resp.status == 200:
+                            return await resp.read()
+                        category = "http_5xx" if resp.status >= 500 else "http_4xx"
+                        self.log_tailer.record(category, f"Segment HTTP {resp.status}: {url[-60:]}")
+                        if resp.status < 500:
+                            return None
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    self.log_tailer.record("reconnects", f"Segment: {type(e).__name__}")
+                if attempt < SEGMENT_RETRIES:
+                    await asyncio.sleep(0.5 * (attempt + 1))
+        return None
+
+    async def _run(self):
+        logger.info("Capture HLS native démarrée", session_id=self.id, person=self.person, record_path=self.write_path)
+        f = None
+        try:
+            http = await self._runtime.http()
+            f = open(self.write_path, "ab", buffering=0)
+            self.ts_index.offset = os.fstat(f.fileno()).st_size
+            sem = asyncio.Semaphore(SEGMENT_CONCURRENCY)
+            last_sequence: Optional[int] = None
+            failing_since: Optional[float] = None
+
+            while not self._stop_evt.is_set():
+                try:
+                    text, playlist_url = await self._fetch_playlist(http)
+                    failing_since = None
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    failing_since = failing_since or time.time()
+                    if time.time() - failing_since > PLAYLIST_GIVE_UP_SECONDS:
+                        logger.info("Playlist injoignable, fin de capture", session_id=self.id, error=str(e))
+                        break
+                    self.log_tailer.record("reconnects", f"Playlist: {type(e).__name__}")
+                    await asyncio.sleep(2)
+                    continue
+
+                if "#EXT-X-STREAM-INF" in text:
+                    # Master playlist (sélection de variante impossible au lancement): choisir ici
+                    chosen = select_variant(parse_master_playlist(text, playlist_url), self.quality)
+                    if chosen is None:
+                        break
+                    self.variant_url = chosen.url
+                    continue
+
+                playlist = parse_media_segments(text)
+                if playlist.unsupported:
+                    logger.warning("Source non supportée par la capture native, bascule sur ffmpeg",
+                                   session_id=self.id, reason=playlist.unsupported)
+                    self.needs_ffmpeg = True
+                    break
+
+                segments = playlist.segments
+                if last_sequence is not None and segments and segments[-1].sequence < last_sequence:
+                    # Séquence remise à zéro (redémarrage du stream côté source)
+                    self.log_tailer.record("timestamp_discontinuities", "Séquence média réinitialisée")
+                    last_sequence = segments[0].sequence - 1
+
+                if last_sequence is None:
+                    new = segments[-LIVE_START_SEGMENTS:]
+                else:
+                    new = [s for s in segments if s.sequence > last_sequence]
+                    if new and new[0].sequence > last_sequence + 1:
+                        missed = new[0].sequence - last_sequence - 1
+                        self.log_tailer.record("segment_failures", f"{missed} segment(s) sortis de la playlist avant téléchargement")
+
+                if new:
+                    timeout = max(10.0, 3.0 * playlist.target_duration)
+                    results = await asyncio.gather(*[
+                        self._fetch_segment(http, sem, urljoin(playlist_url, s.uri), timeout) for s in new
+                    ])
+                    gap = False
+                    for segment, data in zip(new, results):
+                        if data is None:
+                            self.log_tailer.record("segment_failures", f"Segment {segment.sequence} perdu")
+                            gap = True
+                            continue
+                        self._account_write(await asyncio.to_thread(self._write_segment, f, data))
+                        self._account_bytes(len(data))
+                        if segment.discontinuity:
+                            self.log_tailer.record("timestamp_discontinuities", f"Discontinuité au segment {segment.sequence}")
+                        if self._publish:
+                            await asyncio.to_thread(self._publish_segment, data, segment.duration, segment.discontinuity or gap)
+                        gap = False
+                    last_sequence = new[-1].sequence
+
+                if playlist.endlist:
+                    logger.info("Fin de playlist (ENDLIST)", session_id=self.id)
+                    break
+
+                # Rechargement: durée cible, ou moitié si rien de nouveau (RFC 8216 §6.3.4)
+                await asyncio.sleep(playlist.target_duration if new else max(0.5, playlist.target_duration / 2))
+
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error("Erreur capture HLS native", session_id=self.id, exc_info=True, error=str(e))
+        finally:
+            if f is not None:
+                f.close()
+                if self.needs_ffmpeg and self.bytes_total == 0:
+                    # Rien capturé avant la bascule: pas de .ts vide à côté de l'enregistrement ffmpeg
+                    try:
+                        os.remove(self.write_path)
+                    except FileNotFoundError:
+                        pass
+                else:
+                    self._complete_recording()
+            logger.info("Capture HLS native terminée", session_id=self.id, bytes_total=self.bytes_total)
+            self._done.set()
+            if not self._stop_evt.is_set():
+                # Fin naturelle: notifier hors de la boucle (le manager peut démarrer d'autres sessions)
+                threading.Thread(target=self._notify_exit, name=f"hls-exit-{self.id}", daemon=True).start()
+            else:
+                self._notify_exit()
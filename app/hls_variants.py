@@ -0,0 +1,126 @@
+"""
+Sélection de variante HLS selon la qualité d'enregistrement d'un modèle
+Analyse la master playlist (BANDWIDTH / RESOLUTION / FRAME-RATE) et choisit le flux à enregistrer
+"""
+import re
+from typing import Dict, List, NamedTuple, Optional
+from urllib.parse import urljoin
+
+import requests
+
+from .logger import logger
+
+_ATTRIBUTE_RE = re.compile(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)')
+_HEIGHT_QUALITY_RE = re.compile(r'^(\d+)p$')
+_BITRATE_QUALITY_RE = re.compile(r'^(\d+(?:\.\d+)?)\s*(k|m)bps$')
+
+QUALITY_BEST = "best"
+
+
+class HlsVariant(NamedTuple):
+    url: str
+    bandwidth: int
+    width: int
+    height: int
+    frame_rate: float
+
+
+def parse_master_playlist(text: str, base_url: str) -> List[HlsVariant]:
+    """Liste les variantes d'une master playlist (vide si c'est une playlist média)"""
+    variants = []
+    attributes = None
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith("#EXT-X-STREAM-INF:"):
+            attributes = dict(
+                (key, value.strip('"'))
+                for key, value in _ATTRIBUTE_RE.findall(line.split(":", 1)[1])
+            )
+            continue
+        if attributes is None or not line or line.startswith("#"):
+            continue
+
+        width = height = 0
+        resolution = attributes.get("RESOLUTION", "")
+        if "x" in resolution:
+            try:
+                width, height = (int(v) for v in resolution.lower().split("x", 1))
+            except ValueError:
+                pass
+        try:
+            bandwidth = int(attributes.get("BANDWIDTH") or attributes.get("AVERAGE-BANDWIDTH") or 0)
+        except ValueError:
+            bandwidth = 0
+        try:
+            frame_rate = float(attributes.get("FRAME-RATE") or 0)
+        except ValueError:
+            frame_rate = 0.0
+
+        variants.append(HlsVariant(urljoin(base_url, line), bandwidth, width, height, frame_rate))
+        attributes = None
+    return variants
+
+
+def select_variant(variants: List[HlsVariant], quality: Optional[str]) -> Optional[HlsVariant]:
+    """
+    Choisit la variante correspondant à record_quality
+
+    - best: débit le plus élevé
+    - 1080p / 720p / 480p / 360p: meilleure variante dont la hauteur ne dépasse pas la cible
+    - 2500kbps / 3mbps: meilleure variante sous ce plafond de débit
+    À défaut de variante sous la limite, la plus légère est retenue.
+    """
+    if not variants:
+        return None
+
+    def rank(v: HlsVariant):
+        return (v.bandwidth, v.height, v.frame_rate)
+
+    quality = (quality or QUALITY_BEST).strip().lower()
+    candidates = variants
+
+    match = _HEIGHT_QUALITY_RE.match(quality)
+    if match:
+        target = int(match.group(1))
+        candidates = [v for v in variants if v.height and v.height <= target]
+    else:
+        match = _BITRATE_QUALITY_RE.match(quality)
+        if match:
+            cap = float(match.group(1)) * (1_000_000 if match.group(2) == "m" else 1_000)
+            candidates = [v for v in variants if v.bandwidth and v.bandwidth <= cap]
+
+    if not candidates:
+        return min(variants, key=rank)
+    return max(candidates, key=rank)
+
+
+def resolve_variant_url(url: str, quality: Optional[str], timeout: float = 10,
+                        headers: Optional[Dict[str, str]] = None) -> str:
+    """
+    URL du flux à enregistrer pour cette qualité
+
+    headers: en-têtes du résolveur (User-Agent, Referer) pour la lecture de la master playlist.
+    Retourne l'URL d'origine si ce n'est pas une master playlist ou en cas d'erreur.
+    """
+    try:
+        resp = requests.get(url, timeout=timeout, headers=headers or {
+            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
+        })
+        if resp.status_code != 200:
+            return url
+        variants = parse_master_playlist(resp.text, resp.url or url)
+    except requests.RequestException as e:
+        logger.debug("Lecture master playlist impossible", url=url[:80], error=str(e))
+        return url
+
+    chosen = select_variant(variants, quality)
+    if chosen is None:
+        return url
+
+    logger.info("Variante HLS sélectionnée",
+                quality=quality or QUALITY_BEST,
+                bandwidth=chosen.bandwidth,
+                resolution=f"{chosen.width}x{chosen.height}" if chosen.height else None,
+                frame_rate=chosen.frame_rate or None,
+                variants=len(variants))
+    return chosen.url
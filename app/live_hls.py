@@ -0,0 +1,268 @@
+"""
+Service des playlists HLS live
+Ajoute EXT-X-SERVER-CONTROL, gère le rechargement bloquant (_HLS_msn) en mode basse latence
+et garde en mémoire les derniers segments pour servir plusieurs spectateurs
+
+Portée: rechargement bloquant et HOLD-BACK réduit seulement. Le muxer hls de ffmpeg ne
+produit pas de segments partiels (#EXT-X-PART / PART-INF): la latence reste de l'ordre
+de quelques segments courts, pas celle du LL-HLS complet.
+"""
+import asyncio
+import hashlib
+import math
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+_MEDIA_SEQUENCE_RE = re.compile(r'^#EXT-X-MEDIA-SEQUENCE:(\d+)', re.MULTILINE)
+_TARGET_DURATION_RE = re.compile(r'^#EXT-X-TARGETDURATION:(\d+)', re.MULTILINE)
+SEGMENT_NAME_RE = re.compile(r'^seg_\d+\.ts$')
+
+# Relecture des playlists écrites par ffmpeg pour les sessions regardées (thread du manager)
+PLAYLIST_WATCH_INTERVAL = 0.1
+
+
+def parse_media_playlist(text: str) -> Tuple[int, int, List[str]]:
+    """
+    Analyse une playlist média HLS
+
+    Returns:
+        (media_sequence, target_duration, segments)
+    """
+    match = _MEDIA_SEQUENCE_RE.search(text)
+    media_sequence = int(match.group(1)) if match else 0
+
+    match = _TARGET_DURATION_RE.search(text)
+    target_duration = int(match.group(1)) if match else 0
+
+    segments = [
+        line.strip() for line in text.splitlines()
+        if line.strip() and not line.startswith('#')
+    ]
+    return media_sequence, target_duration, segments
+
+
+def last_media_sequence(text: str) -> int:
+    """Numéro de séquence du dernier segment publié (-1 si aucun)"""
+    media_sequence, _, segments = parse_media_playlist(text)
+    return media_sequence + len(segments) - 1
+
+
+def render_live_playlist(text: str, segment_time: float, can_block: bool) -> str:
+    """
+    Réécrit la playlist générée par ffmpeg pour le lecteur
+
+    En mode basse latence, annonce le rechargement bloquant et un HOLD-BACK de
+    3 segments pour que hls.js se place au plus près du direct (pas de segments partiels).
+    """
+    if not can_block or '#EXT-X-SERVER-CONTROL' in text:
+        return text
+
+    _, target_duration, _ = parse_media_playlist(text)
+    hold_back = 3 * max(target_duration, math.ceil(segment_time))
+    server_control = f"#EXT-X-SERVER-CONTROL:CAN-BLOCK-RELOAD=YES,HOLD-BACK={hold_back:.1f}"
+
+    lines = text.splitlines()
+    for i, line in enumerate(lines):
+        if line.startswith('#EXT-X-TARGETDURATION'):
+            lines.insert(i + 1, server_control)
+            break
+    else:
+        lines.insert(1, server_control)
+    return "\n".join(lines) + "\n"
+
+
+def _etag(data: bytes) -> str:
+    return '"' + hashlib.blake2b(data, digest_size=8).hexdigest() + '"'
+
+
+class _SessionEntry:
+    """Playlist et derniers segments d'une session, en mémoire"""
+
+    def __init__(self):
+        self.playlist: Optional[str] = None
+        self.playlist_etag: Optional[str] = None
+        self.playlist_mtime: Optional[int] = None
+        self.segments: "OrderedDict[str, Tuple[bytes, str]]" = OrderedDict()
+        # Rechargements bloquants en attente: (boucle, événement) réveillés à chaque nouvelle playlist
+        self.waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = []
+
+    def wake(self):
+        for loop, event in self.waiters:
+            loop.call_soon_threadsafe(event.set)
+        self.waiters.clear()
+
+
+class LiveSegmentCache:
+    """
+    Cache mémoire des playlists et segments HLS live
+
+    Alimenté côté écriture, à mesure que les segments sont terminés: la capture
+    native y pousse chaque segment publié (publish), le thread du manager relit
+    les playlists écrites par ffmpeg (refresh, une lecture disque par segment).
+    Les spectateurs sont servis depuis la mémoire; chaque nouvelle playlist
+    réveille les rechargements bloquants.
+    """
+
+    def __init__(self, sessions_root: Path, max_segments: int = 8):
+        self.sessions_root = Path(sessions_root)
+        self.max_segments = max_segments
+        self._lock = threading.Lock()
+        self._entries: Dict[str, _SessionEntry] = {}
+
+    def refresh(self, session_id: str) -> Optional[Tuple[str, str]]:
+        """
+        Recharge la playlist si elle a changé et charge les nouveaux segments
+
+        Returns:
+            (playlist, etag) ou None si la session n'a pas de playlist
+        """
+        session_dir = self.sessions_root / session_id
+        playlist_path = session_dir / "stream.m3u8"
+        try:
+            mtime = playlist_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            self._forget(session_id)
+            return None
+
+        with self._lock:
+            entry = self._entries.setdefault(session_id, _SessionEntry())
+            if entry.playlist_mtime == mtime and entry.playlist is not None:
+                return entry.playlist, entry.playlist_etag
+            known = set(entry.segments)
+
+        try:
+            text = playlist_path.read_text()
+        except FileNotFoundError:
+            self._forget(session_id)
+            return None
+
+        _, _, listed = parse_media_playlist(text)
+        listed = listed[-self.max_segments:]
+        loaded: Dict[str, Tuple[bytes, str]] = {}
+        for name in listed:
+            if name in known or not SEGMENT_NAME_RE.match(name):
+                continue
+            try:
+                data = (session_dir / name).read_bytes()
+            except FileNotFoundError:
+                continue
+            loaded[name] = (data, _etag(data))
+
+        with self._lock:
+            entry = self._entries.setdefault(session_id, _SessionEntry())
+            for name in listed:
+                if name in loaded:
+                    entry.segments[name] = loaded[name]
+            # Garder uniquement les derniers segments
+            while len(entry.segments) > self.max_segments:
+                entry.segments.popitem(last=False)
+            entry.playlist = text
+            entry.playlist_etag = _etag(text.encode())
+            entry.playlist_mtime = mtime
+            entry.wake()
+            return entry.playlist, entry.playlist_etag
+
+    def publish(self, session_id: str, playlist: str, name: str, data: bytes, playlist_mtime: Optional[int] = None):
+        """
+        Ajoute un segment qui vient d'être publié avec sa nouvelle playlist (sans relecture disque)
+
+        Utilisé par la capture native, qui a les données en main au moment de la publication.
+        """
+        with self._lock:
+            entry = self._entries.setdefault(session_id, _SessionEntry())
+            entry.segments[name] = (data, _etag(data))
+            while len(entry.segments) > self.max_segments:
+                entry.segments.popitem(last=False)
+            entry.playlist = playlist
+            entry.playlist_etag = _etag(playlist.encode())
+            entry.playlist_mtime = playlist_mtime
+            entry.wake()
+
+    def current(self, session_id: str) -> Optional[Tuple[str, str]]:
+        """(playlist, etag) déjà en mémoire, sans aucun accès disque"""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry and entry.playlist is not None:
+                return entry.playlist, entry.playlist_etag
+        return None
+
+    async def wait_for_sequence(self, session_id: str, msn: int, timeout: float) -> Optional[Tuple[str, str]]:
+        """
+        Attend que la playlist en mémoire contienne le segment `msn` (rechargement bloquant)
+
+        Réveillé par refresh() quand une nouvelle playlist est chargée, sans accès disque
+        sur la boucle. Retourne la playlist courante (même si le segment n'est pas arrivé
+        avant le timeout), ou None si la session n'a pas de playlist.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        with self._lock:
+            entry = self._entries.setdefault(session_id, _SessionEntry())
+        while True:
+            event = asyncio.Event()
+            with self._lock:
+                if self._entries.get(session_id) is not entry:
+                    # Session évincée pendant l'attente
+                    return None
+                current = (entry.playlist, entry.playlist_etag) if entry.playlist is not None else None
+                if current is not None and last_media_sequence(current[0]) >= msn:
+                    return current
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return current
+                waiter = (loop, event)
+                entry.waiters.append(waiter)
+            try:
+                await asyncio.wait_for(event.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                with self._lock:
+                    if waiter in entry.waiters:
+                        entry.waiters.remove(waiter)
+
+    def _forget(self, session_id: str):
+        """Playlist disparue: données libérées, les rechargements en attente restent inscrits"""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return
+            if entry.waiters:
+                entry.playlist = entry.playlist_etag = entry.playlist_mtime = None
+                entry.segments.clear()
+            else:
+                del self._entries[session_id]
+
+    def lookup(self, session_id: str, name: str) -> Optional[Tuple[bytes, str]]:
+        """(données, etag) d'un segment déjà en mémoire, sans aucun accès disque"""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry and name in entry.segments:
+                return entry.segments[name]
+        return None
+
+    def get_segment(self, session_id: str, name: str) -> Optional[Tuple[bytes, str]]:
+        """Retourne (données, etag) d'un segment, en rechargeant la playlist si besoin (bloquant)"""
+        cached = self.lookup(session_id, name)
+        if cached is not None:
+            return cached
+        self.refresh(session_id)
+        return self.lookup(session_id, name)
+
+    def evict(self, session_id: str):
+        """Libère la mémoire d'une session (arrêt de session ou d'aperçu)"""
+        with self._lock:
+            entry = self._entries.pop(session_id, None)
+            if entry is not None:
+                entry.wake()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions": len(self._entries),
+                "segments": sum(len(e.segments) for e in self._entries.values()),
+                "bytes": sum(len(d) for e in self._entries.values() for d, _ in e.segments.values()),
+            }
@@ -8,19 +8,41 @@ import requests
 import json
 import subprocess
 import sys
+import shutil
 import time
 from datetime import datetime
 
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import HTMLResponse, JSONResponse, FileResponse
+from fastapi import FastAPI, HTTPException, Request, Query
+from fastapi.responses import HTMLResponse, JSONResponse, FileResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from .ffmpeg_runner import FFmpegManager
+from .ffmpeg_runner import FFmpegManager, AdmissionError
+from .ffmpeg_log import FFmpegLogTailer
+from .recording_layout import (
+    SEGMENT_DIR_SUFFIX, SEGMENT_INDEX, close_segment_index, complete_recording, is_mp4_recording, is_segment_dir, is_segment_name,
+    list_recordings as list_recording_paths, playlist_duration, recording_complete, recording_mtime, recording_size,
+    recording_started_at,
+)
 from .logger import logger
 from .core.database import Database
-from .tasks.monitor import monitor_models_task
-from .tasks.convert import auto_convert_recordings_task
+from .core.config import (
+    LL_HLS_ENABLED, LL_HLS_SEGMENT_TIME, LL_HLS_LIST_SIZE,
+    LIVE_PREVIEW_ON_DEMAND, LIVE_PREVIEW_IDLE_MINUTES,
+    DVR_WINDOW_MINUTES, DVR_SEGMENT_SECONDS,
+    MAX_SESSIONS, MAX_INGRESS_MBPS, MIN_FREE_DISK_GB, PREEMPT_LOW_PRIORITY,
+    SESSION_DIR_GRACE_MINUTES, SESSION_HISTORY_SIZE,
+    CAPTURE_ENGINES, CAPTURE_ENGINE, NATIVE_CAPTURE_MAX_CONNECTIONS,
+    RECORD_LAYOUT, RECORD_CONTAINER,
+    CONVERSION_WORKERS, CONVERSION_THREADS_PER_JOB, CONVERSION_PROFILE,
+    CONVERSION_MAX_ATTEMPTS, CONVERSION_RETRY_DELAY,
+    CONVERSION_MAX_LOAD, CONVERSION_PAUSE_SESSIONS, CONVERSION_WINDOW, CONVERSION_NICE, CONVERSION_IO_IDLE,
+    CONVERSION_CHUNK_SECONDS, CONVERSION_CHUNK_JOBS, CONVERSION_KEEP_MP4_ONLY, CONVERSION_INCREMENTAL,
+)
+from .live_hls import render_live_playlist, last_media_sequence, SEGMENT_NAME_RE
+from .tasks.monitor import monitor_models_task, generate_recording_thumbnail
+from .tasks.convert import ConversionPool, auto_convert_recordings_task
+from .resolvers.chaturbate import PLAYLIST_HEADERS as CHATURBATE_PLAYLIST_HEADERS
 
 # Environment
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -37,6 +59,13 @@ OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 logger.info("📂 Répertoire de sortie", path=str(OUTPUT_DIR))
 logger.info("🎥 FFmpeg path", path=FFMPEG_PATH)
 logger.info("⚙️  HLS Configuration", hls_time=HLS_TIME, hls_list_size=HLS_LIST_SIZE)
+logger.info("⚡ LL-HLS", enabled=LL_HLS_ENABLED, segment_time=LL_HLS_SEGMENT_TIME, list_size=LL_HLS_LIST_SIZE)
+logger.info("👁️  Aperçu live", on_demand=LIVE_PREVIEW_ON_DEMAND, idle_minutes=LIVE_PREVIEW_IDLE_MINUTES)
+logger.info("🚦 Admission", max_sessions=MAX_SESSIONS or "illimité", max_ingress_mbps=MAX_INGRESS_MBPS or "illimité",
+            min_free_disk_gb=MIN_FREE_DISK_GB, preempt=PREEMPT_LOW_PRIORITY)
+logger.info("📡 Moteur de capture", default=CAPTURE_ENGINE, native_max_connections=NATIVE_CAPTURE_MAX_CONNECTIONS,
+            record_layout=RECORD_LAYOUT, record_container=RECORD_CONTAINER)
+logger.info("⏪ DVR live", window_minutes=DVR_WINDOW_MINUTES or "show complet", segment_seconds=DVR_SEGMENT_SECONDS)
 logger.info("🔧 Chaturbate Resolver", enabled=CB_RESOLVER_ENABLED)
 
 app = FastAPI(title="P-StreamRec", version="0.1.0")
@@ -89,8 +118,7 @@ async def serve_recording_protected(username: str, filename: str):
         recording_date = filename.replace(".ts", "")
         
         # Vérifier si une session est active pour cet utilisateur
-        active_sessions = manager.list_status()
-        is_recording = any(s.get('person') == username and s.get('running') for s in active_sessions)
+        is_recording = manager.is_recording(username)
         
         if is_recording and recording_date == today:
             logger.warning("Accès bloqué à enregistrement en cours", username=username, filename=filename, date=today)
@@ -111,7 +139,7 @@ async def serve_recording_protected(username: str, filename: str):
     
     return FileResponse(
         path=str(file_path),
-        media_type="video/mp2t",
+        media_type="video/mp4" if filename.endswith(".mp4") else "video/mp2t",
         headers={
             "Content-Disposition": f'inline; filename="{filename}"',
             "Cache-Control": "public, max-age=3600",
@@ -119,16 +147,213 @@ async def serve_recording_protected(username: str, filename: str):
         }
     )
 
-# Mount pour les sessions HLS live uniquement
-app.mount("/streams/sessions", StaticFiles(directory=str(OUTPUT_DIR / "sessions")), name="streams_sessions")
+
+# Enregistrement en segments: records/<username>/<nom>.hls/{index.m3u8,seg_*.ts}
+@app.api_route("/streams/records/{username}/{dirname}/{name}", methods=["GET", "HEAD"])
+async def serve_recording_segment(username: str, dirname: str, name: str):
+    """Sert l'index ou un segment d'un enregistrement en segments (lisible pendant l'enregistrement)"""
+    from fastapi.responses import FileResponse
+    
+    if ".." in username or ".." in dirname or not dirname.endswith(SEGMENT_DIR_SUFFIX) \
+            or not (name == SEGMENT_INDEX or is_segment_name(name)):
+        raise HTTPException(status_code=400, detail="Nom de fichier invalide")
+    
+    file_path = OUTPUT_DIR / "records" / username / dirname / name
+    if not file_path.is_file():
+        raise HTTPException(status_code=404, detail="Enregistrement introuvable")
+    
+    if name == SEGMENT_INDEX:
+        # Réécrit à chaque segment tant que l'enregistrement est en cours
+        return FileResponse(path=str(file_path), media_type="application/vnd.apple.mpegurl",
+                            headers={"Cache-Control": "no-cache"})
+    # Un segment lié n'est plus jamais modifié
+    return FileResponse(path=str(file_path), media_type="video/mp2t",
+                        headers={"Cache-Control": "public, max-age=86400, immutable"})
+
+SESSION_ID_RE = re.compile(r'^[0-9a-f]{10}$')
+
+
+# Playlist live servie dynamiquement (rechargement bloquant LL-HLS)
+@app.api_route("/streams/sessions/{session_id}/stream.m3u8", methods=["GET", "HEAD"])
+async def serve_live_playlist(
+    session_id: str,
+    request: Request,
+    hls_msn: Optional[int] = Query(None, alias="_HLS_msn")
+):
+    """Sert la playlist HLS live; bloque jusqu'au segment demandé si _HLS_msn est fourni"""
+    if not SESSION_ID_RE.match(session_id):
+        raise HTTPException(status_code=400, detail="Session invalide")
+    
+    segment_time = manager.hls_time
+    can_block = manager.low_latency
+    # HEAD: simple sonde, sans démarrer l'aperçu ni compter de spectateur
+    probe = request.method == "HEAD"
+    
+    if probe:
+        session = manager.get_session_by_id(session_id)
+        if session is None or not session.is_running():
+            raise HTTPException(status_code=404, detail="Session introuvable")
+    # Démarre l'aperçu HLS au premier spectateur (et le maintient tant qu'il est regardé);
+    # le cache live est alors alimenté côté écriture (capture native ou thread du manager)
+    else:
+        if not await asyncio.to_thread(manager.ensure_preview, session_id):
+            raise HTTPException(status_code=404, detail="Session introuvable")
+    
+    cached = None if probe else manager.segment_cache.current(session_id)
+    if can_block and hls_msn is not None and not probe:
+        # Attendre au plus 3 durées de segment (recommandation LL-HLS), réveillé à la publication
+        cached = await manager.segment_cache.wait_for_sequence(session_id, hls_msn, timeout=3 * max(segment_time, 1))
+        if cached is not None and hls_msn > last_media_sequence(cached[0]) + 2:
+            raise HTTPException(status_code=400, detail="_HLS_msn trop éloigné du direct")
+    elif cached is None:
+        cached = await asyncio.to_thread(manager.segment_cache.refresh, session_id)
+        if cached is None and manager.preview_on_demand and not probe:
+            # Laisser le temps au premier segment d'être publié
+            cached = await manager.segment_cache.wait_for_sequence(session_id, 0, timeout=max(3 * segment_time, 10))
+    
+    if cached is None:
+        raise HTTPException(status_code=404, detail="Playlist introuvable")
+    text, etag = cached
+    
+    headers = {"Cache-Control": "no-cache", "ETag": etag}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    
+    body = render_live_playlist(text, segment_time, can_block)
+    return Response(
+        content=body if request.method == "GET" else b"",
+        media_type="application/vnd.apple.mpegurl",
+        headers=headers
+    )
+
+
+RANGE_RE = re.compile(r'^bytes=(\d+)-(\d*)$')
+
+
+@app.get("/streams/sessions/{session_id}/dvr.m3u8")
+async def serve_dvr_playlist(session_id: str):
+    """Playlist DVR: les N dernières minutes du live, en plages d'octets dans l'enregistrement"""
+    if not SESSION_ID_RE.match(session_id):
+        raise HTTPException(status_code=400, detail="Session invalide")
+    
+    playlist = manager.dvr_playlist(session_id, uri="dvr.ts")
+    if playlist is None:
+        raise HTTPException(status_code=404, detail="Session introuvable ou terminée")
+    
+    return Response(
+        content=playlist,
+        media_type="application/vnd.apple.mpegurl",
+        headers={"Cache-Control": "no-cache"}
+    )
+
+
+def _read_range(path: str, start: int, length: int) -> bytes:
+    with open(path, "rb") as f:
+        return os.pread(f.fileno(), length, start)
+
+
+@app.api_route("/streams/sessions/{session_id}/dvr.ts", methods=["GET", "HEAD"])
+async def serve_dvr_bytes(session_id: str, request: Request):
+    """Sert uniquement la plage d'octets demandée du fichier en cours d'enregistrement"""
+    if not SESSION_ID_RE.match(session_id):
+        raise HTTPException(status_code=400, detail="Session invalide")
+    
+    record_path = manager.get_record_path(session_id)
+    if not record_path or not os.path.isfile(record_path):
+        raise HTTPException(status_code=404, detail="Enregistrement introuvable")
+    
+    file_size = os.path.getsize(record_path)
+    match = RANGE_RE.match(request.headers.get("range", "").strip())
+    if not match:
+        raise HTTPException(status_code=416, detail="En-tête Range requis")
+    
+    start = int(match.group(1))
+    end = int(match.group(2)) if match.group(2) else file_size - 1
+    end = min(end, file_size - 1)
+    if start > end:
+        raise HTTPException(status_code=416, detail="Plage hors du fichier")
+    
+    # Le fichier grossit encore: taille totale inconnue (*)
+    headers = {
+        "Content-Range": f"bytes {start}-{end}/*",
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "public, max-age=3600, immutable",
+    }
+    if request.method == "HEAD":
+        headers["Content-Length"] = str(end - start + 1)
+        return Response(status_code=206, media_type="video/mp2t", headers=headers)
+    
+    data = await asyncio.to_thread(_read_range, record_path, start, end - start + 1)
+    return Response(content=data, status_code=206, media_type="video/mp2t", headers=headers)
+
+
+@app.api_route("/streams/sessions/{session_id}/{segment}", methods=["GET", "HEAD"])
+async def serve_live_segment(session_id: str, segment: str, request: Request):
+    """Sert un segment HLS live depuis le cache mémoire"""
+    if not SESSION_ID_RE.match(session_id) or not SEGMENT_NAME_RE.match(segment):
+        raise HTTPException(status_code=404, detail="Segment introuvable")
+    
+    # Chemin rapide en mémoire; relecture de la playlist (stat, lectures disque) hors de la boucle
+    cached = manager.segment_cache.lookup(session_id, segment)
+    if cached is None:
+        cached = await asyncio.to_thread(manager.segment_cache.get_segment, session_id, segment)
+    if cached is None:
+        raise HTTPException(status_code=404, detail="Segment introuvable")
+    data, etag = cached
+    
+    # Un segment publié ne change jamais: cache navigateur immuable
+    headers = {"Cache-Control": "public, max-age=3600, immutable", "ETag": etag}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    
+    return Response(
+        content=data if request.method == "GET" else b"",
+        media_type="video/mp2t",
+        headers=headers
+    )
+
+
 app.mount("/streams/thumbnails", StaticFiles(directory=str(OUTPUT_DIR / "thumbnails")), name="streams_thumbnails")
 
-manager = FFmpegManager(str(OUTPUT_DIR), ffmpeg_path=FFMPEG_PATH, hls_time=HLS_TIME, hls_list_size=HLS_LIST_SIZE)
+MANAGER_OPTIONS = dict(
+    preview_on_demand=LIVE_PREVIEW_ON_DEMAND,
+    preview_idle_timeout=LIVE_PREVIEW_IDLE_MINUTES * 60,
+    dvr_window_seconds=DVR_WINDOW_MINUTES * 60,
+    dvr_segment_seconds=DVR_SEGMENT_SECONDS,
+    max_sessions=MAX_SESSIONS,
+    max_ingress_bps=MAX_INGRESS_MBPS * 125_000,  # Mbit/s -> octets/s
+    min_free_disk_bytes=int(MIN_FREE_DISK_GB * 1024 ** 3),
+    preempt=PREEMPT_LOW_PRIORITY,
+    session_dir_grace=SESSION_DIR_GRACE_MINUTES * 60,
+    max_finished_sessions=SESSION_HISTORY_SIZE,
+    capture_engine=CAPTURE_ENGINE,
+    native_max_connections=NATIVE_CAPTURE_MAX_CONNECTIONS,
+    record_layout=RECORD_LAYOUT,
+    record_container=RECORD_CONTAINER,
+)
+
+if LL_HLS_ENABLED:
+    manager = FFmpegManager(str(OUTPUT_DIR), ffmpeg_path=FFMPEG_PATH, hls_time=LL_HLS_SEGMENT_TIME, hls_list_size=LL_HLS_LIST_SIZE, low_latency=True,
+                            **MANAGER_OPTIONS)
+else:
+    manager = FFmpegManager(str(OUTPUT_DIR), ffmpeg_path=FFMPEG_PATH, hls_time=HLS_TIME, hls_list_size=HLS_LIST_SIZE,
+                            **MANAGER_OPTIONS)
 
 # Database SQLite
 DB_FILE = OUTPUT_DIR / "streamrec.db"
 db = Database(DB_FILE)
 
+# Pool de conversion TS -> MP4 (workers démarrés avec la tâche de conversion)
+conversion_pool = ConversionPool(db, FFMPEG_PATH, workers=CONVERSION_WORKERS, threads_per_job=CONVERSION_THREADS_PER_JOB,
+                                 default_profile=CONVERSION_PROFILE, max_attempts=CONVERSION_MAX_ATTEMPTS,
+                                 retry_base_seconds=CONVERSION_RETRY_DELAY,
+                                 # Régulation: charge de l'hôte, enregistrements en cours, contre-pression des writers
+                                 load_probe=manager.host_metrics, max_load=CONVERSION_MAX_LOAD,
+                                 pause_sessions=CONVERSION_PAUSE_SESSIONS, window=CONVERSION_WINDOW,
+                                 nice=CONVERSION_NICE, io_idle=CONVERSION_IO_IDLE,
+                                 chunk_seconds=CONVERSION_CHUNK_SECONDS, chunk_jobs=CONVERSION_CHUNK_JOBS,
+                                 keep_mp4_only=CONVERSION_KEEP_MP4_ONLY, incremental=CONVERSION_INCREMENTAL)
+
 # Fichier de sauvegarde des modèles (côté serveur)
 MODELS_FILE = OUTPUT_DIR / "models.json"
 
@@ -158,6 +383,8 @@ class StartBody(BaseModel):
     source_type: Optional[str] = None  # "m3u8" or "chaturbate" or None for auto
     name: Optional[str] = None  # display name
     person: Optional[str] = None  # recording bucket (per person)
+    priority: Optional[int] = None  # admission priority (defaults to the model's priority)
+    engine: Optional[str] = None  # capture engine: ffmpeg | native (defaults to the model's engine)
 
 
 def slugify(value: str) -> str:
@@ -395,6 +622,8 @@ async def api_start(body: StartBody):
     logger.info("Paramètres validés", target=target, source_type=body.source_type)
 
     m3u8_url: Optional[str] = None
+    # En-têtes du résolveur pour la master playlist (aucun pour une URL directe)
+    source_headers: Optional[dict] = None
     person: Optional[str] = (body.person or "").strip() or None
 
     # Determine source type
@@ -419,6 +648,7 @@ async def api_start(body: StartBody):
                     logger.error("Resolver retourné None", username=target)
                     raise HTTPException(status_code=400, detail=f"Impossible de trouver le flux pour {target}")
                 logger.success("M3U8 résolu", username=target, url=m3u8_url[:80])
+                source_headers = CHATURBATE_PLAYLIST_HEADERS
                 if not person:
                     person = target  # username
                     logger.debug("Person défini depuis target", person=person)
@@ -447,14 +677,27 @@ async def api_start(body: StartBody):
     person = slugify(person)
     logger.info("Identifiant slugifié", person=person, display_name=body.name)
 
+    model = await db.get_model(person) or {}
+    priority = body.priority
+    if priority is None:
+        priority = model.get('priority') or 0
+    quality = model.get('record_quality') or 'best'
+    engine = body.engine or model.get('capture_engine') or None
+    if engine and engine not in CAPTURE_ENGINES:
+        raise HTTPException(status_code=400, detail=f"Moteur de capture inconnu: {engine}")
+
     logger.subsection("🚀 Démarrage Session FFmpeg")
     try:
-        sess = manager.start_session(m3u8_url, person=person, display_name=body.name)
+        sess = await manager.start_session_async(m3u8_url, person=person, display_name=body.name, priority=priority,
+                                                 quality=quality, engine=engine, headers=source_headers)
         duration_ms = (time.time() - start_time) * 1000
         logger.success("Session créée avec succès", 
                       session_id=sess.id,
                       person=person,
                       duration_ms=f"{duration_ms:.2f}")
+    except AdmissionError as e:
+        logger.warning("Démarrage refusé par le contrôle d'admission", person=person, reason=e.reason, queued=e.queued)
+        raise HTTPException(status_code=503, detail=str(e))
     except RuntimeError as e:
         logger.error("Session déjà en cours", person=person, error=str(e))
         raise HTTPException(status_code=409, detail=str(e))
@@ -475,12 +718,137 @@ async def api_start(body: StartBody):
 
 @app.get("/api/status")
 async def api_status():
-    return manager.list_status()
+    sessions = manager.list_status()
+    return {
+        "sessions": sessions,
+        "admission": manager.admission_status(),
+        "host": manager.host_metrics([s["metrics"] for s in sessions]),
+    }
+
+
+@app.get("/api/conversions")
+async def api_conversions():
+    """File d'attente, jobs actifs, débit du pool de conversion et espace libéré (MP4 seul)"""
+    return {**conversion_pool.status(), "reclaimed_bytes_total": await db.get_reclaimed_bytes()}
+
+
+CONVERSION_JOB_STATUSES = ("queued", "running", "done", "failed")
+
+
+@app.get("/api/conversions/jobs")
+async def api_conversion_jobs(status: Optional[str] = None, limit: int = 200):
+    """Jobs de conversion persistés (tentatives, dernière erreur, taille produite)"""
+    if status and status not in CONVERSION_JOB_STATUSES:
+        raise HTTPException(status_code=400, detail=f"Statut invalide: {', '.join(CONVERSION_JOB_STATUSES)}")
+    jobs = await db.get_conversion_jobs(status, max(1, min(limit, 1000)))
+    return {"jobs": jobs}
+
+
+@app.post("/api/conversions/{username}/{filename}/retry")
+async def retry_conversion(username: str, filename: str):
+    """Relance un job abandonné (tentatives remises à zéro, repris au prochain passage)"""
+    if ".." in filename or "/" in filename or ".." in username or "/" in username:
+        raise HTTPException(status_code=400, detail="Nom invalide")
+    file_path = str(OUTPUT_DIR / "records" / username / filename)
+    job = await db.get_conversion_job(file_path)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job de conversion introuvable")
+    if job['status'] != "failed":
+        raise HTTPException(status_code=409, detail="Seul un job abandonné (failed) peut être relancé")
+    await db.update_conversion_job(file_path, status="queued", attempts=0, next_attempt_at=0, last_error=None)
+    return {"success": True}
+
+
+PROFILE_NAME_RE = re.compile(r'^[a-z0-9][a-z0-9_-]{0,31}$')
+
+
+def _format_conversion_profile(p: dict) -> dict:
+    """Profil + statistiques mesurées (vitesse en x temps réel, taille de sortie / taille d'entrée)"""
+    return {
+        "name": p['name'],
+        "videoCodec": p['video_codec'],
+        "preset": p.get('preset'),
+        "crf": p.get('crf'),
+        "audioBitrate": p.get('audio_bitrate'),
+        "maxHeight": p.get('max_height') or 0,
+        "threads": p.get('threads') or 0,
+        "allowRemux": bool(p.get('allow_remux')),
+        "isDefault": p['name'] == CONVERSION_PROFILE,
+        "stats": {
+            "jobs": p.get('jobs') or 0,
+            "sourceSeconds": round(p.get('source_seconds') or 0),
+            "encodeSeconds": round(p.get('encode_seconds') or 0),
+            "speed": round(p['source_seconds'] / p['encode_seconds'], 2) if p.get('encode_seconds') else None,
+            "compressionRatio": round(p['output_bytes'] / p['input_bytes'], 3) if p.get('input_bytes') else None,
+        },
+    }
+
+
+@app.get("/api/conversion-profiles")
+async def list_conversion_profiles():
+    """Profils de conversion et leurs statistiques (vitesse d'encodage, taux de compression)"""
+    profiles = await db.get_conversion_profiles()
+    return {"profiles": [_format_conversion_profile(p) for p in profiles], "default": CONVERSION_PROFILE}
+
+
+@app.put("/api/conversion-profiles/{name}")
+async def save_conversion_profile(name: str, body: dict):
+    """Crée ou modifie un profil de conversion"""
+    if not PROFILE_NAME_RE.match(name):
+        raise HTTPException(status_code=400, detail="Nom de profil invalide")
+    
+    settings = {
+        "video_codec": body.get('videoCodec'),
+        "preset": body.get('preset'),
+        "crf": body.get('crf'),
+        "audio_bitrate": body.get('audioBitrate'),
+        "max_height": body.get('maxHeight'),
+        "threads": body.get('threads'),
+        "allow_remux": body.get('allowRemux'),
+    }
+    try:
+        for key in ("crf", "max_height", "threads"):
+            if settings[key] is not None:
+                settings[key] = int(settings[key])
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="crf, maxHeight et threads doivent être des entiers")
+    if settings["allow_remux"] is not None:
+        settings["allow_remux"] = bool(settings["allow_remux"])
+    if await db.get_conversion_profile(name) is None and not settings["video_codec"]:
+        raise HTTPException(status_code=400, detail="videoCodec requis pour un nouveau profil")
+    
+    await db.save_conversion_profile(name, **settings)
+    logger.info("Profil de conversion enregistré", profile=name)
+    return {"success": True, "profile": _format_conversion_profile(await db.get_conversion_profile(name))}
+
+
+@app.delete("/api/conversion-profiles/{name}")
+async def delete_conversion_profile(name: str):
+    """Supprime un profil (sauf le profil par défaut)"""
+    if name == CONVERSION_PROFILE:
+        raise HTTPException(status_code=400, detail="Le profil par défaut ne peut pas être supprimé")
+    if await db.get_conversion_profile(name) is None:
+        raise HTTPException(status_code=404, detail="Profil introuvable")
+    await db.delete_conversion_profile(name)
+    return {"success": True}
+
+
+@app.get("/api/sessions/{session_id}/metrics")
+async def api_session_metrics(session_id: str):
+    """Débit, octets reçus, inactivité et CPU/RSS ffmpeg d'une session"""
+    sess = manager.get_session_by_id(session_id)
+    if not sess:
+        raise HTTPException(status_code=404, detail="Session introuvable")
+    return {
+        "id": sess.id,
+        "person": sess.person,
+        **sess.metrics(),
+    }
 
 
 @app.post("/api/stop/{session_id}")
 async def api_stop(session_id: str):
-    ok = manager.stop_session(session_id)
+    ok = await manager.stop_session_async(session_id)
     if not ok:
         raise HTTPException(status_code=404, detail="Session introuvable")
     return {"stopped": True, "id": session_id}
@@ -589,6 +957,10 @@ async def get_dashboard():
                 "recordingsCount": recordings_count,
                 "recordQuality": model.get('record_quality', 'best'),
                 "retentionDays": model.get('retention_days', 30),
+                "priority": model.get('priority', 0),
+                "captureEngine": model.get('capture_engine') or '',
+                "recompress": bool(model.get('recompress')),
+                "conversionProfile": model.get('conversion_profile') or '',
                 "autoRecord": bool(model.get('auto_record', True))
             }
             
@@ -662,11 +1034,13 @@ async def list_recordings(username: str):
             "size_formatted": format_bytes(rec['file_size']),
             "size_mb": round(rec['file_size'] / 1024 / 1024, 2),
             "modified": datetime.fromtimestamp(stat.st_mtime).isoformat(),
-            "url": f"/streams/records/{username}/{filename}",
+            "url": f"/streams/records/{username}/{filename}/{SEGMENT_INDEX}" if is_segment_dir(file_path)
+                   else f"/streams/records/{username}/{filename}",
             "thumbnail": thumb_url if thumb_path.exists() else None,
             "duration": duration_seconds,
             "duration_str": duration_str,
             "isConverted": bool(rec.get('is_converted', False)),
+            "health": json.loads(rec['health']) if rec.get('health') else None,
             "mp4": mp4_info
         })
     
@@ -712,12 +1086,26 @@ async def get_models():
             "username": model['username'],
             "autoRecord": bool(model.get('auto_record', True)),
             "recordQuality": model.get('record_quality', 'best'),
-            "retentionDays": model.get('retention_days', 30)
+            "retentionDays": model.get('retention_days', 30),
+            "priority": model.get('priority', 0),
+            "captureEngine": model.get('capture_engine') or '',
+            "recompress": bool(model.get('recompress')),
+            "conversionProfile": model.get('conversion_profile') or ''
         })
     
     return {"models": formatted_models}
 
 
+def _check_capture_engine(engine: Optional[str]):
+    if engine and engine not in CAPTURE_ENGINES:
+        raise HTTPException(status_code=400, detail=f"Moteur de capture inconnu: {engine}")
+
+
+async def _check_conversion_profile(name: Optional[str]):
+    if name and await db.get_conversion_profile(name) is None:
+        raise HTTPException(status_code=400, detail=f"Profil de conversion inconnu: {name}")
+
+
 @app.post("/api/models")
 async def add_model(model: dict):
     """Ajoute un modèle dans SQLite"""
@@ -730,12 +1118,19 @@ async def add_model(model: dict):
     if existing:
         raise HTTPException(status_code=409, detail="Modèle déjà existant")
     
+    _check_capture_engine(model.get('captureEngine', ''))
+    await _check_conversion_profile(model.get('conversionProfile', ''))
+    
     # Ajouter dans SQLite
     await db.add_or_update_model(
         username=username,
         auto_record=model.get('autoRecord', True),
         record_quality=model.get('recordQuality', 'best'),
-        retention_days=model.get('retentionDays', 30)
+        retention_days=model.get('retentionDays', 30),
+        priority=int(model.get('priority', 0)),
+        capture_engine=model.get('captureEngine', ''),
+        recompress=bool(model.get('recompress', False)),
+        conversion_profile=model.get('conversionProfile', '')
     )
     
     # Récupérer tous les modèles pour retourner
@@ -744,7 +1139,11 @@ async def add_model(model: dict):
         "username": m['username'],
         "autoRecord": bool(m.get('auto_record', True)),
         "recordQuality": m.get('record_quality', 'best'),
-        "retentionDays": m.get('retention_days', 30)
+        "retentionDays": m.get('retention_days', 30),
+        "priority": m.get('priority', 0),
+        "captureEngine": m.get('capture_engine') or '',
+        "recompress": bool(m.get('recompress')),
+        "conversionProfile": m.get('conversion_profile') or ''
     } for m in all_models]
     
     return {"success": True, "models": formatted}
@@ -758,12 +1157,19 @@ async def update_model(username: str, model_data: dict):
     if not existing:
         raise HTTPException(status_code=404, detail="Modèle introuvable")
     
+    _check_capture_engine(model_data.get('captureEngine', ''))
+    await _check_conversion_profile(model_data.get('conversionProfile', ''))
+    
     # Mettre à jour dans SQLite
     await db.add_or_update_model(
         username=username,
         auto_record=model_data.get('autoRecord', existing.get('auto_record', True)),
         record_quality=model_data.get('recordQuality', existing.get('record_quality', 'best')),
-        retention_days=model_data.get('retentionDays', existing.get('retention_days', 30))
+        retention_days=model_data.get('retentionDays', existing.get('retention_days', 30)),
+        priority=int(model_data.get('priority', existing.get('priority', 0))),
+        capture_engine=model_data.get('captureEngine', existing.get('capture_engine') or ''),
+        recompress=bool(model_data.get('recompress', existing.get('recompress') or False)),
+        conversion_profile=model_data.get('conversionProfile', existing.get('conversion_profile') or '')
     )
     
     # Récupérer le modèle mis à jour
@@ -775,7 +1181,11 @@ async def update_model(username: str, model_data: dict):
             "username": updated['username'],
             "autoRecord": bool(updated.get('auto_record', True)),
             "recordQuality": updated.get('record_quality', 'best'),
-            "retentionDays": updated.get('retention_days', 30)
+            "retentionDays": updated.get('retention_days', 30),
+            "priority": updated.get('priority', 0),
+            "captureEngine": updated.get('capture_engine') or '',
+            "recompress": bool(updated.get('recompress')),
+            "conversionProfile": updated.get('conversion_profile') or ''
         }
     }
 
@@ -797,7 +1207,11 @@ async def delete_model(username: str):
         "username": m['username'],
         "autoRecord": bool(m.get('auto_record', True)),
         "recordQuality": m.get('record_quality', 'best'),
-        "retentionDays": m.get('retention_days', 30)
+        "retentionDays": m.get('retention_days', 30),
+        "priority": m.get('priority', 0),
+        "captureEngine": m.get('capture_engine') or '',
+        "recompress": bool(m.get('recompress')),
+        "conversionProfile": m.get('conversion_profile') or ''
     } for m in all_models]
     
     return {"success": True, "models": formatted}
@@ -810,7 +1224,7 @@ async def delete_recording(username: str, filename: str):
     from datetime import datetime
     
     # Sécurité
-    if ".." in filename or "/" in filename or not filename.endswith(".ts"):
+    if ".." in filename or "/" in filename or not filename.endswith((".ts", ".mp4", SEGMENT_DIR_SUFFIX)):
         raise HTTPException(status_code=400, detail="Nom invalide")
     
     # Vérifier que ce n'est pas l'enregistrement du jour en cours
@@ -818,8 +1232,7 @@ async def delete_recording(username: str, filename: str):
     recording_date = filename.replace(".ts", "")
     
     # Vérifier si une session est active pour cet utilisateur
-    active_sessions = manager.list_status()
-    is_recording = any(s.get('person') == username and s.get('running') for s in active_sessions)
+    is_recording = manager.is_recording(username)
     
     if is_recording and recording_date == today:
         raise HTTPException(
@@ -833,9 +1246,13 @@ async def delete_recording(username: str, filename: str):
     if not ts_path.exists():
         raise HTTPException(status_code=404, detail="Enregistrement introuvable")
     
-    # Supprimer le fichier TS et la miniature
+    # Supprimer le fichier TS (ou le répertoire de segments) et la miniature
     try:
-        ts_path.unlink()
+        if is_segment_dir(ts_path):
+            await asyncio.to_thread(shutil.rmtree, ts_path)
+        else:
+            ts_path.unlink()
+        await db.delete_conversion_job(str(ts_path))
         if thumb_path.exists():
             thumb_path.unlink()
         return {"success": True, "message": f"{filename} supprimé"}
@@ -885,9 +1302,12 @@ async def _recalculate_durations_task():
             
             logger.info(f"📁 Recalcul durées: {username}")
             
-            ts_files = list(records_dir.glob("*.ts"))
+            ts_files = list_recording_paths(records_dir)
             
             for ts_file in ts_files:
+                # Segments encore en cours: durée calculée une fois l'index clos
+                if not recording_complete(ts_file):
+                    continue
                 try:
                     total_processed += 1
                     
@@ -901,7 +1321,10 @@ async def _recalculate_durations_task():
                     
                     # Calculer la durée si elle est à 0
                     if current_duration == 0:
-                        duration = await get_video_duration(ts_file, FFMPEG_PATH)
+                        if is_segment_dir(ts_file):
+                            duration = playlist_duration(ts_file)
+                        else:
+                            duration = await get_video_duration(ts_file, FFMPEG_PATH)
                         
                         if duration > 0:
                             # Générer aussi la miniature
@@ -914,7 +1337,7 @@ async def _recalculate_durations_task():
                                 username=username,
                                 filename=ts_file.name,
                                 file_path=str(ts_file),
-                                file_size=ts_file.stat().st_size,
+                                file_size=recording_size(ts_file),
                                 duration_seconds=duration,
                                 thumbnail_path=thumbnail_path
                             )
@@ -945,6 +1368,19 @@ async def _recalculate_durations_task():
 # Background Task - Auto-enregistrement
 # ============================================
 
+async def fetch_hls_source(username: str) -> Optional[str]:
+    """Récupère l'URL HLS courante d'un modèle (None s'il est hors ligne)"""
+    api_url = f"https://chaturbate.com/api/chatvideocontext/{username}/"
+    headers = {
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
+        "Referer": "https://chaturbate.com/",
+    }
+    resp = await asyncio.to_thread(requests.get, api_url, headers=headers, timeout=10)
+    if resp.status_code != 200:
+        return None
+    return resp.json().get('hls_source') or None
+
+
 async def auto_record_task():
     """Vérifie automatiquement les modèles et lance les enregistrements (utilise SQLite)"""
     while True:
@@ -956,9 +1392,6 @@ async def auto_record_task():
             if not models:
                 continue
             
-            # Récupérer les sessions actives
-            active_sessions = manager.list_status()
-            
             for model in models:
                 username = model.get('username')
                 
@@ -966,12 +1399,7 @@ async def auto_record_task():
                     continue
                 
                 # Vérifier si déjà en enregistrement
-                is_recording = any(
-                    s.get('person') == username and s.get('running')
-                    for s in active_sessions
-                )
-                
-                if is_recording:
+                if manager.is_recording(username):
                     continue  # Déjà en cours
                 
                 # Vérifier le statut depuis le cache SQLite (mis à jour par monitor)
@@ -980,39 +1408,39 @@ async def auto_record_task():
                 if cached_status and cached_status.get('is_online'):
                     # Modèle en ligne selon le cache, vérifier le flux HLS
                     try:
-                        api_url = f"https://chaturbate.com/api/chatvideocontext/{username}/"
-                        headers = {
-                            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
-                            "Referer": "https://chaturbate.com/",
-                        }
-                        
-                        resp = requests.get(api_url, headers=headers, timeout=10)
-                        if resp.status_code == 200:
-                            data = resp.json()
-                            hls_source = data.get('hls_source')
-                            
-                            if hls_source:
-                                # Lancer l'enregistrement
-                                logger.background_task("auto-record", f"Modèle en ligne: {username}")
+                        hls_source = await fetch_hls_source(username)
+                        if hls_source:
+                            # Lancer l'enregistrement
+                            logger.background_task("auto-record", f"Modèle en ligne: {username}")
                                 
-                                try:
-                                    sess = manager.start_session(
-                                        input_url=hls_source,
-                                        display_name=username,
-                                        person=username
-                                    )
+                            try:
+                                sess = await manager.start_session_async(
+                                    input_url=hls_source,
+                                    display_name=username,
+                                    person=username,
+                                    priority=model.get('priority') or 0,
+                                    quality=model.get('record_quality') or 'best',
+                                    engine=model.get('capture_engine') or None,
+                                    headers=CHATURBATE_PLAYLIST_HEADERS
+                                )
                                     
-                                    if sess:
-                                        logger.success("Auto-enregistrement démarré", 
-                                                     task="auto-record",
-                                                     username=username,
-                                                     session_id=sess.id)
-                                except RuntimeError as e:
-                                    logger.warning("Impossible démarrer enregistrement",
+                                if sess:
+                                    logger.success("Auto-enregistrement démarré", 
                                                  task="auto-record",
                                                  username=username,
-                                                 error=str(e))
-                                    continue
+                                                 session_id=sess.id)
+                            except AdmissionError as e:
+                                logger.info("Auto-enregistrement en file d'attente",
+                                          task="auto-record",
+                                          username=username,
+                                          reason=e.reason)
+                                continue
+                            except RuntimeError as e:
+                                logger.warning("Impossible démarrer enregistrement",
+                                             task="auto-record",
+                                             username=username,
+                                             error=str(e))
+                                continue
                                 
                     except Exception as e:
                         logger.error("Erreur vérification modèle",
@@ -1055,18 +1483,24 @@ async def cleanup_old_recordings_task():
                 # Date limite (aujourd'hui - rétention)
                 cutoff_date = datetime.now() - timedelta(days=retention_days)
                 
-                # Parcourir les fichiers .ts
-                for ts_file in records_dir.glob("*.ts"):
+                # Parcourir les enregistrements (.ts, répertoires .hls, MP4 direct ou dont la source a été supprimée)
+                for ts_file in list_recording_paths(records_dir):
                     try:
-                        # Le nom du fichier est au format YYYY-MM-DD.ts
-                        date_str = ts_file.stem  # Enlève .ts
-                        file_date = datetime.strptime(date_str, "%Y-%m-%d")
+                        # Date de début tirée du nom (AAAAMMJJ_HHMMSS_id ou ancien AAAA-MM-JJ)
+                        file_date = recording_started_at(ts_file)
                         
-                        # Si le fichier est plus vieux que la limite
-                        if file_date < cutoff_date:
-                            # Supprimer le fichier TS
-                            file_size = ts_file.stat().st_size
-                            ts_file.unlink()
+                        # Si le fichier est plus vieux que la limite (et n'est plus en cours d'écriture)
+                        if file_date is not None and file_date < cutoff_date and time.time() - recording_mtime(ts_file) > 3600:
+                            # Supprimer l'enregistrement et son MP4 converti
+                            file_size = recording_size(ts_file)
+                            if is_segment_dir(ts_file):
+                                await asyncio.to_thread(shutil.rmtree, ts_file)
+                            else:
+                                ts_file.unlink()
+                            converted = ts_file.with_suffix(".mp4")
+                            if converted != ts_file and converted.exists():
+                                file_size += converted.stat().st_size
+                                converted.unlink()
                             logger.info("Fichier supprimé (rétention)",
                                       task="cleanup",
                                       username=username,
@@ -1104,6 +1538,239 @@ async def cleanup_old_recordings_task():
             await asyncio.sleep(3600)
 
 
+async def incremental_conversion_task():
+    """Encode par morceaux les enregistrements en cours (MP4 prêt peu après la fin du live)"""
+    while True:
+        try:
+            await asyncio.sleep(30)
+            recordings = await asyncio.to_thread(manager.live_recordings)
+            await conversion_pool.advance_live(recordings)
+        except Exception as e:
+            logger.error("Erreur incremental-convert task", task="incremental-convert", exc_info=True, error=str(e))
+            await asyncio.sleep(60)
+
+
+# Période de l'échantillonnage CPU/RSS et des logs ffmpeg des sessions (status servis depuis ce cache)
+SESSION_SAMPLE_INTERVAL = 5
+
+
+async def session_sampler_task():
+    """Échantillonne /proc et les logs ffmpeg hors de la boucle: les status lisent ce cache"""
+    while True:
+        try:
+            await asyncio.sleep(SESSION_SAMPLE_INTERVAL)
+            await asyncio.to_thread(manager.sample_sessions)
+        except Exception as e:
+            logger.error("Erreur session-sampler task", task="session-sampler", exc_info=True, error=str(e))
+            await asyncio.sleep(60)
+
+
+async def live_preview_reaper_task():
+    """Arrête les aperçus HLS live qui n'ont plus de spectateur"""
+    while True:
+        try:
+            await asyncio.sleep(30)
+            stopped = await asyncio.to_thread(manager.reap_idle_previews)
+            if stopped:
+                logger.background_task("live-preview", f"{stopped} aperçu(s) HLS inactif(s) arrêté(s)")
+        except Exception as e:
+            logger.error("Erreur live-preview task", task="live-preview", exc_info=True, error=str(e))
+            await asyncio.sleep(60)
+
+
+async def record_finished_file(username: str, record_path: str, recording_id: Optional[str], duration_seconds: int,
+                               health: Optional[dict] = None) -> bool:
+    """
+    Enregistre en base le fichier d'une session terminée (ignoré s'il est vide)
+
+    L'enregistrement est marqué complet (completed_at): conversion, durée et miniature
+    n'attendent plus que le fichier soit stable.
+    """
+    path = Path(record_path)
+    # Session interrompue (redémarrage): fichier encore en .part, finalisé ici
+    if await asyncio.to_thread(complete_recording, path):
+        logger.info("Enregistrement interrompu finalisé", username=username, file=path.name)
+    # Répertoire de segments interrompu: index clos à partir des segments qu'il liste
+    if await asyncio.to_thread(close_segment_index, path):
+        logger.info("Index de segments interrompu clos", username=username, file=path.name)
+    if not path.exists():
+        return False
+    size = recording_size(path)
+    if size == 0:
+        return False
+    # MP4 enregistré directement: prêt tel quel, rien à convertir
+    mp4 = is_mp4_recording(path)
+    thumbnail_path = await generate_recording_thumbnail(path, OUTPUT_DIR, username, FFMPEG_PATH)
+    await db.add_or_update_recording(
+        username=username,
+        filename=path.name,
+        file_path=str(path),
+        file_size=size,
+        recording_id=recording_id,
+        duration_seconds=duration_seconds,
+        thumbnail_path=thumbnail_path,
+        mp4_path=str(path) if mp4 else None,
+        mp4_size=size if mp4 else None,
+        is_converted=mp4,
+        health=health,
+        # Index resté ouvert (illisible): la conversion attendra #EXT-X-ENDLIST
+        completed_at=int(time.time()) if recording_complete(path) else None
+    )
+    conversion_pool.recording_completed()
+    return True
+
+
+async def record_session(sess) -> bool:
+    """
+    Enregistre en base une session terminée, une seule fois (fin de session, sinon reaper)
+
+    Le drapeau est posé avant l'écriture (pas de double enregistrement listener/reaper) et
+    retiré si elle échoue: le reaper retente au passage suivant.
+    """
+    if sess.recorded:
+        return False
+    sess.recorded = True
+    try:
+        health = await asyncio.to_thread(sess.log_tailer.poll)
+        return await record_finished_file(sess.person, sess.record_path, sess.recording_id,
+                                          int(sess.ended_at - sess.start_time), health=health)
+    except BaseException:
+        sess.recorded = False
+        raise
+
+
+async def session_reaper_task():
+    """Enregistre en base les sessions terminées et nettoie leurs répertoires live"""
+    while True:
+        try:
+            await asyncio.sleep(60)
+            finished = await asyncio.to_thread(manager.reap_finished_sessions)
+            # File d'attente: place disque ou débit revenus sans qu'aucune session ne se termine
+            await asyncio.to_thread(manager.drain_queue)
+            for sess in finished:
+                # Normalement déjà fait à la fin de la session (listener); sinon écriture échouée, retentée
+                try:
+                    recorded = await record_session(sess)
+                except Exception as e:
+                    logger.error("Erreur enregistrement session terminée", task="session-reaper",
+                                 session_id=sess.id, error=str(e))
+                    continue
+                if not recorded:
+                    continue
+                logger.info("Session terminée enregistrée",
+                            task="session-reaper",
+                            session_id=sess.id,
+                            person=sess.person,
+                            exit_code=sess.exit_code)
+        except Exception as e:
+            logger.error("Erreur session-reaper task", task="session-reaper", exc_info=True, error=str(e))
+            await asyncio.sleep(60)
+
+
+# ============================================
+# Persistance et reprise des sessions
+# ============================================
+
+_active_sessions_lock = asyncio.Lock()
+
+
+async def _persist_session_started(sess):
+    async with _active_sessions_lock:
+        await db.save_active_session(
+            session_id=sess.id,
+            username=sess.person,
+            display_name=sess.name,
+            input_url=sess.input_url,
+            variant_url=sess.variant_url,
+            record_path=sess.record_path,
+            recording_id=sess.recording_id,
+            pid=sess.process.pid if sess.process else None,
+            priority=sess.priority,
+            started_at=int(sess.start_time)
+        )
+
+
+async def _persist_session_ended(sess):
+    async with _active_sessions_lock:
+        await db.delete_active_session(sess.id)
+    # Enregistrement finalisé (.part renommé): en base et signalé au convertisseur sans attendre le reaper
+    try:
+        if await record_session(sess):
+            logger.info("Enregistrement finalisé", session_id=sess.id, person=sess.person, file=Path(sess.record_path).name)
+    except Exception as e:
+        logger.error("Erreur enregistrement session terminée", session_id=sess.id, exc_info=True, error=str(e))
+
+
+def install_session_persistence(loop: asyncio.AbstractEventLoop):
+    """Reflète les sessions du manager dans la table active_sessions (callbacks appelés depuis des threads)"""
+    manager.set_session_listener(
+        on_started=lambda sess: asyncio.run_coroutine_threadsafe(_persist_session_started(sess), loop),
+        on_ended=lambda sess: asyncio.run_coroutine_threadsafe(_persist_session_ended(sess), loop),
+    )
+
+
+async def recover_sessions():
+    """
+    Reprend les sessions interrompues par un redémarrage
+
+    Le ffmpeg d'une session écrit dans un pipe vers l'ancien processus: il ne peut
+    pas être réadopté. Il est terminé s'il tourne encore, le fichier partiel est
+    enregistré et l'enregistrement redémarre aussitôt si le modèle est en ligne
+    (sinon l'auto-record le relancera à son retour).
+    """
+    rows = await db.get_active_sessions()
+    if rows:
+        logger.info("Reprise des sessions interrompues", count=len(rows))
+
+    for row in rows:
+        username = row['username']
+        try:
+            await asyncio.to_thread(manager.terminate_orphan, row.get('pid'), row.get('variant_url') or row['input_url'])
+            # Compteurs de santé lus dans le log laissé par l'ancienne session
+            old_log = os.path.join(manager.sessions_root, row['session_id'], "ffmpeg.log")
+            health = await asyncio.to_thread(lambda: dict(FFmpegLogTailer(old_log).poll()))
+            await record_finished_file(username, row['record_path'], row.get('recording_id'),
+                                       max(0, int(time.time()) - (row.get('started_at') or int(time.time()))),
+                                       health=health)
+            await db.delete_active_session(row['session_id'])
+
+            if manager.is_recording(username):
+                continue
+
+            # URL fraîche obligatoire: celle de la session a pu expirer (403, fichier .part vide)
+            try:
+                input_url = await fetch_hls_source(username)
+            except Exception as e:
+                logger.debug("Résolution HLS impossible", username=username, error=str(e))
+                input_url = None
+            if not input_url:
+                logger.info("Modèle hors ligne, reprise laissée à l'auto-record", username=username)
+                continue
+
+            model = await db.get_model(username) or {}
+            sess = await manager.start_session_async(
+                input_url,
+                person=username,
+                display_name=row.get('display_name'),
+                priority=row.get('priority') or 0,
+                quality=model.get('record_quality') or 'best',
+                engine=model.get('capture_engine') or None,
+                headers=CHATURBATE_PLAYLIST_HEADERS
+            )
+            logger.success("Session reprise après redémarrage",
+                           username=username,
+                           previous_session_id=row['session_id'],
+                           session_id=sess.id)
+        except AdmissionError as e:
+            logger.info("Reprise en file d'attente", username=username, reason=e.reason)
+        except Exception as e:
+            logger.warning("Reprise de session impossible", username=username, error=str(e))
+
+    # Répertoires live laissés par le run précédent (après lecture de leurs logs)
+    previous = {row['session_id'] for row in rows} | manager.previous_session_dirs
+    await asyncio.to_thread(manager.cleanup_orphan_session_dirs, previous)
+
+
 @app.on_event("startup")
 async def startup_event():
     """Démarre les background tasks au démarrage de l'application"""
@@ -1113,9 +1780,19 @@ async def startup_event():
     # Migrer les données depuis le JSON si nécessaire
     await db.migrate_from_json(MODELS_FILE)
     
+    # Persister les sessions puis reprendre celles interrompues par le redémarrage
+    # (les répertoires live du run précédent sont nettoyés ensuite)
+    install_session_persistence(asyncio.get_running_loop())
+    asyncio.create_task(recover_sessions())
+    
     # Démarrer les tâches de fond
     asyncio.create_task(monitor_models_task(db, manager, FFMPEG_PATH))
     asyncio.create_task(auto_record_task())
     asyncio.create_task(cleanup_old_recordings_task())
-    asyncio.create_task(auto_convert_recordings_task(db, OUTPUT_DIR, FFMPEG_PATH))
-    logger.info("🚀 Background tasks démarrés", tasks=["monitor", "auto-record", "cleanup", "convert"])
+    asyncio.create_task(auto_convert_recordings_task(db, OUTPUT_DIR, FFMPEG_PATH, pool=conversion_pool))
+    asyncio.create_task(incremental_conversion_task())
+    asyncio.create_task(live_preview_reaper_task())
+    asyncio.create_task(session_reaper_task())
+    asyncio.create_task(session_sampler_task())
+    logger.info("🚀 Background tasks démarrés", tasks=["monitor", "auto-record", "cleanup", "convert", "incremental-convert",
+                                                     "live-preview", "session-reaper", "session-sampler"])
@@ -0,0 +1,77 @@
+"""
+Mesure des ressources d'un processus via /proc (Linux)
+CPU% entre deux échantillons et mémoire résidente, sans dépendance externe
+"""
+import os
+import time
+from typing import Optional, Tuple
+
+try:
+    CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+    PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+except (AttributeError, ValueError, OSError):
+    CLOCK_TICKS = 100
+    PAGE_SIZE = 4096
+
+# Intervalle minimal entre deux échantillons CPU (sinon la dernière valeur est réutilisée)
+MIN_SAMPLE_INTERVAL = 1.0
+
+
+def read_cpu_ticks(pid: int) -> Optional[int]:
+    """utime + stime d'un processus, en ticks d'horloge"""
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    # Le nom (champ 2) peut contenir des espaces: repartir après la dernière parenthèse
+    fields = data[data.rfind(b")") + 2:].split()
+    try:
+        return int(fields[11]) + int(fields[12])
+    except (IndexError, ValueError):
+        return None
+
+
+def read_rss_bytes(pid: int) -> Optional[int]:
+    """Mémoire résidente d'un processus, en octets"""
+    try:
+        with open(f"/proc/{pid}/statm", "rb") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+class ProcessSampler:
+    """Échantillonne CPU% et RSS d'un pid; le CPU% porte sur l'intervalle depuis l'échantillon précédent"""
+
+    def __init__(self):
+        self._pid: Optional[int] = None
+        self._last: Optional[Tuple[float, int]] = None
+        self.cpu_percent = 0.0
+        self.rss_bytes = 0
+
+    def sample(self, pid: Optional[int]) -> Tuple[float, int]:
+        if pid != self._pid:
+            # Nouveau processus (aperçu relancé, etc.)
+            self._pid = pid
+            self._last = None
+            self.cpu_percent = 0.0
+            self.rss_bytes = 0
+        if pid is None:
+            return 0.0, 0
+
+        now = time.monotonic()
+        if self._last is not None and now - self._last[0] < MIN_SAMPLE_INTERVAL:
+            return self.cpu_percent, self.rss_bytes
+
+        ticks = read_cpu_ticks(pid)
+        if ticks is None:
+            self.cpu_percent, self.rss_bytes = 0.0, 0
+            return self.cpu_percent, self.rss_bytes
+
+        if self._last is not None:
+            elapsed = now - self._last[0]
+            self.cpu_percent = max(0.0, (ticks - self._last[1]) / CLOCK_TICKS / elapsed * 100)
+        self._last = (now, ticks)
+        self.rss_bytes = read_rss_bytes(pid) or 0
+        return self.cpu_percent, self.rss_bytes
@@ -0,0 +1,239 @@
+"""
+Disposition des enregistrements sur disque
+- fichier: records/<personne>/<horodatage>_<id>.ts (un seul fichier MPEG-TS)
+- segments: records/<personne>/<horodatage>_<id>.hls/ (segments HLS liés + index.m3u8)
+Un fichier unique est écrit sous <nom>.part et renommé à la fin de la session: un .ts/.mp4
+visible est terminé. Un répertoire de segments est terminé quand son index porte #EXT-X-ENDLIST.
+Un fichier unique est en MPEG-TS (converti en MP4 ensuite) ou directement en MP4 fragmenté.
+"""
+import math
+import os
+import re
+from datetime import datetime
+from pathlib import Path
+from typing import List, NamedTuple, Optional, Tuple
+
+LAYOUT_FILE = "file"
+LAYOUT_SEGMENTS = "segments"
+RECORD_LAYOUTS = (LAYOUT_FILE, LAYOUT_SEGMENTS)
+
+CONTAINER_TS = "ts"
+CONTAINER_MP4 = "mp4"
+RECORD_CONTAINERS = (CONTAINER_TS, CONTAINER_MP4)
+# MP4 écrit sur un pipe: moov vide en tête puis un fragment par keyframe, lisible pendant l'écriture
+MP4_MOVFLAGS = "+frag_keyframe+empty_moov+default_base_moof"
+
+SEGMENT_DIR_SUFFIX = ".hls"
+# Fichier en cours d'écriture (ignoré par les listes, la conversion et la rétention)
+RECORDING_PARTIAL_SUFFIX = ".part"
+SEGMENT_INDEX = "index.m3u8"
+
+_MEDIA_SEQUENCE_RE = re.compile(r'^#EXT-X-MEDIA-SEQUENCE:(\d+)', re.MULTILINE)
+_SEGMENT_NAME_RE = re.compile(r'^seg_\d+\.ts$')
+
+
+class SegmentEntry(NamedTuple):
+    name: str
+    duration: float
+    discontinuity: bool
+
+
+def is_segment_dir(path) -> bool:
+    path = Path(path)
+    return path.suffix == SEGMENT_DIR_SUFFIX and path.is_dir()
+
+
+def is_segment_name(name: str) -> bool:
+    return bool(_SEGMENT_NAME_RE.match(name))
+
+
+def is_mp4_recording(path) -> bool:
+    """MP4 enregistré directement (et non issu de la conversion d'un .ts ou d'un répertoire .hls)"""
+    path = Path(path)
+    return (path.suffix == ".mp4"
+            and not path.with_suffix(".ts").exists()
+            and not path.with_suffix(SEGMENT_DIR_SUFFIX).exists())
+
+
+def list_recordings(records_dir: Path) -> List[Path]:
+    """Enregistrements d'une personne, toutes dispositions confondues (.ts, .mp4 direct et répertoires .hls)"""
+    found = list(records_dir.glob("*.ts"))
+    found += [p for p in records_dir.glob(f"*{SEGMENT_DIR_SUFFIX}") if p.is_dir()]
+    found += [p for p in records_dir.glob("*.mp4") if is_mp4_recording(p)]
+    return found
+
+
+def partial_recording_path(path) -> str:
+    """Fichier écrit pendant la capture, renommé sans .part à la finalisation"""
+    return str(path) + RECORDING_PARTIAL_SUFFIX
+
+
+def live_recording_path(path) -> Path:
+    """Emplacement actuel d'un enregistrement: <nom>.part tant qu'il n'est pas finalisé"""
+    partial = Path(partial_recording_path(path))
+    return partial if partial.exists() else Path(path)
+
+
+def complete_recording(path) -> bool:
+    """Renomme <nom>.part en <nom> (atomique); False s'il n'y a rien à finaliser"""
+    try:
+        os.replace(partial_recording_path(path), path)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def recording_started_at(path) -> Optional[datetime]:
+    """Début d'un enregistrement d'après son nom (<AAAAMMJJ_HHMMSS>_<id> ou ancien AAAA-MM-JJ)"""
+    stem = Path(path).name.split(".", 1)[0]
+    for fmt, length in (("%Y%m%d_%H%M%S", 15), ("%Y-%m-%d", 10)):
+        try:
+            return datetime.strptime(stem[:length], fmt)
+        except ValueError:
+            pass
+    return None
+
+
+def recording_input(path) -> Path:
+    """Entrée ffmpeg/ffprobe d'un enregistrement (index.m3u8 pour un répertoire de segments)"""
+    path = Path(path)
+    return path / SEGMENT_INDEX if is_segment_dir(path) else path
+
+
+def recording_size(path) -> int:
+    """Taille d'un enregistrement en octets (somme des segments pour un répertoire)"""
+    path = Path(path)
+    if not is_segment_dir(path):
+        return path.stat().st_size
+    total = 0
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_file():
+                total += entry.stat().st_size
+    return total
+
+
+def recording_mtime(path) -> float:
+    """Dernière écriture d'un enregistrement (index réécrit à chaque segment lié)"""
+    return recording_input(path).stat().st_mtime
+
+
+def recording_complete(path) -> bool:
+    """Un répertoire de segments est complet quand son index porte #EXT-X-ENDLIST"""
+    path = Path(path)
+    if not is_segment_dir(path):
+        return True
+    try:
+        return "#EXT-X-ENDLIST" in (path / SEGMENT_INDEX).read_text()
+    except OSError:
+        return False
+
+
+def playlist_duration(path) -> int:
+    """Durée d'un répertoire de segments (somme des #EXTINF), en secondes"""
+    try:
+        text = recording_input(path).read_text()
+    except OSError:
+        return 0
+    total = 0.0
+    for line in text.splitlines():
+        if line.startswith("#EXTINF:"):
+            try:
+                total += float(line[8:].split(",", 1)[0])
+            except ValueError:
+                pass
+    return int(total)
+
+
+def parse_live_playlist(text: str) -> Tuple[int, List[SegmentEntry]]:
+    """Séquence du premier segment et segments d'une playlist live écrite par ffmpeg"""
+    match = _MEDIA_SEQUENCE_RE.search(text)
+    first_sequence = int(match.group(1)) if match else 0
+    segments = []
+    duration: Optional[float] = None
+    discontinuity = False
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith("#EXTINF:"):
+            try:
+                duration = float(line[8:].split(",", 1)[0])
+            except ValueError:
+                duration = 0.0
+        elif line == "#EXT-X-DISCONTINUITY":
+            discontinuity = True
+        elif line and not line.startswith("#") and duration is not None:
+            segments.append(SegmentEntry(os.path.basename(line), duration, discontinuity))
+            duration = None
+            discontinuity = False
+    return first_sequence, segments
+
+
+def build_segment_playlist(
+    segments: List[SegmentEntry],
+    uri_prefix: str = "",
+    window_seconds: float = 0,
+    ended: bool = False
+) -> str:
+    """
+    Playlist HLS sur des segments conservés
+
+    Args:
+        segments: segments de l'enregistrement, dans l'ordre
+        uri_prefix: préfixe des URIs (vide = relatif au répertoire de l'index)
+        window_seconds: profondeur de la fenêtre (0 = tout l'enregistrement)
+        ended: VOD terminée (#EXT-X-ENDLIST) plutôt qu'EVENT en cours
+    """
+    start = 0
+    if window_seconds > 0:
+        total = 0.0
+        start = len(segments)
+        while start > 0 and total + segments[start - 1].duration <= window_seconds + 0.001:
+            start -= 1
+            total += segments[start].duration
+
+    window = segments[start:]
+    target = max((math.ceil(round(s.duration, 3)) for s in window), default=1)
+
+    lines = [
+        "#EXTM3U",
+        "#EXT-X-VERSION:3",
+        f"#EXT-X-TARGETDURATION:{target}",
+        f"#EXT-X-MEDIA-SEQUENCE:{start}",
+    ]
+    if window_seconds <= 0:
+        lines.append("#EXT-X-PLAYLIST-TYPE:" + ("VOD" if ended else "EVENT"))
+    for seg in window:
+        if seg.discontinuity:
+            lines.append("#EXT-X-DISCONTINUITY")
+        lines.append(f"#EXTINF:{seg.duration:.3f},")
+        lines.append(uri_prefix + seg.name)
+    if ended:
+        lines.append("#EXT-X-ENDLIST")
+    return "\n".join(lines) + "\n"
+
+
+def write_segment_index(dir_path: str, segments: List[SegmentEntry], ended: bool = False):
+    """Réécrit index.m3u8 de façon atomique (jamais lu à moitié écrit)"""
+    index_path = os.path.join(dir_path, SEGMENT_INDEX)
+    tmp = index_path + ".tmp"
+    with open(tmp, "w") as f:
+        f.write(build_segment_playlist(segments, ended=ended))
+    os.replace(tmp, index_path)
+
+
+def close_segment_index(path) -> bool:
+    """
+    Clôt (#EXT-X-ENDLIST) l'index d'un répertoire de segments interrompu avant sa fin
+
+    Sans cette marque, ffmpeg lit l'index comme une playlist live (lecture près de la fin,
+    rechargements sans fin). False si ce n'est pas un répertoire ouvert.
+    """
+    path = Path(path)
+    if not is_segment_dir(path) or recording_complete(path):
+        return False
+    try:
+        _, segments = parse_live_playlist((path / SEGMENT_INDEX).read_text())
+    except OSError:
+        return False
+    write_segment_index(str(path), segments, ended=True)
+    return True
@@ -49,9 +49,6 @@ async def auto_record_task(manager: 'FFmpegManager'):
             
             logger.background_task("auto-record", f"Vérification de {len(models)} modèles")
             
-            # Récupérer les sessions actives
-            active_sessions = manager.list_status()
-            
             for model in models:
                 username = model.get('username')
                 auto_record = model.get('autoRecord', True)  # Par défaut activé
@@ -67,10 +64,7 @@ async def auto_record_task(manager: 'FFmpegManager'):
                     continue
                 
                 # Vérifier si déjà en enregistrement
-                is_recording = any(
-                    s.get('person') == username and s.get('running')
-                    for s in active_sessions
-                )
+                is_recording = manager.is_recording(username)
                 
                 if is_recording:
                     logger.debug("Déjà en enregistrement", 
@@ -104,7 +98,7 @@ async def auto_record_task(manager: 'FFmpegManager'):
                             
                             try:
                                 # Lancer l'enregistrement
-                                session_id = manager.start_session(
+                                session_id = await manager.start_session_async(
                                     input_url=hls_source,
                                     person=username,
                                     display_name=username
@@ -1,102 +1,1397 @@
 """
 Tâche de conversion automatique des enregistrements TS -> MP4
+Les conversions passent par un pool de workers (concurrence bornée, équité entre modèles)
+L'état de chaque conversion est persisté (table conversion_jobs): reprise au redémarrage,
+nouvelles tentatives espacées en cas d'échec
+Les enregistrements live passent toujours avant: le pool s'adapte à la charge de l'hôte
+Option MP4 seul: la source d'une conversion vérifiée est supprimée
+Conversion incrémentale: un enregistrement .ts est encodé par morceaux pendant la capture
 """
 import asyncio
+import json
+import os
+import shutil
+import signal
 import subprocess
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
 from ..logger import logger
+from ..recording_layout import (
+    SEGMENT_INDEX, is_mp4_recording, is_segment_dir, list_recordings, live_recording_path, parse_live_playlist,
+    playlist_duration, recording_complete, recording_input, recording_size,
+)
+from ..ts_index import ByteRangeSegment, index_ts_file
+
+
+# Codecs copiables tels quels dans un MP4 (None = piste absente)
+REMUX_VIDEO_CODECS = {"h264"}
+REMUX_AUDIO_CODECS = {"aac", "mp3", None}
+
+
+# Lignes de stderr ffmpeg conservées par conversion (diagnostic en cas d'échec)
+STDERR_TAIL_LINES = 40
+
+# Suffixe du MP4 en cours d'écriture, renommé une fois la conversion réussie
+PARTIAL_SUFFIX = ".part"
+
+# Délai maximal entre deux tentatives d'un job en échec
+MAX_RETRY_DELAY = 6 * 3600
+
+# Répertoire de travail d'un transcodage découpé (à côté du MP4 partiel, supprimé à la fin)
+CHUNK_DIR_SUFFIX = ".chunks"
+# Segment le plus court d'un transcodage découpé (en dessous, le surcoût domine)
+MIN_CHUNK_SECONDS = 60
+# Répertoire des morceaux encodés pendant la capture (à côté du MP4 partiel)
+LIVE_DIR_SUFFIX = ".live"
+# Queue d'enregistrement trop courte pour être encodée seule (quelques paquets TS)
+MIN_TAIL_BYTES = 64 * 1024
+
+# Vérification d'un MP4 avant suppression de sa source: écart de durée toléré
+VERIFY_DURATION_TOLERANCE = 0.02
+VERIFY_MIN_SECONDS = 2.0
+
+# Réévaluation de la charge de l'hôte par le pool (secondes)
+THROTTLE_INTERVAL = 5
+# Fenêtre de la charge moyenne utilisée (un job récent n'y apparaît pas encore)
+LOAD_AVERAGE_SECONDS = 60
+
+# Appelé à chaque bloc -progress: (secondes de sortie produites, vitesse en x temps réel)
+ProgressCallback = Callable[[float, Optional[float]], None]
+
+# Recette utilisée sans profil (identique au profil 'default' fourni)
+DEFAULT_PROFILE = {"name": "default", "video_codec": "libx264", "preset": "medium", "crf": 23,
+                   "audio_bitrate": "128k", "max_height": 0, "threads": 0, "allow_remux": True}
+
+
+class SourceInfo(NamedTuple):
+    video_codec: Optional[str]
+    audio_codec: Optional[str]
+    height: int
+    # Début de chaque piste après le début du fichier (secondes): décalage A/V à rétablir après découpage
+    video_start: float = 0.0
+    audio_start: float = 0.0
+
+
+async def probe_codecs(input_path: Path, ffmpeg_path: str = "ffmpeg") -> Optional[SourceInfo]:
+    """Codecs et début de la première piste de chaque type, hauteur vidéo; None si ffprobe échoue"""
+    ffprobe_path = ffmpeg_path.replace("ffmpeg", "ffprobe")
+    try:
+        process = await asyncio.create_subprocess_exec(
+            ffprobe_path,
+            "-v", "error",
+            "-show_entries", "stream=codec_type,codec_name,height,start_time:format=start_time",
+            "-of", "json",
+            str(input_path),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL
+        )
+        stdout, _ = await asyncio.wait_for(process.communicate(), timeout=30)
+        if process.returncode != 0:
+            return None
+        info = json.loads(stdout or b"{}")
+        streams = info.get("streams", [])
+    except (asyncio.TimeoutError, OSError, ValueError) as e:
+        logger.debug("Erreur ffprobe codecs", file=str(input_path), error=str(e))
+        return None
+
+    video = next((s for s in streams if s.get("codec_type") == "video"), {})
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), {})
+
+    def start_offset(stream: dict) -> float:
+        try:
+            return max(0.0, float(stream["start_time"]) - float(info["format"]["start_time"]))
+        except (KeyError, TypeError, ValueError):
+            return 0.0
+
+    return SourceInfo(video.get("codec_name"), audio.get("codec_name"), int(video.get("height") or 0),
+                      start_offset(video), start_offset(audio))
+
+
+async def probe_duration(input_path: Path, ffmpeg_path: str = "ffmpeg") -> Optional[float]:
+    """Durée d'un média lisible avec une piste vidéo, None sinon (ex. MP4 sans moov)"""
+    ffprobe_path = ffmpeg_path.replace("ffmpeg", "ffprobe")
+    try:
+        process = await asyncio.create_subprocess_exec(
+            ffprobe_path,
+            "-v", "error",
+            "-show_entries", "format=duration:stream=codec_type",
+            "-of", "json",
+            str(input_path),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL
+        )
+        stdout, _ = await asyncio.wait_for(process.communicate(), timeout=60)
+        if process.returncode != 0:
+            return None
+        info = json.loads(stdout or b"{}")
+        if not any(s.get("codec_type") == "video" for s in info.get("streams", [])):
+            return None
+        return float(info.get("format", {}).get("duration"))
+    except (asyncio.TimeoutError, OSError, ValueError, TypeError) as e:
+        logger.debug("Erreur ffprobe durée", file=str(input_path), error=str(e))
+        return None
+
+
+async def verify_mp4(mp4_path: Path, source_seconds: float, ffmpeg_path: str = "ffmpeg") -> Tuple[bool, str]:
+    """Le MP4 est-il lisible et de la durée de sa source (à max(2 s, 2 %) près)"""
+    if source_seconds <= 0:
+        return False, "durée de la source inconnue"
+    duration = await probe_duration(mp4_path, ffmpeg_path)
+    if duration is None:
+        return False, "MP4 illisible"
+    if abs(duration - source_seconds) > max(VERIFY_MIN_SECONDS, source_seconds * VERIFY_DURATION_TOLERANCE):
+        return False, f"durée {duration:.0f}s pour une source de {source_seconds:.0f}s"
+    return True, ""
+
+
+def can_remux(source: Optional[SourceInfo], max_height: int = 0) -> bool:
+    """Le MP4 peut-il être produit par simple copie des flux (sans dépasser la hauteur du profil)"""
+    if source is None:
+        return False
+    if max_height and source.height > max_height:
+        return False
+    return source.video_codec in REMUX_VIDEO_CODECS and source.audio_codec in REMUX_AUDIO_CODECS
+
+
+def video_encode_args(profile: dict, reset_start: bool = False) -> List[str]:
+    """
+    Options d'encodage vidéo d'un profil (codec, preset, CRF, hauteur max)
+
+    reset_start: la vidéo produite commence à 0 quel que soit le début des autres pistes
+    de l'entrée (morceaux recollés ensuite par le demuxer concat)
+    """
+    codec = profile.get("video_codec") or "libx264"
+    args = ["-c:v", codec]
+    if profile.get("preset"):
+        args += ["-preset", str(profile["preset"])]
+    if profile.get("crf") is not None:
+        args += ["-crf", str(profile["crf"])]
+    if codec == "libx265":
+        # Étiquette attendue par Safari/QuickTime pour le HEVC en MP4
+        args += ["-tag:v", "hvc1"]
+    filters = ["setpts=PTS-STARTPTS"] if reset_start else []
+    if profile.get("max_height"):
+        filters.append(f"scale=-2:'min({int(profile['max_height'])},ih)'")
+    if filters:
+        args += ["-vf", ",".join(filters)]
+    return args
+
+
+def audio_encode_args(profile: dict) -> List[str]:
+    return ["-c:a", "aac", "-b:a", profile.get("audio_bitrate") or "128k"]
+
+
+def threads_args(profile: dict, threads: int = 0) -> List[str]:
+    threads = profile.get("threads") or threads
+    return ["-threads", str(threads)] if threads > 0 else []
+
+
+def transcode_args(profile: dict, threads: int = 0) -> List[str]:
+    """Options d'encodage d'un profil (codec, preset, CRF, hauteur max, audio, threads)"""
+    return [*video_encode_args(profile), *audio_encode_args(profile), *threads_args(profile, threads)]
+
+
+def chunk_duration(duration: float, chunk_seconds: int, chunk_jobs: int) -> float:
+    """Durée cible des segments: au plus chunk_seconds, assez courte pour occuper chunk_jobs encodeurs"""
+    return max(MIN_CHUNK_SECONDS, min(chunk_seconds, duration / max(1, chunk_jobs)))
+
+
+def next_live_chunk(segments: List[ByteRangeSegment], offset: int,
+                    chunk_seconds: float) -> Optional[Tuple[int, int, float]]:
+    """
+    Prochain morceau complet d'un enregistrement en cours
+
+    segments: (offset, longueur, durée, discontinuité) alignés sur les keyframes (TsKeyframeIndexer)
+    offset: octet jusqu'auquel l'enregistrement est déjà encodé (0 = rien)
+    Retourne (début, fin, durée) dès que chunk_seconds de vidéo sont indexés après offset,
+    ou plus tôt si une discontinuité suit: un morceau ne chevauche jamais un saut d'horloge.
+    """
+    start: Optional[int] = None
+    end = 0
+    total = 0.0
+    for seg in segments:
+        if seg.offset < offset:
+            continue
+        if seg.discontinuity and start is not None:
+            return start, end, total
+        if start is None:
+            start = seg.offset
+        end = seg.offset + seg.length
+        total += seg.duration
+        if total >= chunk_seconds:
+            return start, end, total
+    return None
+
+
+def subfile_input(path: Path, start: int, end: int = 0) -> str:
+    """Plage d'octets d'un fichier lue par ffmpeg sans copie (end 0 = jusqu'à la fin)"""
+    return f"subfile,,start,{start},end,{end},,:{path}"
+
+
+def chunk_inputs(recording: Path, segment_seconds: float) -> List[str]:
+    """
+    Entrées ffmpeg des morceaux d'un transcodage découpé, coupés aux keyframes sans copie
+
+    Fichier TS: plages d'octets (subfile) tirées de son index de keyframes.
+    Répertoire de segments: segments consécutifs lus bout à bout (protocole concat).
+    Un morceau ne chevauche jamais une discontinuité.
+    """
+    if is_segment_dir(recording):
+        _, entries = parse_live_playlist((recording / SEGMENT_INDEX).read_text())
+        groups: List[List[str]] = []
+        total = 0.0
+        for entry in entries:
+            if not groups or entry.discontinuity or total >= segment_seconds:
+                groups.append([])
+                total = 0.0
+            groups[-1].append(str(recording / entry.name))
+            total += entry.duration
+        return ["concat:" + "|".join(group) for group in groups]
+
+    segments = index_ts_file(recording)
+    ranges: List[Tuple[int, int]] = []
+    offset = 0
+    while True:
+        chunk = next_live_chunk(segments, offset, segment_seconds)
+        if chunk is None:
+            break
+        # Le premier morceau part du début du fichier (paquets avant la première keyframe compris)
+        ranges.append((offset, chunk[1]))
+        offset = chunk[1]
+    # Queue: segment en cours à la fin de l'index et reste de moins de segment_seconds
+    if recording.stat().st_size - offset > MIN_TAIL_BYTES or not ranges:
+        ranges.append((offset, 0))
+    else:
+        ranges[-1] = (ranges[-1][0], 0)
+    return [subfile_input(recording, start, end) for start, end in ranges]
+
+
+def _parse_speed(value: str) -> Optional[float]:
+    """'1.53x' -> 1.53 (None pour N/A)"""
+    try:
+        return float(value.rstrip("x"))
+    except ValueError:
+        return None
+
+
+async def _read_progress(stream: asyncio.StreamReader, on_progress: Optional[ProgressCallback]):
+    """Lit les blocs clé=valeur de -progress et signale (secondes produites, vitesse) à chaque bloc"""
+    out_seconds = 0.0
+    speed: Optional[float] = None
+    async for raw in stream:
+        key, _, value = raw.decode("utf-8", errors="replace").strip().partition("=")
+        if key in ("out_time_us", "out_time_ms") and value.lstrip("-").isdigit():
+            # out_time_ms est lui aussi en microsecondes (nom historique de ffmpeg)
+            out_seconds = max(0.0, int(value) / 1_000_000)
+        elif key == "speed":
+            speed = _parse_speed(value)
+        elif key == "progress" and on_progress is not None:
+            on_progress(out_seconds, speed)
+
+
+async def _read_stderr_tail(stream: asyncio.StreamReader, tail: deque):
+    """Garde les dernières lignes de stderr (mémoire bornée, même sur des heures d'encodage)"""
+    async for raw in stream:
+        line = raw.decode("utf-8", errors="replace").rstrip()
+        if line:
+            tail.append(line)
+
+
+def low_priority_prefix(nice: int = 0, io_idle: bool = False) -> List[str]:
+    """
+    Préfixe de commande qui abaisse la priorité CPU (nice) et disque (ionice classe idle)
+
+    nice et ionice font un exec: le PID obtenu reste celui de ffmpeg.
+    Outil absent: la priorité correspondante n'est pas changée.
+    """
+    prefix: List[str] = []
+    if nice > 0 and shutil.which("nice"):
+        prefix += ["nice", "-n", str(min(nice, 19))]
+    if io_idle and shutil.which("ionice"):
+        prefix += ["ionice", "-c", "3"]
+    return prefix
+
+
+async def _run_ffmpeg(
+    cmd: list,
+    on_progress: Optional[ProgressCallback] = None,
+    prefix: Optional[List[str]] = None,
+    on_spawn: Optional[Callable[[asyncio.subprocess.Process], None]] = None
+) -> Tuple[bool, str]:
+    """Exécute ffmpeg avec -progress sur stdout, retourne (succès, dernières lignes de stderr)"""
+    cmd = [*(prefix or []), cmd[0], "-progress", "pipe:1", "-nostats", *cmd[1:]]
+    logger.debug("Commande FFmpeg", command=" ".join(cmd[:8]) + "...")
+    process = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    if on_spawn is not None:
+        on_spawn(process)
+    tail: deque = deque(maxlen=STDERR_TAIL_LINES)
+    try:
+        await asyncio.gather(
+            _read_progress(process.stdout, on_progress),
+            _read_stderr_tail(process.stderr, tail),
+        )
+        await process.wait()
+    except BaseException:
+        # Annulation (arrêt de l'application): ne pas laisser un encodage orphelin
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        raise
+    error_msg = "\n".join(tail) or "Unknown error"
+    return process.returncode == 0, error_msg[-500:]  # Limiter la longueur
+
+
+async def _first_failure(coros: list) -> Tuple[bool, str]:
+    """Exécute des commandes ffmpeg en parallèle; au premier échec, annule les autres"""
+    tasks = [asyncio.ensure_future(c) for c in coros]
+    try:
+        for future in asyncio.as_completed(tasks):
+            success, error_msg = await future
+            if not success:
+                return False, error_msg
+        return True, ""
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _transcode_chunked(
+    ts_path: Path,
+    output_path: Path,
+    ffmpeg_path: str,
+    profile: dict,
+    threads: int,
+    segment_seconds: float,
+    chunk_jobs: int,
+    source: SourceInfo,
+    on_progress: Optional[ProgressCallback] = None,
+    prefix: Optional[List[str]] = None,
+    on_spawn: Optional[Callable[[asyncio.subprocess.Process], None]] = None
+) -> Tuple[bool, str]:
+    """
+    Transcodage découpé d'un long enregistrement
+
+    1. l'enregistrement est découpé aux keyframes en morceaux lus en place (voir chunk_inputs)
+    2. les morceaux sont encodés en parallèle (chunk_jobs processus, réglages identiques),
+       chacun à partir de 0; l'audio est encodé d'une traite en même temps
+       (pas de silence d'amorçage AAC aux jonctions)
+    3. les morceaux encodés sont recollés sans réencodage (demuxer concat) avec la piste audio,
+       au décalage A/V d'origine (source.video_start / audio_start)
+    """
+    work_dir = output_path.with_name(output_path.name + CHUNK_DIR_SUFFIX)
+    await asyncio.to_thread(shutil.rmtree, work_dir, True)
+    work_dir.mkdir()
+    try:
+        try:
+            sources = await asyncio.to_thread(chunk_inputs, ts_path, segment_seconds)
+        except OSError as e:
+            return False, f"Découpage impossible: {e}"
+        if not sources:
+            return False, "Aucun morceau à encoder"
+        has_audio = source.audio_codec is not None
+
+        # Avancement: somme des secondes produites; vitesse: somme des encodeurs actifs
+        produced = [0.0] * len(sources)
+        speeds: List[Optional[float]] = [None] * len(sources)
+
+        def chunk_progress(index: int) -> ProgressCallback:
+            def report(out_seconds: float, speed: Optional[float]):
+                produced[index] = out_seconds
+                speeds[index] = speed
+                if on_progress is not None:
+                    on_progress(sum(produced), sum(s for s in speeds if s) or None)
+            return report
+
+        semaphore = asyncio.Semaphore(chunk_jobs)
+
+        async def encode_chunk(index: int, chunk_input: str) -> Tuple[bool, str]:
+            async with semaphore:
+                result = await _run_ffmpeg([
+                    ffmpeg_path,
+                    "-f", "mpegts",
+                    "-i", chunk_input,
+                    "-map", "0:v:0",
+                    *video_encode_args(profile, reset_start=True),
+                    *threads_args(profile, threads),
+                    "-an",
+                    "-f", "mp4",
+                    "-y",
+                    str(work_dir / f"enc_{index:05d}.mp4")
+                ], chunk_progress(index), prefix, on_spawn)
+                # Segment terminé: il ne compte plus dans la vitesse
+                speeds[index] = None
+                return result
+
+        jobs = [encode_chunk(i, chunk_input) for i, chunk_input in enumerate(sources)]
+        if has_audio:
+            jobs.append(_run_ffmpeg(audio_track_cmd(ffmpeg_path, recording_input(ts_path), profile,
+                                                    work_dir / "audio.m4a"),
+                                    prefix=prefix, on_spawn=on_spawn))
+        success, error_msg = await _first_failure(jobs)
+        if not success:
+            return False, error_msg
+
+        return await _concat_chunks(ffmpeg_path, work_dir, [f"enc_{i:05d}.mp4" for i in range(len(sources))],
+                                    has_audio, profile, output_path, prefix, on_spawn,
+                                    video_offset=source.video_start, audio_offset=source.audio_start)
+    finally:
+        await asyncio.to_thread(shutil.rmtree, work_dir, True)
+
+
+async def _concat_chunks(
+    ffmpeg_path: str,
+    work_dir: Path,
+    chunks: List[str],
+    has_audio: bool,
+    profile: dict,
+    output_path: Path,
+    prefix: Optional[List[str]] = None,
+    on_spawn: Optional[Callable[[asyncio.subprocess.Process], None]] = None,
+    video_offset: float = 0.0,
+    audio_offset: float = 0.0
+) -> Tuple[bool, str]:
+    """
+    Recolle sans réencodage les segments vidéo encodés (demuxer concat) avec audio.m4a
+
+    video_offset / audio_offset: début de chaque piste dans la source (les morceaux et
+    la piste audio commencent à 0), rétabli par -itsoffset.
+    """
+    list_path = work_dir / "concat.txt"
+    list_path.write_text("".join(f"file '{name}'\n" for name in chunks))
+    concat_cmd = [ffmpeg_path]
+    if has_audio and video_offset > 0:
+        concat_cmd += ["-itsoffset", f"{video_offset:.3f}"]
+    concat_cmd += ["-f", "concat", "-safe", "0", "-i", str(list_path)]
+    if has_audio:
+        if audio_offset > 0:
+            concat_cmd += ["-itsoffset", f"{audio_offset:.3f}"]
+        concat_cmd += ["-i", str(work_dir / "audio.m4a"), "-map", "0:v", "-map", "1:a"]
+    concat_cmd += ["-c", "copy"]
+    if profile.get("video_codec") == "libx265":
+        concat_cmd += ["-tag:v", "hvc1"]
+    concat_cmd += ["-movflags", "+faststart", "-f", "mp4", "-y", str(output_path)]
+    return await _run_ffmpeg(concat_cmd, prefix=prefix, on_spawn=on_spawn)
+
+
+def audio_track_cmd(ffmpeg_path: str, input_path: Path, profile: dict, output_path: Path) -> List[str]:
+    """Encodage de la piste audio entière, en une fois (recollée aux segments vidéo)"""
+    return [
+        ffmpeg_path,
+        "-i", str(input_path),
+        "-map", "0:a:0",
+        "-vn",
+        *audio_encode_args(profile),
+        "-f", "mp4",
+        "-y",
+        str(output_path)
+    ]
 
 
 async def convert_ts_to_mp4(
     ts_path: Path, 
     mp4_path: Optional[Path] = None,
-    ffmpeg_path: str = "ffmpeg"
-) -> tuple[bool, Optional[Path], Optional[int]]:
+    ffmpeg_path: str = "ffmpeg",
+    threads: int = 0,
+    recompress: bool = False,
+    profile: Optional[dict] = None,
+    on_progress: Optional[ProgressCallback] = None,
+    prefix: Optional[List[str]] = None,
+    on_spawn: Optional[Callable[[asyncio.subprocess.Process], None]] = None,
+    duration: float = 0,
+    chunk_seconds: int = 0,
+    chunk_jobs: int = 1
+) -> tuple[bool, Optional[Path], Optional[int], str, Optional[str]]:
     """
-    Convertit un fichier TS en MP4 avec compression optimisée
+    Convertit un fichier TS en MP4
+    
+    Le MP4 est écrit sous <nom>.mp4.part puis renommé: un MP4 présent sur disque
+    est toujours complet, même après un arrêt en pleine conversion.
+    
+    Sources H.264/AAC (le cas des flux HLS enregistrés): remux sans réencodage,
+    en quelques secondes, si le profil l'autorise. Sinon, ou si recompress est
+    demandé: transcodage selon le profil (libx264 medium CRF 23 par défaut).
+    
+    threads: threads d'encodage si le profil n'en fixe pas (0 = choix de ffmpeg)
+    on_progress: suivi de l'avancement (voir ProgressCallback)
+    prefix: préfixe de priorité (voir low_priority_prefix)
+    on_spawn: reçoit chaque processus ffmpeg lancé (suspension par le pool)
+    duration / chunk_seconds / chunk_jobs: un enregistrement d'au moins deux segments
+    de chunk_seconds est transcodé en segments parallèles (voir _transcode_chunked)
     
     Returns:
-        (success, mp4_path, mp4_size)
+        (success, mp4_path, mp4_size, mode, error) avec mode 'remux' ou 'transcode'
     """
+    profile = profile or DEFAULT_PROFILE
     if not ts_path.exists():
         logger.error("Fichier TS introuvable", ts_path=str(ts_path))
-        return False, None, None
+        return False, None, None, "transcode", "Fichier TS introuvable"
     
     # Générer le nom du fichier MP4 si non fourni
     if mp4_path is None:
         mp4_path = ts_path.with_suffix('.mp4')
+    partial_path = mp4_path.with_name(mp4_path.name + PARTIAL_SUFFIX)
+    
+    input_path = recording_input(ts_path)
+    mode = "transcode"
+    source: Optional[SourceInfo] = None
+    if profile.get("allow_remux") and not recompress:
+        source = await probe_codecs(input_path, ffmpeg_path)
+        if can_remux(source, profile.get("max_height") or 0):
+            mode = "remux"
+        else:
+            logger.info("Source non copiable, transcodage", ts_file=ts_path.name, source=source)
     
     logger.info("🔄 Conversion TS->MP4 démarrée", 
                ts_file=ts_path.name, 
-               mp4_file=mp4_path.name)
+               mp4_file=mp4_path.name,
+               profile=profile.get("name"),
+               mode=mode)
+    
+    # Remux: copie des pistes sondées (première vidéo, première audio), ADTS -> ASC pour l'AAC seul, moov en tête
+    audio_codec = source.audio_codec if source is not None else None
+    remux_cmd = [
+        ffmpeg_path,
+        "-i", str(input_path),
+        "-map", "0:v:0",
+        *(["-map", "0:a:0"] if audio_codec else []),
+        "-c", "copy",
+        *(["-bsf:a", "aac_adtstoasc"] if audio_codec == "aac" else []),
+        "-movflags", "+faststart",
+        "-f", "mp4",
+        "-y",
+        str(partial_path)
+    ]
     
-    # Commande FFmpeg optimisée pour compression
-    # -c:v libx264 : codec H.264 (meilleure compression)
-    # -crf 23 : qualité (18-28, 23 = bon équilibre qualité/taille)
-    # -preset medium : vitesse de compression (fast, medium, slow)
-    # -c:a aac : codec audio AAC
-    # -b:a 128k : bitrate audio
-    cmd = [
+    # Transcodage selon le profil (codec, preset, CRF, hauteur max, bitrate audio)
+    transcode_cmd = [
         ffmpeg_path,
-        "-i", str(ts_path),
-        "-c:v", "libx264",
-        "-crf", "23",
-        "-preset", "medium",
-        "-c:a", "aac",
-        "-b:a", "128k",
+        "-i", str(input_path),
+        *transcode_args(profile, threads),
         "-movflags", "+faststart",  # Optimisation streaming
+        "-f", "mp4",  # Extension .part: format explicite
         "-y",  # Overwrite
-        str(mp4_path)
+        str(partial_path)
     ]
     
     try:
-        # Lancer la conversion
-        logger.debug("Commande FFmpeg", command=" ".join(cmd[:8]) + "...")
+        started = time.time()
+        if mode == "remux":
+            success, error_msg = await _run_ffmpeg(remux_cmd, on_progress, prefix, on_spawn)
+            if not success:
+                logger.warning("Remux échoué, transcodage", ts_file=ts_path.name, error=error_msg)
+                mode = "transcode"
+        chunked = False
+        if mode == "transcode" and chunk_seconds > 0 and chunk_jobs > 1 and duration >= 2 * chunk_seconds:
+            if source is None:
+                source = await probe_codecs(input_path, ffmpeg_path)
+            # Sans description des pistes, pas de découpage (piste audio à recoller inconnue)
+            if source is not None and source.video_codec:
+                segment_seconds = chunk_duration(duration, chunk_seconds, chunk_jobs)
+                logger.info("Transcodage découpé", ts_file=ts_path.name, chunk_jobs=chunk_jobs,
+                            segment_seconds=round(segment_seconds))
+                success, error_msg = await _transcode_chunked(
+                    ts_path, partial_path, ffmpeg_path, profile, threads, segment_seconds, chunk_jobs,
+                    source, on_progress, prefix, on_spawn
+                )
+                chunked = success
+                if not success:
+                    logger.warning("Transcodage découpé échoué, transcodage en un passage",
+                                   ts_file=ts_path.name, error=error_msg)
+        if mode == "transcode" and not chunked:
+            success, error_msg = await _run_ffmpeg(transcode_cmd, on_progress, prefix, on_spawn)
         
-        process = await asyncio.create_subprocess_exec(
-            *cmd,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-        
-        stdout, stderr = await process.communicate()
-        
-        if process.returncode == 0:
-            # Conversion réussie
+        if success:
+            # Conversion réussie: le MP4 apparaît sous son nom final d'un seul coup
+            os.replace(partial_path, mp4_path)
             mp4_size = mp4_path.stat().st_size
-            ts_size = ts_path.stat().st_size
-            reduction = ((ts_size - mp4_size) / ts_size) * 100
+            ts_size = recording_size(ts_path)
+            reduction = ((ts_size - mp4_size) / ts_size) * 100 if ts_size else 0.0
             
             logger.success("✅ Conversion réussie",
                          ts_file=ts_path.name,
                          mp4_file=mp4_path.name,
+                         mode=mode,
+                         chunked=chunked,
+                         elapsed_seconds=round(time.time() - started, 1),
                          ts_size_mb=f"{ts_size / 1024 / 1024:.1f}",
                          mp4_size_mb=f"{mp4_size / 1024 / 1024:.1f}",
                          reduction_percent=f"{reduction:.1f}%")
             
-            return True, mp4_path, mp4_size
+            return True, mp4_path, mp4_size, mode, None
         else:
             # Erreur de conversion
-            error_msg = stderr.decode('utf-8') if stderr else "Unknown error"
             logger.error("❌ Erreur conversion",
                         ts_file=ts_path.name,
-                        error=error_msg[:500])  # Limiter la longueur
-            return False, None, None
+                        error=error_msg)
+            return False, None, None, mode, error_msg
             
     except Exception as e:
         logger.error("❌ Exception conversion",
                     ts_file=ts_path.name,
                     error=str(e),
                     exc_info=True)
-        return False, None, None
+        return False, None, None, mode, str(e)
+    finally:
+        # Sortie partielle d'un échec (ou d'une annulation)
+        if partial_path.exists():
+            partial_path.unlink()
+
+
+def default_conversion_workers(threads_per_job: int) -> int:
+    """Nombre de conversions simultanées qui occupe les cœurs sans les surcharger"""
+    return max(1, (os.cpu_count() or 1) // max(1, threads_per_job))
+
+
+def parse_time_window(text: str) -> Optional[Tuple[int, int]]:
+    """'01:00-07:30' -> (60, 450) en minutes depuis minuit; None si vide ou invalide"""
+    try:
+        start, end = (part.strip() for part in text.split("-", 1))
+        bounds = []
+        for part in (start, end):
+            hours, minutes = part.split(":", 1)
+            if not (0 <= int(hours) <= 23 and 0 <= int(minutes) <= 59):
+                return None
+            bounds.append(int(hours) * 60 + int(minutes))
+        return bounds[0], bounds[1]
+    except ValueError:
+        return None
+
+
+def in_time_window(window: Tuple[int, int], now: datetime) -> bool:
+    """L'heure est-elle dans la fenêtre (qui peut passer minuit, ex. 22:00-06:00)"""
+    start, end = window
+    minute = now.hour * 60 + now.minute
+    if start <= end:
+        return start <= minute < end
+    return minute >= start or minute < end
+
+
+def retry_delay(attempts: int, base_seconds: float) -> float:
+    """Attente avant la tentative suivante: base, 2x base, 4x base... plafonnée"""
+    return min(MAX_RETRY_DELAY, base_seconds * 2 ** max(0, attempts - 1))
+
+
+def _suspended_seconds(job: dict, now: float) -> float:
+    """Temps passé sous SIGSTOP par un job actif (suspension en cours comprise)"""
+    since = job["suspended_since"]
+    return job["suspended_seconds"] + (now - since if since is not None else 0.0)
+
+
+class ConversionPool:
+    """
+    Pool de conversions TS -> MP4
+
+    Une file par modèle, servies à tour de rôle: un modèle avec 30 enregistrements
+    en attente ne bloque pas les autres. Les modèles de priorité plus haute passent
+    d'abord. Le débit est mesuré en secondes de vidéo converties par seconde
+    d'horloge (pendant que le pool travaille).
+
+    Les files en mémoire ne sont qu'un cache: l'état de référence est la table
+    conversion_jobs (queued, running, done, failed). Un échec est retenté après
+    retry_delay() jusqu'à max_attempts tentatives, puis le job passe en 'failed'.
+
+    Les enregistrements live gardent la priorité (load_probe = host_metrics du manager):
+    - hors de la fenêtre horaire, ou avec pause_sessions enregistrements en cours ou plus: aucun nouveau job
+    - contre-pression disque d'un writer: aucun nouveau job et encodages en cours suspendus (SIGSTOP)
+    - sinon, un job de plus par minute tant que la charge 1 min par cœur reste sous max_load
+    Les encodeurs tournent sous nice / ionice idle.
+    """
+
+    def __init__(self, db, ffmpeg_path: str = "ffmpeg", workers: int = 0, threads_per_job: int = 4,
+                 default_profile: str = "default", max_attempts: int = 5, retry_base_seconds: float = 60,
+                 load_probe: Optional[Callable[[], dict]] = None, max_load: float = 0.9, pause_sessions: int = 0,
+                 window: str = "", nice: int = 10, io_idle: bool = True, chunk_seconds: int = 600, chunk_jobs: int = 0,
+                 keep_mp4_only: bool = False, incremental: bool = True):
+        self.db = db
+        # Enregistrements .ts en cours encodés par morceaux (clé: chemin de l'enregistrement)
+        self.incremental = incremental and chunk_seconds > 0
+        self._live: Dict[str, dict] = {}
+        # Suppression de la source une fois le MP4 vérifié
+        self.keep_mp4_only = keep_mp4_only
+        self.reclaimed = 0
+        self.reclaimed_bytes = 0
+        self._reclaiming: set = set()
+        # Sources dont le MP4 n'a pas passé la vérification (conservées, pas de nouvel essai)
+        self._unverified: set = set()
+        self._background: set = set()
+        # Long enregistrement: segments encodés en parallèle (0 = pas de découpage)
+        self.chunk_seconds = chunk_seconds
+        self.max_attempts = max(1, max_attempts)
+        self.retry_base_seconds = retry_base_seconds
+        self.ffmpeg_path = ffmpeg_path
+        self.threads_per_job = threads_per_job
+        # Profil des modèles sans profil attribué
+        self.default_profile = default_profile
+        self.workers = workers or default_conversion_workers(threads_per_job)
+        # Encodeurs parallèles d'un transcodage découpé, pris sur les places libres du pool
+        self.chunk_jobs = chunk_jobs or self.workers
+        # username -> file de (priorité, enregistrement); l'ordre des clés donne le tour de rôle
+        self._queues: "OrderedDict[str, deque]" = OrderedDict()
+        self._known: set = set()
+        self._active: Dict[str, dict] = {}
+        self._wakeup = asyncio.Event()
+        # Enregistrement finalisé par une session: le scan repart sans attendre son intervalle
+        self._recording_done = asyncio.Event()
+        self._tasks: list = []
+        self.completed = 0
+        self.failed = 0
+        self.source_seconds = 0.0
+        self._busy_seconds = 0.0
+        self._busy_since: Optional[float] = None
+        # Régulation selon la charge de l'hôte
+        self.load_probe = load_probe
+        self.max_load = max_load
+        self.pause_sessions = pause_sessions
+        self.window = parse_time_window(window) if window else None
+        if window and self.window is None:
+            logger.warning("Fenêtre de conversion invalide (attendu HH:MM-HH:MM), ignorée", window=window)
+        self.prefix = low_priority_prefix(nice, io_idle)
+        # Aucun job avant la première évaluation de la charge
+        self._allowed = 0 if (load_probe or self.window) else self.workers
+        self._running = 0
+        self._last_start = 0.0
+        # Processus ffmpeg de chaque job (plusieurs pour un transcodage découpé)
+        self._processes: Dict[str, List[asyncio.subprocess.Process]] = {}
+        self._suspended = False
+        self._throttle_reason: Optional[str] = None
+
+    def start(self):
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._throttle_loop()))
+        logger.info("🧵 Pool de conversion démarré", workers=self.workers, threads_per_job=self.threads_per_job,
+                    chunk_jobs=self.chunk_jobs if self.chunk_seconds else None,
+                    priority=" ".join(self.prefix) or None)
+
+    async def resume(self) -> int:
+        """Remet en file les jobs interrompus par le dernier arrêt (repris au prochain passage)"""
+        count = await self.db.requeue_interrupted_conversion_jobs()
+        if count:
+            logger.info("♻️ Conversions interrompues remises en file", jobs=count)
+        return count
+
+    def submit(self, username: str, rec: dict, priority: int = 0) -> bool:
+        """Met un enregistrement en file (False s'il y est déjà ou en cours de conversion)"""
+        key = rec['file_path']
+        if key in self._known:
+            return False
+        self._known.add(key)
+        self._queues.setdefault(username, deque()).append((priority, rec))
+        self._wakeup.set()
+        logger.debug("Conversion en file", username=username, filename=rec['filename'], queue_depth=self.queue_depth())
+        return True
+
+    async def model_settings(self, username: str) -> Tuple[dict, bool]:
+        """Profil de conversion et option recompress d'un modèle"""
+        model = await self.db.get_model(username) or {}
+        name = model.get('conversion_profile') or self.default_profile
+        profile = await self.db.get_conversion_profile(name)
+        if profile is None and name != self.default_profile:
+            logger.warning("Profil de conversion inconnu, profil par défaut", username=username, profile=name)
+            profile = await self.db.get_conversion_profile(self.default_profile)
+        return profile or DEFAULT_PROFILE, bool(model.get('recompress'))
+
+    async def wants_conversion(self, username: str) -> bool:
+        """Faux si le profil du modèle désactive la conversion (video_codec 'none')"""
+        profile, _ = await self.model_settings(username)
+        return profile.get("video_codec") != "none"
+
+    def recording_completed(self):
+        """Une session vient de finaliser un enregistrement (appelé depuis la boucle asyncio)"""
+        self._recording_done.set()
+
+    async def wait_for_recordings(self, timeout: float):
+        """Attend le prochain scan: intervalle écoulé ou enregistrement finalisé"""
+        try:
+            await asyncio.wait_for(self._recording_done.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._recording_done.clear()
+
+    def is_pending(self, file_path: str) -> bool:
+        """En file ou en cours de conversion (le MP4 partiel existe déjà sur disque)"""
+        return file_path in self._known
+
+    def queue_depth(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    def _next_job(self) -> Optional[tuple]:
+        """Prochain enregistrement: priorité la plus haute, tour de rôle entre modèles de même priorité"""
+        heads = [(q[0][0], username) for username, q in self._queues.items() if q]
+        if not heads:
+            self._queues.clear()
+            return None
+        top = max(priority for priority, _ in heads)
+        username = next(u for priority, u in heads if priority == top)
+        q = self._queues.pop(username)
+        _, rec = q.popleft()
+        if q:
+            # Le modèle repasse en fin de tour
+            self._queues[username] = q
+        return username, rec
+
+    def _busy_wall_seconds(self) -> float:
+        if self._busy_since is None:
+            return self._busy_seconds
+        return self._busy_seconds + time.monotonic() - self._busy_since
+
+    def _evaluate_throttle(self, metrics: Optional[dict]) -> Tuple[int, bool, Optional[str]]:
+        """(jobs simultanés permis, suspendre les encodages en cours, raison de la limitation)"""
+        if self.window and not in_time_window(self.window, datetime.now()):
+            return 0, False, "outside_window"
+        if metrics is None:
+            return self.workers, False, None
+        if metrics.get("sessions_write_pressure"):
+            return 0, True, "write_pressure"
+        if self.pause_sessions and metrics.get("sessions_running", 0) >= self.pause_sessions:
+            return 0, False, "recording_peak"
+        if self.max_load > 0:
+            load = metrics.get("load_average", [0.0])[0] / (metrics.get("cpu_count") or 1)
+            if load >= self.max_load:
+                return min(self._running, self.workers), False, "host_load"
+            # Un job de plus à la fois: la charge moyenne ne reflète un nouveau job qu'après une minute
+            if time.monotonic() - self._last_start < LOAD_AVERAGE_SECONDS:
+                return max(self._running, 1), False, "ramp_up"
+            return min(self._running + 1, self.workers), False, None
+        return self.workers, False, None
+
+    def _set_suspended(self, suspend: bool):
+        """Suspend (SIGSTOP) ou reprend (SIGCONT) les encodages en cours"""
+        if suspend == self._suspended or not hasattr(signal, "SIGSTOP"):
+            return
+        self._suspended = suspend
+        for process in (p for processes in self._processes.values() for p in processes):
+            if process.returncode is None:
+                try:
+                    process.send_signal(signal.SIGSTOP if suspend else signal.SIGCONT)
+                except ProcessLookupError:
+                    pass
+        now = time.time()
+        for job in self._active.values():
+            job["suspended"] = suspend
+            if suspend:
+                job["suspended_since"] = now
+            elif job["suspended_since"] is not None:
+                job["suspended_seconds"] += now - job["suspended_since"]
+                job["suspended_since"] = None
+        if suspend:
+            logger.warning("⏸️ Conversions suspendues: écritures d'enregistrement ralenties", jobs=len(self._active))
+        else:
+            logger.info("▶️ Conversions reprises", jobs=len(self._active))
+
+    async def _throttle_loop(self):
+        while True:
+            try:
+                metrics = await asyncio.to_thread(self.load_probe) if self.load_probe else None
+                allowed, suspend, reason = self._evaluate_throttle(metrics)
+                self._allowed = allowed
+                self._set_suspended(suspend)
+                if reason != self._throttle_reason:
+                    # La montée en charge progressive est routinière: pas au niveau info
+                    log = logger.debug if "ramp_up" in (reason, self._throttle_reason) else logger.info
+                    log("Régulation des conversions", reason=reason or "none", allowed=allowed, running=self._running)
+                    self._throttle_reason = reason
+            except Exception as e:
+                logger.error("Erreur régulation des conversions", error=str(e), exc_info=True)
+            await asyncio.sleep(THROTTLE_INTERVAL)
+
+    def _on_spawn(self, key: str, process: asyncio.subprocess.Process):
+        processes = self._processes.setdefault(key, [])
+        processes[:] = [p for p in processes if p.returncode is None]
+        processes.append(process)
+        if self._suspended and hasattr(signal, "SIGSTOP"):
+            # Lancé pendant la préparation du job alors que la suspension était déjà décidée
+            process.send_signal(signal.SIGSTOP)
+
+    async def _worker(self, index: int):
+        while True:
+            if self._running >= self._allowed:
+                # Limité par la charge: les jobs restent en file
+                await asyncio.sleep(THROTTLE_INTERVAL)
+                continue
+            job = self._next_job()
+            if job is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            username, rec = job
+            self._running += 1
+            self._last_start = time.monotonic()
+            try:
+                await self._convert(username, rec)
+            except Exception as e:
+                logger.error("Erreur job de conversion", username=username, filename=rec['filename'],
+                             error=str(e), exc_info=True)
+                await self._job_failed(rec, str(e))
+            finally:
+                self._running -= 1
+                self._processes.pop(rec['file_path'], None)
+                self._known.discard(rec['file_path'])
+
+    # ---- Conversion incrémentale ----
+
+    def live_ended(self, file_path: str) -> bool:
+        """Enregistrement encodé pendant sa capture et terminé: inutile d'attendre qu'il soit stable"""
+        state = self._live.get(file_path)
+        return state is not None and state["ended"] and state["eligible"] and not state["failed"]
+
+    async def advance_live(self, recordings: List[Tuple[str, str, List[ByteRangeSegment]]]):
+        """
+        Un pas de conversion des enregistrements en cours
+
+        recordings: (personne, fichier .ts, segments indexés) des sessions qui enregistrent
+        Chaque enregistrement qui sera transcodé (pas un simple remux) voit ses morceaux
+        complets encodés au fil de l'eau; à la fin de la session, il ne reste que la queue
+        et l'audio à encoder avant de recoller le MP4.
+        """
+        current = {path for _, path, _ in recordings}
+        for path, state in list(self._live.items()):
+            if path in current:
+                continue
+            state["ended"] = True
+            if state["task"] is not None:
+                continue
+            if (not state["eligible"] or state["failed"]
+                    or not state["path"].exists() and not live_recording_path(state["path"]).exists()):
+                # Rien à finaliser (conversion classique), ou enregistrement supprimé/récupéré
+                # avant d'être pris en charge: état et morceaux abandonnés
+                del self._live[path]
+                await asyncio.to_thread(shutil.rmtree, state["work_dir"], True)
+        if not self.incremental:
+            return
+
+        for username, path, segments in recordings:
+            state = self._live.get(path)
+            if state is None:
+                state = await self._start_live(username, Path(path))
+                if state is None:
+                    continue
+                self._live[path] = state
+            if not state["eligible"] or state["failed"] or state["task"] is not None:
+                continue
+            chunk = next_live_chunk(segments, state["offset"], self.chunk_seconds)
+            if chunk is None:
+                continue
+            # Même régulation que les jobs: l'enregistrement passe avant
+            if self._running >= self._allowed or self._suspended:
+                return
+            self._running += 1
+            self._last_start = time.monotonic()
+            state["task"] = asyncio.create_task(self._encode_live_chunk(state, *chunk))
 
+    async def _start_live(self, username: str, path: Path) -> Optional[dict]:
+        """État de conversion d'un enregistrement en cours (inéligible si un remux suffira, None si illisible)"""
+        state = {
+            "username": username,
+            "path": path,
+            "work_dir": path.with_name(path.with_suffix(".mp4").name + PARTIAL_SUFFIX + LIVE_DIR_SUFFIX),
+            "eligible": False,
+            "failed": False,
+            "ended": False,
+            "task": None,
+            "offset": 0,
+            "chunks": [],
+            "encoded_seconds": 0.0,
+            "profile": None,
+            "has_audio": False,
+            "video_start": 0.0,
+            "audio_start": 0.0,
+        }
+        profile, recompress = await self.model_settings(username)
+        if profile.get("video_codec") == "none":
+            return state
+        source = await probe_codecs(live_recording_path(path), self.ffmpeg_path)
+        if source is None or not source.video_codec:
+            # Pas encore de flux lisible: nouvel essai au prochain passage
+            return None
+        if profile.get("allow_remux") and not recompress and can_remux(source, profile.get("max_height") or 0):
+            return state
+        await asyncio.to_thread(shutil.rmtree, state["work_dir"], True)
+        state["work_dir"].mkdir()
+        state.update(eligible=True, profile=profile, has_audio=source.audio_codec is not None,
+                     video_start=source.video_start, audio_start=source.audio_start)
+        logger.info("Conversion incrémentale démarrée", username=username, filename=path.name,
+                    profile=profile.get("name"), chunk_seconds=self.chunk_seconds)
+        return state
 
-async def auto_convert_recordings_task(db, output_dir: Path, ffmpeg_path: str = "ffmpeg"):
+    async def _encode_live_chunk(self, state: dict, start: int, end: int, duration: float):
+        name = f"enc_{len(state['chunks']):05d}.mp4"
+        key = str(state["path"])
+        try:
+            success, error_msg = await _run_ffmpeg([
+                self.ffmpeg_path,
+                "-f", "mpegts",
+                # <nom>.part pendant la capture (renommé à la fin, déjà ouvert par ffmpeg)
+                "-i", subfile_input(live_recording_path(state["path"]), start, end),
+                "-map", "0:v:0",
+                *video_encode_args(state["profile"], reset_start=True),
+                *threads_args(state["profile"], self.threads_per_job),
+                "-an",
+                "-f", "mp4",
+                "-y",
+                str(state["work_dir"] / name)
+            ], prefix=self.prefix, on_spawn=lambda process: self._on_spawn(key, process))
+            if success:
+                state["chunks"].append(name)
+                state["offset"] = end
+                state["encoded_seconds"] += duration
+                logger.debug("Morceau converti pendant la capture", filename=state["path"].name,
+                             chunks=len(state["chunks"]), encoded_seconds=round(state["encoded_seconds"]))
+            else:
+                # Conversion complète classique à la fin de la session
+                state["failed"] = True
+                logger.warning("Conversion incrémentale abandonnée", filename=state["path"].name, error=error_msg)
+        except Exception as e:
+            state["failed"] = True
+            logger.error("Erreur conversion incrémentale", filename=state["path"].name, error=str(e), exc_info=True)
+        finally:
+            self._running -= 1
+            self._processes.pop(key, None)
+            state["task"] = None
+
+    async def _take_live(self, ts_path: Path) -> Optional[dict]:
+        """Retire l'état incrémental d'un enregistrement à finaliser (attend le morceau en cours)"""
+        state = self._live.pop(str(ts_path), None)
+        if state is not None and state["task"] is not None:
+            await asyncio.gather(state["task"], return_exceptions=True)
+        if state is None or not state["eligible"] or state["failed"] or not state["chunks"]:
+            # Morceaux d'un run précédent ou d'une tentative abandonnée
+            stale = ts_path.with_name(ts_path.with_suffix(".mp4").name + PARTIAL_SUFFIX + LIVE_DIR_SUFFIX)
+            await asyncio.to_thread(shutil.rmtree, stale, True)
+            return None
+        return state
+
+    async def _finish_live(self, state: dict, mp4_path: Path,
+                           on_progress: ProgressCallback) -> Tuple[bool, Optional[Path], Optional[int], str, Optional[str]]:
+        """Encode la queue et l'audio, puis recolle les morceaux dans le MP4 (écrit en .part puis renommé)"""
+        ts_path = state["path"]
+        work_dir = state["work_dir"]
+        partial_path = mp4_path.with_name(mp4_path.name + PARTIAL_SUFFIX)
+        profile = state["profile"]
+        encoded = state["encoded_seconds"]
+        on_spawn = lambda process: self._on_spawn(str(ts_path), process)
+        try:
+            chunks = list(state["chunks"])
+            jobs = []
+            if ts_path.stat().st_size - state["offset"] > MIN_TAIL_BYTES:
+                chunks.append(f"enc_{len(chunks):05d}.mp4")
+                jobs.append(_run_ffmpeg([
+                    self.ffmpeg_path,
+                    "-f", "mpegts",
+                    "-i", subfile_input(ts_path, state["offset"]),
+                    "-map", "0:v:0",
+                    *video_encode_args(profile, reset_start=True),
+                    *threads_args(profile, self.threads_per_job),
+                    "-an",
+                    "-f", "mp4",
+                    "-y",
+                    str(work_dir / chunks[-1])
+                ], lambda out_seconds, speed: on_progress(encoded + out_seconds, speed), self.prefix, on_spawn))
+            if state["has_audio"]:
+                jobs.append(_run_ffmpeg(audio_track_cmd(self.ffmpeg_path, ts_path, profile, work_dir / "audio.m4a"),
+                                        prefix=self.prefix, on_spawn=on_spawn))
+            success, error_msg = await _first_failure(jobs)
+            if success:
+                success, error_msg = await _concat_chunks(self.ffmpeg_path, work_dir, chunks, state["has_audio"],
+                                                          profile, partial_path, self.prefix, on_spawn,
+                                                          video_offset=state["video_start"],
+                                                          audio_offset=state["audio_start"])
+            if not success:
+                return False, None, None, "incremental", error_msg
+            os.replace(partial_path, mp4_path)
+            mp4_size = mp4_path.stat().st_size
+            logger.success("✅ Conversion incrémentale terminée", ts_file=ts_path.name, mp4_file=mp4_path.name,
+                           chunks=len(chunks), encoded_during_capture_seconds=round(encoded))
+            return True, mp4_path, mp4_size, "incremental", None
+        finally:
+            if partial_path.exists():
+                partial_path.unlink()
+            await asyncio.to_thread(shutil.rmtree, work_dir, True)
+
+    async def _convert(self, username: str, rec: dict):
+        ts_path = Path(rec['file_path'])
+        duration = rec.get('duration_seconds') or 0
+        if not duration and is_segment_dir(ts_path):
+            duration = playlist_duration(ts_path)
+        # Profil du modèle; recompress force le transcodage même si un remux suffirait
+        profile, recompress = await self.model_settings(username)
+        if profile.get("video_codec") == "none":
+            return
+        input_size = recording_size(ts_path)
+        await self.db.update_conversion_job(rec['file_path'], status="running",
+                                            started_at=int(time.time()), finished_at=None)
+
+        if not self._active:
+            self._busy_since = time.monotonic()
+        started = time.time()
+        job = self._active[rec['file_path']] = {
+            "username": username,
+            "filename": rec['filename'],
+            "duration_seconds": duration,
+            "profile": profile.get("name"),
+            "started_at": started,
+            "out_seconds": 0.0,
+            "speed": None,
+            "percent": None,
+            "eta_seconds": None,
+            "suspended": self._suspended,
+            # Temps passé sous SIGSTOP, exclu des durées d'encodage
+            "suspended_seconds": 0.0,
+            "suspended_since": started if self._suspended else None,
+        }
+
+        def on_progress(out_seconds: float, speed: Optional[float]):
+            job["out_seconds"] = round(out_seconds, 1)
+            job["speed"] = speed
+            if duration:
+                job["percent"] = round(min(100.0, out_seconds / duration * 100), 1)
+                if speed:
+                    job["eta_seconds"] = round(max(0.0, duration - out_seconds) / speed)
+
+        logger.info("🎬 Conversion automatique",
+                    username=username,
+                    filename=rec['filename'],
+                    active=len(self._active),
+                    queue_depth=self.queue_depth())
+        try:
+            # Enregistrement déjà encodé en grande partie pendant sa capture
+            live = await self._take_live(ts_path)
+            success = False
+            if live is not None:
+                try:
+                    success, mp4_path_result, mp4_size, mode, error = await self._finish_live(
+                        live, ts_path.with_suffix('.mp4'), on_progress
+                    )
+                except Exception as e:
+                    live["failed"] = True
+                    success, error = False, str(e)
+                    logger.error("Erreur finalisation incrémentale", filename=rec['filename'],
+                                 error=error, exc_info=True)
+                if not success:
+                    logger.warning("Finalisation incrémentale échouée, conversion complète",
+                                   filename=rec['filename'], error=error)
+            if not success:
+                # Encodeurs des morceaux: places du pool libres à cet instant, réservées le temps du job
+                reserved = 0
+                if self.chunk_seconds and duration >= 2 * self.chunk_seconds:
+                    reserved = max(0, min(self.chunk_jobs - 1, min(self._allowed, self.workers) - self._running))
+                    self._running += reserved
+                try:
+                    success, mp4_path_result, mp4_size, mode, error = await convert_ts_to_mp4(
+                        ts_path,
+                        ts_path.with_suffix('.mp4'),
+                        self.ffmpeg_path,
+                        threads=self.threads_per_job,
+                        recompress=recompress,
+                        profile=profile,
+                        on_progress=on_progress,
+                        prefix=self.prefix,
+                        on_spawn=lambda process: self._on_spawn(rec['file_path'], process),
+                        duration=duration,
+                        chunk_seconds=self.chunk_seconds,
+                        chunk_jobs=reserved + 1
+                    )
+                finally:
+                    self._running -= reserved
+        finally:
+            del self._active[rec['file_path']]
+            finished = time.time()
+            elapsed = finished - started - _suspended_seconds(job, finished)
+            if not self._active and self._busy_since is not None:
+                self._busy_seconds += time.monotonic() - self._busy_since
+                self._busy_since = None
+
+        if not (success and mp4_path_result):
+            await self._job_failed(rec, error or "Unknown error", mode)
+            return
+
+        await self.db.update_conversion_job(rec['file_path'], status="done", mode=mode, output_size=mp4_size,
+                                            last_error=None, finished_at=int(time.time()))
+        self.completed += 1
+        self.source_seconds += duration
+        if mode == "transcode" and profile.get("name") and duration:
+            # Statistiques du profil: encodages réels seulement (un remux ne dit rien du réglage)
+            await self.db.record_conversion_stats(profile["name"], duration, elapsed, input_size, mp4_size or 0)
+        await self.db.add_or_update_recording(
+            username=username,
+            filename=rec['filename'],
+            file_path=rec['file_path'],
+            file_size=rec['file_size'],
+            recording_id=rec.get('recording_id'),
+            duration_seconds=rec.get('duration_seconds', 0),
+            thumbnail_path=rec.get('thumbnail_path'),
+            mp4_path=str(mp4_path_result),
+            mp4_size=mp4_size,
+            is_converted=True
+        )
+        logger.success("📦 Enregistrement converti et indexé",
+                       username=username,
+                       filename=rec['filename'],
+                       mp4_file=mp4_path_result.name,
+                       speed=f"{duration / elapsed:.2f}x" if duration and elapsed > 0 else None)
+        self.schedule_reclaim(username, rec, mp4_path_result)
+
+    def schedule_reclaim(self, username: str, rec: dict, mp4_path: Path) -> bool:
+        """Lance en arrière-plan la vérification du MP4 et la suppression de sa source (politique MP4 seul)"""
+        key = rec['file_path']
+        if not self.keep_mp4_only or key in self._reclaiming or key in self._unverified:
+            return False
+        if str(mp4_path) == key:
+            # MP4 enregistré directement: pas de source distincte
+            return False
+        self._reclaiming.add(key)
+        task = asyncio.create_task(self._reclaim(username, rec, mp4_path))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return True
+
+    async def verify_against_source(self, rec: dict, mp4_path: Path) -> Tuple[bool, str]:
+        """verify_mp4 avec la durée de l'enregistrement source (sondée, sinon index ou base)"""
+        source = Path(rec['file_path'])
+        source_seconds = await probe_duration(recording_input(source), self.ffmpeg_path)
+        if source_seconds is None:
+            source_seconds = float(playlist_duration(source) if is_segment_dir(source)
+                                   else rec.get('duration_seconds') or 0)
+        return await verify_mp4(mp4_path, source_seconds, self.ffmpeg_path)
+
+    async def _reclaim(self, username: str, rec: dict, mp4_path: Path):
+        source = Path(rec['file_path'])
+        try:
+            if not source.exists() or not mp4_path.exists():
+                return
+            verified, reason = await self.verify_against_source(rec, mp4_path)
+            if not verified:
+                self._unverified.add(rec['file_path'])
+                logger.warning("MP4 non vérifié, source conservée", username=username,
+                               filename=rec['filename'], reason=reason)
+                return
+
+            size = recording_size(source)
+            mp4_size = mp4_path.stat().st_size
+            # La base d'abord: l'enregistrement reste listé pendant la suppression
+            await self.db.switch_recording_to_mp4(username, rec['filename'], str(mp4_path), mp4_size)
+            if is_segment_dir(source):
+                await asyncio.to_thread(shutil.rmtree, source)
+            else:
+                await asyncio.to_thread(source.unlink)
+
+            if await self.db.get_conversion_job(rec['file_path']) is None:
+                # Conversion antérieure à la file persistante
+                await self.db.enqueue_conversion_job(username, rec['filename'], rec['file_path'])
+                await self.db.update_conversion_job(rec['file_path'], status="done", output_size=mp4_size)
+            await self.db.update_conversion_job(rec['file_path'], reclaimed_bytes=size)
+            self.reclaimed += 1
+            self.reclaimed_bytes += size
+            logger.success("🧹 Source supprimée, MP4 vérifié conservé",
+                           username=username,
+                           filename=rec['filename'],
+                           mp4_file=mp4_path.name,
+                           reclaimed_mb=f"{size / 1024 / 1024:.1f}")
+        except Exception as e:
+            logger.error("Erreur suppression source convertie", username=username, filename=rec['filename'],
+                         error=str(e), exc_info=True)
+        finally:
+            self._reclaiming.discard(rec['file_path'])
+
+    async def _job_failed(self, rec: dict, error: str, mode: Optional[str] = None):
+        """Compte une tentative ratée: nouvel essai plus tard, ou abandon après max_attempts"""
+        self.failed += 1
+        job = await self.db.get_conversion_job(rec['file_path'])
+        attempts = (job['attempts'] if job else 0) + 1
+        now = int(time.time())
+        if attempts >= self.max_attempts:
+            await self.db.update_conversion_job(rec['file_path'], status="failed", attempts=attempts, mode=mode,
+                                                last_error=error[-500:], finished_at=now)
+            logger.error("Conversion abandonnée", filename=rec['filename'], attempts=attempts)
+            return
+        delay = retry_delay(attempts, self.retry_base_seconds)
+        await self.db.update_conversion_job(rec['file_path'], status="queued", attempts=attempts, mode=mode,
+                                            last_error=error[-500:], finished_at=now,
+                                            next_attempt_at=now + int(delay))
+        logger.warning("Conversion échouée, nouvelle tentative programmée",
+                       filename=rec['filename'], attempts=attempts, retry_in_seconds=int(delay))
+
+    def _window_label(self) -> Optional[str]:
+        if not self.window:
+            return None
+        start, end = self.window
+        return f"{start // 60:02d}:{start % 60:02d}-{end // 60:02d}:{end % 60:02d}"
+
+    def status(self) -> dict:
+        now = time.time()
+        busy = self._busy_wall_seconds()
+        return {
+            "workers": self.workers,
+            "threads_per_job": self.threads_per_job,
+            "chunk_seconds": self.chunk_seconds,
+            "chunk_jobs": self.chunk_jobs,
+            "queue_depth": self.queue_depth(),
+            "queued_by_model": {u: len(q) for u, q in self._queues.items() if q},
+            "max_attempts": self.max_attempts,
+            "throttle": {
+                "allowed_workers": self._allowed,
+                "reason": self._throttle_reason,
+                "suspended": self._suspended,
+                "window": self._window_label(),
+            },
+            "active_jobs": len(self._active),
+            "active": [
+                {**{k: v for k, v in job.items() if k != "suspended_since"},
+                 "suspended_seconds": round(_suspended_seconds(job, now)),
+                 "elapsed_seconds": round(now - job["started_at"] - _suspended_seconds(job, now))}
+                for job in self._active.values()
+            ],
+            "completed": self.completed,
+            "failed": self.failed,
+            "source_seconds_converted": round(self.source_seconds),
+            "keep_mp4_only": self.keep_mp4_only,
+            # Depuis le démarrage (total persistant: reclaimed_bytes_total de /api/conversions)
+            "reclaimed_recordings": self.reclaimed,
+            "reclaimed_bytes": self.reclaimed_bytes,
+            # Enregistrements en cours encodés par morceaux
+            "live": [
+                {
+                    "username": state["username"],
+                    "filename": state["path"].name,
+                    "chunks": len(state["chunks"]),
+                    "encoded_seconds": round(state["encoded_seconds"]),
+                    "encoding": state["task"] is not None,
+                    "ended": state["ended"],
+                    "failed": state["failed"],
+                }
+                for state in self._live.values() if state["eligible"]
+            ],
+            "busy_wall_seconds": round(busy),
+            # Secondes de vidéo converties par seconde d'horloge (jobs terminés)
+            "throughput": round(self.source_seconds / busy, 2) if busy > 0 else 0.0,
+        }
+
+
+async def auto_convert_recordings_task(db, output_dir: Path, ffmpeg_path: str = "ffmpeg",
+                                       pool: Optional[ConversionPool] = None):
     """
-    Tâche qui surveille les enregistrements non convertis et les convertit automatiquement
+    Tâche qui surveille les enregistrements non convertis et les confie au pool de conversion
     """
     logger.info("🔄 Tâche de conversion automatique démarrée")
+    if pool is None:
+        pool = ConversionPool(db, ffmpeg_path)
+    pool.start()
+    
+    # Jobs 'running' du run précédent: repris au premier passage
+    try:
+        await pool.resume()
+    except Exception as e:
+        logger.error("Erreur reprise des conversions", error=str(e), exc_info=True)
     
     # SCAN INITIAL : Scanner tous les fichiers TS existants au démarrage
     logger.info("📂 Scan initial des fichiers TS existants...")
@@ -106,7 +1401,7 @@ async def auto_convert_recordings_task(db, output_dir: Path, ffmpeg_path: str =
             for user_dir in records_root.iterdir():
                 if user_dir.is_dir():
                     username = user_dir.name
-                    for ts_file in user_dir.glob("*.ts"):
+                    for ts_file in list_recordings(user_dir):
                         # Vérifier si déjà dans la DB
                         recordings = await db.get_recordings(username)
                         existing = next((r for r in recordings if r['filename'] == ts_file.name), None)
@@ -114,16 +1409,17 @@ async def auto_convert_recordings_task(db, output_dir: Path, ffmpeg_path: str =
                         if not existing:
                             # Ajouter à la DB
                             logger.info("📥 Indexation fichier existant", username=username, file=ts_file.name)
-                            import time
                             recording_id = f"{username}_{ts_file.stem}"
                             await db.add_or_update_recording(
                                 username=username,
                                 filename=ts_file.name,
                                 file_path=str(ts_file),
-                                file_size=ts_file.stat().st_size,
+                                file_size=recording_size(ts_file),
                                 recording_id=recording_id,
                                 duration_seconds=0,
-                                is_converted=False
+                                # MP4 enregistré directement: rien à convertir
+                                mp4_path=str(ts_file) if is_mp4_recording(ts_file) else None,
+                                is_converted=is_mp4_recording(ts_file)
                             )
         logger.success("✅ Scan initial terminé")
     except Exception as e:
@@ -131,7 +1427,8 @@ async def auto_convert_recordings_task(db, output_dir: Path, ffmpeg_path: str =
     
     while True:
         try:
-            await asyncio.sleep(30)  # Vérifier toutes les 30 secondes
+            # Toutes les 30 secondes, ou dès qu'une session finalise son enregistrement
+            await pool.wait_for_recordings(30)
             
             # Scanner TOUS les dossiers users dans /records (pas seulement les modèles connus)
             records_root = output_dir / "records"
@@ -144,12 +1441,25 @@ async def auto_convert_recordings_task(db, output_dir: Path, ffmpeg_path: str =
                     
                 username = user_dir.name
                 
+                # Profil sans conversion (video_codec 'none'): enregistrements gardés tels quels
+                if not await pool.wants_conversion(username):
+                    continue
+                model = await db.get_model(username) or {}
+                
                 # Récupérer les enregistrements non convertis depuis la DB
                 recordings = await db.get_recordings(username)
                 
                 for rec in recordings:
                     # Vérifier si déjà converti
                     if rec.get('is_converted'):
+                        # MP4 seul: source encore présente (conversion antérieure, arrêt avant suppression)
+                        if (pool.keep_mp4_only and rec.get('mp4_path') and rec['mp4_path'] != rec['file_path']
+                                and Path(rec['file_path']).exists()):
+                            pool.schedule_reclaim(username, rec, Path(rec['mp4_path']))
+                        continue
+                    
+                    # Déjà confié au pool
+                    if pool.is_pending(rec['file_path']):
                         continue
                     
                     # Vérifier si l'enregistrement est en cours
@@ -160,9 +1470,18 @@ async def auto_convert_recordings_task(db, output_dir: Path, ffmpeg_path: str =
                         logger.warning("Fichier TS introuvable, skip", file=str(ts_path))
                         continue
                     
+                    job = await db.get_conversion_job(rec['file_path'])
+                    
                     # Vérifier si le MP4 existe déjà (éviter reconversion)
+                    # Un job non terminé signale un MP4 partiel laissé par une ancienne version: reconverti
                     mp4_path = ts_path.with_suffix('.mp4')
-                    if mp4_path.exists():
+                    mp4_ready = mp4_path.exists() and (job is None or job['status'] == 'done')
+                    if mp4_ready and job is None:
+                        # MP4 sans job (version antérieure ou copie manuelle): accepté seulement s'il est complet
+                        mp4_ready, reason = await pool.verify_against_source(rec, mp4_path)
+                        if not mp4_ready:
+                            logger.warning("MP4 existant invalide, reconversion", file=mp4_path.name, reason=reason)
+                    if mp4_ready:
                         # Le MP4 existe, mettre à jour la DB
                         logger.info("MP4 déjà existant, mise à jour DB", file=mp4_path.name)
                         await db.add_or_update_recording(
@@ -179,46 +1498,36 @@ async def auto_convert_recordings_task(db, output_dir: Path, ffmpeg_path: str =
                         )
                         continue
                     
-                    # Vérifier si le fichier TS est stable (pas modifié depuis 60s)
-                    import time
-                    last_modified = ts_path.stat().st_mtime
-                    if time.time() - last_modified < 60:
+                    # Répertoire de segments: terminé quand son index est clos (#EXT-X-ENDLIST), même
+                    # finalisé (un index ouvert est lu par ffmpeg comme une playlist live)
+                    if is_segment_dir(ts_path):
+                        if not recording_complete(ts_path):
+                            logger.debug("Enregistrement en segments en cours, skip", file=ts_path.name)
+                            continue
+                    # Finalisé par sa session (ou encodé pendant la capture): prêt sans attendre
+                    elif rec.get('completed_at') or pool.live_ended(rec['file_path']):
+                        pass
+                    # Ancien fichier sans signal de fin: stable depuis 60s
+                    elif time.time() - ts_path.stat().st_mtime < 60:
                         # Fichier encore en cours d'écriture
                         logger.debug("Fichier en cours d'écriture, skip", file=ts_path.name)
                         continue
                     
-                    # Lancer la conversion
-                    logger.info("🎬 Conversion automatique",
-                              username=username,
-                              filename=rec['filename'])
-                    success, mp4_path_result, mp4_size = await convert_ts_to_mp4(
-                        ts_path,
-                        mp4_path,
-                        ffmpeg_path
-                    )
+                    if job is None:
+                        priority = model.get('priority') or 0
+                        await db.enqueue_conversion_job(username, rec['filename'], rec['file_path'], priority)
+                        job = {"status": "queued", "priority": priority, "next_attempt_at": 0}
                     
-                    if success and mp4_path_result:
-                        # Mettre à jour la DB
-                        await db.add_or_update_recording(
-                            username=username,
-                            filename=rec['filename'],
-                            file_path=rec['file_path'],
-                            file_size=rec['file_size'],
-                            recording_id=rec.get('recording_id'),
-                            duration_seconds=rec.get('duration_seconds', 0),
-                            thumbnail_path=rec.get('thumbnail_path'),
-                            mp4_path=str(mp4_path_result),
-                            mp4_size=mp4_size,
-                            is_converted=True
-                        )
-                        
-                        logger.success("📦 Enregistrement converti et indexé",
-                                     username=username,
-                                     filename=rec['filename'],
-                                     mp4_file=mp4_path_result.name)
+                    # Tentatives épuisées: relance manuelle via l'API
+                    if job['status'] == 'failed':
+                        continue
+                    
+                    # Échec récent: attendre la fin du délai avant la tentative suivante
+                    if (job.get('next_attempt_at') or 0) > time.time():
+                        continue
                     
-                    # Attendre un peu entre chaque conversion pour éviter surcharge
-                    await asyncio.sleep(5)
+                    # Confier au pool (ignoré si déjà en file ou en cours)
+                    pool.submit(username, rec, job.get('priority') or 0)
                     
         except Exception as e:
             logger.error("Erreur dans tâche de conversion",
@@ -15,6 +15,10 @@ if TYPE_CHECKING:
 
 from ..logger import logger
 from ..core.config import OUTPUT_DIR
+from ..recording_layout import (
+    is_mp4_recording, is_segment_dir, list_recordings, live_recording_path, playlist_duration, recording_complete,
+    recording_input, recording_mtime, recording_size,
+)
 
 # Intervalle de vérification (en secondes)
 MONITOR_INTERVAL = 30  # Vérifie toutes les 30 secondes
@@ -56,14 +60,20 @@ async def generate_thumbnail_from_stream(
     username: str,
     session_id: str,
     output_dir: Path,
-    ffmpeg_path: str = "ffmpeg"
+    ffmpeg_path: str = "ffmpeg",
+    record_path: str | None = None
 ) -> str | None:
-    """Génère une miniature depuis le stream HLS en cours"""
+    """Génère une miniature depuis le stream HLS en cours (ou la fin de l'enregistrement si aucun aperçu)"""
     try:
         session_dir = output_dir / "sessions" / session_id
         m3u8_file = session_dir / "stream.m3u8"
         
-        if not m3u8_file.exists():
+        if m3u8_file.exists():
+            input_args = ["-i", str(m3u8_file)]
+        elif record_path and live_recording_path(record_path).exists():
+            # Aperçu HLS non démarré (à la demande): lire les dernières secondes enregistrées
+            input_args = ["-sseof", "-5", "-i", str(recording_input(live_recording_path(record_path)))]
+        else:
             return None
         
         # Dossier pour les miniatures live
@@ -73,7 +83,7 @@ async def generate_thumbnail_from_stream(
         
         # Générer la miniature
         process = await asyncio.create_subprocess_exec(
-            ffmpeg_path, "-i", str(m3u8_file),
+            ffmpeg_path, *input_args,
             "-vframes", "1",
             "-vf", "scale=280:-1",
             "-y",
@@ -105,7 +115,7 @@ async def generate_thumbnail_from_recording(
             return None
         
         # Trouver la dernière rediffusion
-        ts_files = sorted(records_dir.glob("*.ts"), key=lambda p: p.stat().st_mtime, reverse=True)
+        ts_files = sorted(list_recordings(records_dir), key=recording_mtime, reverse=True)
         
         if not ts_files:
             return None
@@ -118,13 +128,13 @@ async def generate_thumbnail_from_recording(
         thumb_path = offline_thumbs_dir / f"{username}.jpg"
         
         # Ne régénérer que si la miniature n'existe pas ou est plus ancienne que l'enregistrement
-        if thumb_path.exists() and thumb_path.stat().st_mtime > latest_recording.stat().st_mtime:
+        if thumb_path.exists() and thumb_path.stat().st_mtime > recording_mtime(latest_recording):
             return str(thumb_path)
         
         # Extraire une frame au milieu de la vidéo
         process = await asyncio.create_subprocess_exec(
             ffmpeg_path, "-ss", "00:00:30",
-            "-i", str(latest_recording),
+            "-i", str(recording_input(latest_recording)),
             "-vframes", "1",
             "-vf", "scale=280:-1",
             "-y",
@@ -234,7 +244,7 @@ async def generate_recording_thumbnail(
         process = await asyncio.create_subprocess_exec(
             ffmpeg_path,
             "-ss", "00:00:30",
-            "-i", str(ts_file),
+            "-i", str(recording_input(ts_file)),
             "-vframes", "1",
             "-vf", "scale=320:-1",
             "-y",
@@ -265,8 +275,10 @@ async def update_recordings_cache(db: 'Database', username: str, output_dir: Pat
         if not records_dir.exists():
             return
         
-        for ts_file in records_dir.glob("*.ts"):
-            stat = ts_file.stat()
+        for ts_file in list_recordings(records_dir):
+            # Segments encore en cours: durée et miniature calculées une fois l'index clos
+            if not recording_complete(ts_file):
+                continue
             
             # Récupérer la durée actuelle depuis la DB
             existing_recordings = await db.get_recordings(username)
@@ -278,8 +290,11 @@ async def update_recordings_cache(db: 'Database', username: str, output_dir: Pat
                 duration_seconds = existing_rec.get('duration_seconds', 0)
             
             if duration_seconds == 0:
-                # Calculer la durée avec ffprobe
-                duration_seconds = await get_video_duration(ts_file, ffmpeg_path)
+                # Répertoire de segments: somme des #EXTINF, sinon ffprobe
+                if is_segment_dir(ts_file):
+                    duration_seconds = playlist_duration(ts_file)
+                else:
+                    duration_seconds = await get_video_duration(ts_file, ffmpeg_path)
                 logger.debug("Durée calculée", username=username, filename=ts_file.name, duration=duration_seconds)
             
             # Générer la miniature si elle n'existe pas
@@ -306,10 +321,13 @@ async def update_recordings_cache(db: 'Database', username: str, output_dir: Pat
                 username=username,
                 filename=ts_file.name,
                 file_path=str(ts_file),
-                file_size=stat.st_size,
+                file_size=recording_size(ts_file),
                 recording_id=recording_id,
                 duration_seconds=duration_seconds,
-                thumbnail_path=thumbnail_path
+                thumbnail_path=thumbnail_path,
+                # Conversion déjà faite (ou inutile pour un MP4 enregistré directement)
+                mp4_path=str(ts_file) if is_mp4_recording(ts_file) else None,
+                is_converted=is_mp4_recording(ts_file) or bool(existing_rec and existing_rec.get('is_converted'))
             )
     
     except Exception as e:
@@ -342,9 +360,6 @@ async def monitor_models_task(
                 
                 logger.debug("Vérification des modèles", count=len(models))
                 
-                # Récupérer les sessions actives
-                active_sessions = manager.list_status()
-                
                 # Vérifier chaque modèle
                 for model in models:
                     username = model['username']
@@ -354,10 +369,7 @@ async def monitor_models_task(
                         status = await check_model_status(session, username)
                         
                         # Vérifier si en cours d'enregistrement
-                        active_session = next(
-                            (s for s in active_sessions if s.get('person') == username and s.get('running')),
-                            None
-                        )
+                        active_session = manager.get_session_status(username)
                         is_recording = active_session is not None
                         
                         # Générer/mettre à jour la miniature
@@ -374,7 +386,8 @@ async def monitor_models_task(
                                     username,
                                     active_session['id'],
                                     OUTPUT_DIR,
-                                    ffmpeg_path
+                                    ffmpeg_path,
+                                    record_path=active_session.get('record_path')
                                 )
                             
                             if not thumbnail_path and status['is_online']:
@@ -0,0 +1,270 @@
+"""
+Indexation incrémentale d'un flux MPEG-TS
+Repère les keyframes vidéo (offset en octets + PTS) pendant l'écriture de l'enregistrement
+pour découper le fichier en segments HLS par plages d'octets, sans copie
+"""
+import math
+import threading
+from typing import List, NamedTuple, Optional
+
+TS_PACKET_SIZE = 188
+TS_SYNC_BYTE = 0x47
+
+# stream_type PMT des codecs vidéo courants (MPEG-2, H.264, HEVC)
+VIDEO_STREAM_TYPES = {0x02, 0x1B, 0x24}
+
+PTS_CLOCK = 90000
+PTS_WRAP = 1 << 33
+
+# Octet 1 d'en-tête -> 1 si payload_unit_start (et pas d'erreur de transport), sinon 0
+_PUSI_MARKS = bytes(1 if (v & 0x40) and not (v & 0x80) else 0 for v in range(256))
+
+# Écart de PTS entre deux keyframes au-delà duquel la source a sauté (reconnexion)
+MAX_KEYFRAME_GAP = 30.0
+
+
+class ByteRangeSegment(NamedTuple):
+    offset: int
+    length: int
+    duration: float
+    # Horloge de la source réinitialisée avant ce segment (#EXT-X-DISCONTINUITY)
+    discontinuity: bool
+
+
+class TsKeyframeIndexer:
+    """
+    Construit une liste de points de coupe (offset, pts) alignés sur les keyframes
+
+    Un point de coupe est placé sur le PAT qui précède la keyframe quand il
+    est tout proche (ffmpeg réémet PAT/PMT avant chaque keyframe), de sorte
+    que chaque segment soit décodable seul.
+    """
+
+    def __init__(self, min_segment_duration: float = 4.0, start_offset: int = 0):
+        self.min_segment_duration = min_segment_duration
+        self.offset = start_offset
+        self._pending = b""
+        self._lock = threading.Lock()
+        self._pmt_pids = set()
+        self._video_pid: Optional[int] = None
+        self._last_pat_offset: Optional[int] = None
+        self._last_raw_pts: Optional[int] = None
+        self._pts_base = 0
+        # [offset, pts de début, discontinuité, pts de la dernière keyframe du segment]
+        self._entries: List[list] = []
+        # Dernier intervalle entre keyframes (durée du dernier GOP d'un segment coupé par une discontinuité)
+        self._keyframe_interval = 0.0
+
+    def feed(self, chunk: bytes):
+        """Analyse les octets qui viennent d'être ajoutés au fichier"""
+        data = self._pending + chunk if self._pending else chunk
+        base = self.offset - len(self._pending)
+        end = len(data)
+        aligned_end = end - end % TS_PACKET_SIZE
+
+        if self._video_pid is not None and self._is_aligned(data, aligned_end):
+            # Chemin rapide: seuls les paquets de début d'unité (PUSI) passent par Python
+            marks = data[1:aligned_end:TS_PACKET_SIZE].translate(_PUSI_MARKS)
+            i = marks.find(1)
+            while i >= 0:
+                pos = i * TS_PACKET_SIZE
+                self._parse_packet(data, pos, base + pos)
+                i = marks.find(1, i + 1)
+            self._pending = data[aligned_end:]
+            self.offset += len(chunk)
+            return
+
+        pos = 0
+        while pos + TS_PACKET_SIZE <= end:
+            if data[pos] != TS_SYNC_BYTE:
+                # Resynchronisation sur le prochain octet de synchro
+                nxt = data.find(b"\x47", pos + 1)
+                if nxt < 0:
+                    pos = end
+                    break
+                pos = nxt
+                continue
+            self._parse_packet(data, pos, base + pos)
+            pos += TS_PACKET_SIZE
+
+        self._pending = data[pos:]
+        self.offset += len(chunk)
+
+    @staticmethod
+    def _is_aligned(data: bytes, aligned_end: int) -> bool:
+        """Octet de synchro en tête de chaque paquet (sinon resynchronisation paquet par paquet)"""
+        syncs = data[0:aligned_end:TS_PACKET_SIZE]
+        return syncs.count(TS_SYNC_BYTE) == len(syncs)
+
+    def _parse_packet(self, data: bytes, pos: int, file_offset: int):
+        b1 = data[pos + 1]
+        pid = ((b1 & 0x1F) << 8) | data[pos + 2]
+        pusi = b1 & 0x40
+
+        if not pusi:
+            return
+        if pid != 0 and pid not in self._pmt_pids and pid != self._video_pid:
+            return
+
+        afc = (data[pos + 3] >> 4) & 0x3
+        payload = pos + 4
+        random_access = False
+        if afc & 0x2:
+            af_len = data[pos + 4]
+            if af_len > 0:
+                random_access = bool(data[pos + 5] & 0x40)
+            payload = pos + 5 + af_len
+        if not afc & 0x1 or payload >= pos + TS_PACKET_SIZE:
+            return
+        packet_end = pos + TS_PACKET_SIZE
+
+        if pid == 0:
+            self._last_pat_offset = file_offset
+            self._parse_pat(data, payload, packet_end)
+        elif pid in self._pmt_pids:
+            self._parse_pmt(data, payload, packet_end)
+        elif pid == self._video_pid and random_access:
+            pts = self._parse_pts(data, payload, packet_end)
+            if pts is not None:
+                self._add_keyframe(file_offset, pts)
+
+    def _parse_pat(self, data: bytes, payload: int, end: int):
+        section = payload + 1 + data[payload]
+        if section + 8 > end:
+            return
+        section_length = ((data[section + 1] & 0x0F) << 8) | data[section + 2]
+        programs_end = min(section + 3 + section_length - 4, end)
+        i = section + 8
+        while i + 4 <= programs_end:
+            program_number = (data[i] << 8) | data[i + 1]
+            if program_number != 0:
+                self._pmt_pids.add(((data[i + 2] & 0x1F) << 8) | data[i + 3])
+            i += 4
+
+    def _parse_pmt(self, data: bytes, payload: int, end: int):
+        section = payload + 1 + data[payload]
+        if section + 12 > end:
+            return
+        section_length = ((data[section + 1] & 0x0F) << 8) | data[section + 2]
+        program_info_length = ((data[section + 10] & 0x0F) << 8) | data[section + 11]
+        streams_end = min(section + 3 + section_length - 4, end)
+        i = section + 12 + program_info_length
+        while i + 5 <= streams_end:
+            stream_type = data[i]
+            es_pid = ((data[i + 1] & 0x1F) << 8) | data[i + 2]
+            es_info_length = ((data[i + 3] & 0x0F) << 8) | data[i + 4]
+            if stream_type in VIDEO_STREAM_TYPES:
+                self._video_pid = es_pid
+                return
+            i += 5 + es_info_length
+
+    def _parse_pts(self, data: bytes, payload: int, end: int) -> Optional[float]:
+        if payload + 14 > end or data[payload:payload + 3] != b"\x00\x00\x01":
+            return None
+        if not data[payload + 7] & 0x80:
+            return None
+        p = payload + 9
+        raw = (((data[p] >> 1) & 0x07) << 30) | (data[p + 1] << 22) | ((data[p + 2] >> 1) << 15) \
+            | (data[p + 3] << 7) | (data[p + 4] >> 1)
+
+        # Rebouclage du compteur PTS 33 bits (~26 h)
+        if self._last_raw_pts is not None and raw < self._last_raw_pts - PTS_WRAP // 2:
+            self._pts_base += PTS_WRAP
+        self._last_raw_pts = raw
+        return (raw + self._pts_base) / PTS_CLOCK
+
+    def _add_keyframe(self, file_offset: int, pts: float):
+        offset = file_offset
+        if self._last_pat_offset is not None and 0 <= file_offset - self._last_pat_offset <= 4 * TS_PACKET_SIZE:
+            offset = self._last_pat_offset
+
+        with self._lock:
+            if self._entries:
+                current = self._entries[-1]
+                gap = pts - current[3]
+                if gap < 0 or gap > MAX_KEYFRAME_GAP:
+                    # Discontinuité (reconnexion de la source): le segment en cours se termine au saut
+                    self._entries.append([offset, pts, True, pts])
+                    return
+                if gap > 0:
+                    self._keyframe_interval = gap
+                current[3] = pts
+                if pts - current[1] < self.min_segment_duration:
+                    return
+            self._entries.append([offset, pts, False, pts])
+
+    def segments(self) -> List[ByteRangeSegment]:
+        """
+        Segments complets indexés
+
+        Returns:
+            Liste de (offset, longueur, durée, discontinuité) ; le segment en cours d'écriture est exclu
+        """
+        with self._lock:
+            entries = [tuple(e) for e in self._entries]
+            keyframe_interval = self._keyframe_interval
+        out = []
+        for (offset, pts, discontinuity, last_pts), (next_offset, next_pts, next_discontinuity, _) in zip(entries, entries[1:]):
+            if next_discontinuity:
+                # Fin au saut de PTS: dernière keyframe vue + un GOP
+                duration = last_pts - pts + (keyframe_interval or self.min_segment_duration)
+            else:
+                duration = next_pts - pts
+            duration = min(max(duration, 0.001), MAX_KEYFRAME_GAP)
+            out.append(ByteRangeSegment(offset, next_offset - offset, duration, discontinuity))
+        return out
+
+
+def index_ts_file(path, min_segment_duration: float = 4.0, block_size: int = 1024 * 1024) -> List[ByteRangeSegment]:
+    """Segments d'un fichier TS terminé, alignés sur ses keyframes (lecture seule, sans copie)"""
+    indexer = TsKeyframeIndexer(min_segment_duration=min_segment_duration)
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            indexer.feed(block)
+    return indexer.segments()
+
+
+def build_byterange_playlist(
+    segments: List[ByteRangeSegment],
+    uri: str,
+    window_seconds: float = 0,
+    first_sequence: int = 0
+) -> str:
+    """
+    Construit une playlist HLS glissante par plages d'octets sur un seul fichier
+
+    Args:
+        segments: (offset, longueur, durée, discontinuité) de tous les segments indexés
+        uri: URI du fichier servi avec les plages d'octets
+        window_seconds: profondeur de la fenêtre (0 = tout l'enregistrement)
+        first_sequence: numéro de séquence du premier élément de `segments`
+    """
+    start = 0
+    if window_seconds > 0:
+        total = 0.0
+        start = len(segments)
+        while start > 0 and total + segments[start - 1][2] <= window_seconds + 0.001:
+            start -= 1
+            total += segments[start][2]
+
+    window = segments[start:]
+    target = max((math.ceil(round(seg.duration, 3)) for seg in window), default=1)
+
+    lines = [
+        "#EXTM3U",
+        "#EXT-X-VERSION:4",
+        f"#EXT-X-TARGETDURATION:{target}",
+        f"#EXT-X-MEDIA-SEQUENCE:{first_sequence + start}",
+    ]
+    if window_seconds <= 0:
+        lines.append("#EXT-X-PLAYLIST-TYPE:EVENT")
+    for offset, length, duration, discontinuity in window:
+        if discontinuity:
+            lines.append("#EXT-X-DISCONTINUITY")
+        lines.append(f"#EXTINF:{duration:.3f},")
+        lines.append(f"#EXT-X-BYTERANGE:{length}@{offset}")
+        lines.append(uri)
+    return "\n".join(lines) + "\n"
@@ -281,13 +281,23 @@ async function updateModelsStatus() {
         card.insertBefore(recBadge, card.firstChild);
       }
       
+      // Recording throughput (stalled streams flagged)
+      const session = sessions.find(s => s.person === modelInfo.username && s.running);
+      const metrics = session && session.metrics;
+      let throughput = '';
+      if (isRecording && metrics) {
+        throughput = metrics.stalled
+          ? ' · ⚠️ stalled'
+          : ` · ${(metrics.ingress_bps * 8 / 1e6).toFixed(1)} Mbps`;
+      }
+      
       // Update status text
       const statusDiv = card.querySelector('.model-status');
       if (statusDiv) {
         statusDiv.innerHTML = `
           <span class="status-dot ${isRecording ? 'recording' : modelInfo.isOnline ? 'online' : 'offline'}"></span>
           ${isRecording ? 'Recording' : modelInfo.isOnline ? 'Live' : 'Offline'}
-          ${modelInfo.isOnline && modelInfo.viewers > 0 ? ` · ${modelInfo.viewers} viewers` : ''}
+          ${modelInfo.isOnline && modelInfo.viewers > 0 ? ` · ${modelInfo.viewers} viewers` : ''}${throughput}
         `;
       }
       
@@ -480,7 +490,8 @@ async function getActiveSessions() {
   try {
     const res = await fetch('/api/status');
     if (res.ok) {
-      return await res.json();
+      const data = await res.json();
+      return data.sessions || [];
     }
   } catch (e) {
     console.error('Error fetching sessions:', e);